@@ -0,0 +1,493 @@
+import os
+import wave
+import queue
+import logging
+import threading
+import subprocess
+from datetime import datetime, timezone
+import numpy as np
+import pyaudio
+from av_sync import AUDIO
+import metrics
+
+logger = logging.getLogger(__name__)
+
+FORMAT = pyaudio.paInt16
+SAMPLE_WIDTH = 2
+
+# 'input': the sound card overran before the callback ran (PortAudio's input overflow, error -9981);
+# 'ring': the writer thread fell behind and a block was dropped
+AUDIO_OVERFLOWS = metrics.counter('meet_notes_audio_overflows_total', 'Audio blocks lost to overflows', ['kind'])
+
+
+class AudioRingBuffer:
+    """Preallocated byte ring filled from the PyAudio callback and drained by a writer thread
+
+    The callback only copies into the ring under a short lock. If the writer
+    falls so far behind that the ring is full, the incoming block is dropped
+    and counted instead of blocking the audio thread.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.write_pos = 0
+        self.read_pos = 0
+        self.overflows = 0
+        self.overflow_bytes = 0
+        self.peak_fill = 0
+        self.lock = threading.Lock()
+        self.data_ready = threading.Condition(self.lock)
+
+    def available(self):
+        return self.write_pos - self.read_pos
+
+    def write(self, data):
+        """Copy a block into the ring, returning False if it did not fit"""
+        size = len(data)
+        with self.lock:
+            fill = self.write_pos - self.read_pos
+            if size > self.capacity - fill:
+                self.overflows += 1
+                self.overflow_bytes += size
+                AUDIO_OVERFLOWS.inc(kind='ring')
+                return False
+            start = self.write_pos % self.capacity
+            first = min(size, self.capacity - start)
+            self.buffer[start:start + first] = data[:first]
+            if first < size:
+                self.buffer[:size - first] = data[first:]
+            self.write_pos += size
+            self.peak_fill = max(self.peak_fill, fill + size)
+            self.data_ready.notify()
+        return True
+
+    def read(self, min_bytes, timeout):
+        """Wait for at least min_bytes (or the timeout) and return everything buffered"""
+        with self.lock:
+            if self.write_pos - self.read_pos < min_bytes:
+                self.data_ready.wait_for(lambda: self.write_pos - self.read_pos >= min_bytes, timeout)
+            size = self.write_pos - self.read_pos
+            start = self.read_pos % self.capacity
+            first = min(size, self.capacity - start)
+            data = bytes(self.buffer[start:start + first])
+            if first < size:
+                data += bytes(self.buffer[:size - first])
+            self.read_pos += size
+            return data
+
+
+class ParecSource:
+    """Raw 16-bit PCM from a PulseAudio source (such as a null sink's monitor) read through parec"""
+
+    def __init__(self, device, rate, channels, block_bytes, on_data):
+        self.device = device
+        self.rate = rate
+        self.channels = channels
+        self.block_bytes = block_bytes
+        self.on_data = on_data
+        self.process = None
+        self.thread = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            ['parec', f'--device={self.device}', '--format=s16le', f'--rate={self.rate}',
+             f'--channels={self.channels}', '--latency-msec=50'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0
+        )
+        self.thread = threading.Thread(target=self._read_loop, name='parec-reader', daemon=True)
+        self.thread.start()
+
+    def _read_loop(self):
+        stream = self.process.stdout
+        while True:
+            data = stream.read(self.block_bytes)
+            if not data:
+                break
+            self.on_data(data)
+
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+        if self.thread:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+
+# soundfile (format, subtype) for compressed segment formats
+SEGMENT_FORMATS = {
+    'flac': ('FLAC', 'PCM_16'),
+    'opus': ('OGG', 'OPUS')
+}
+OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def encode_segment(wav_path, audio_format):
+    """Re-encode a finished WAV segment with soundfile and return the new path"""
+    import soundfile as sf
+
+    file_format, subtype = SEGMENT_FORMATS[audio_format]
+    extension = '.ogg' if file_format == 'OGG' else '.flac'
+    out_path = os.path.splitext(wav_path)[0] + extension
+    with sf.SoundFile(wav_path) as src:
+        with sf.SoundFile(out_path, 'w', samplerate=src.samplerate, channels=src.channels,
+                          format=file_format, subtype=subtype) as dst:
+            for block in src.blocks(blocksize=src.samplerate * 10, dtype='int16'):
+                dst.write(block)
+    os.remove(wav_path)
+    return out_path
+
+
+class SegmentEncoder:
+    """Background thread compressing closed audio segments"""
+
+    def __init__(self, meeting_dir, manifest, audio_format, on_segment_ready=None):
+        self.meeting_dir = meeting_dir
+        self.manifest = manifest
+        self.audio_format = audio_format
+        self.on_segment_ready = on_segment_ready
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='audio-encoder', daemon=True)
+        self.encoded = 0
+        self.failed = 0
+
+    def start(self):
+        self.thread.start()
+
+    def submit(self, index, wav_path):
+        self.queue.put((index, wav_path))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            index, wav_path = item
+            try:
+                out_path = encode_segment(wav_path, self.audio_format)
+                self.manifest.update_segment(
+                    'audio', index,
+                    file=os.path.relpath(out_path, self.meeting_dir),
+                    format=self.audio_format
+                )
+                self.encoded += 1
+            except Exception as e:
+                # The WAV segment stays in place and in the manifest
+                self.failed += 1
+                logger.error(f"Error encoding audio segment {wav_path}: {e}")
+            if self.on_segment_ready:
+                self.on_segment_ready(self.manifest.segments('audio')[index])
+
+    def stop(self, timeout=60):
+        self.queue.put(None)
+        self.thread.join(timeout=timeout)
+        if self.thread.is_alive():
+            logger.warning("Audio segment encoder did not finish in time")
+
+
+class AudioRecorder:
+    """Callback-driven audio capture with a separate thread writing large blocks to disk
+
+    Audio is written as WAV segments of segment_seconds each under
+    <meeting_dir>/audio/ and listed in the meeting manifest as they close, so a
+    crash loses at most the segment being written. With a compressed
+    audio_format, closed segments are re-encoded by a background encoder.
+    on_segment_ready is called with each segment's manifest entry once its
+    final file is on disk.
+
+    With a StreamingVAD, each block is classified as it is written and the
+    speech segments are saved to the manifest. With speech_only, blocks
+    without speech are not stored; each segment then lists the recording
+    time spans it contains.
+
+    With a pulse_device (e.g. a per-session sink's monitor), audio is read
+    through parec instead of a PyAudio input device.
+
+    With a shared clock and timing index, every block is stamped on arrival
+    with the session clock, so the drift of the device's sample clock can be
+    measured and corrected when muxing.
+    """
+
+    def __init__(self, meeting_dir, manifest, rate=16000, channels=1, chunk=1024,
+                 buffer_seconds=10.0, block_seconds=1.0, segment_seconds=300, audio_format='wav',
+                 on_segment_ready=None, vad=None, speech_only=False, pulse_device=None,
+                 clock=None, timing=None):
+        if audio_format not in ('wav',) + tuple(SEGMENT_FORMATS):
+            raise ValueError(f"Unknown audio format: {audio_format}")
+        if audio_format == 'opus' and rate not in OPUS_RATES:
+            logger.warning(f"Opus does not support {rate} Hz, storing audio as FLAC")
+            audio_format = 'flac'
+        self.meeting_dir = meeting_dir
+        self.audio_dir = os.path.join(meeting_dir, 'audio')
+        os.makedirs(self.audio_dir, exist_ok=True)
+        self.manifest = manifest
+        self.rate = rate
+        self.channels = channels
+        self.chunk = chunk
+        self.audio_format = audio_format
+        self.frame_bytes = channels * SAMPLE_WIDTH
+        self.bytes_per_second = rate * self.frame_bytes
+        self.block_bytes = int(self.bytes_per_second * block_seconds)
+        self.segment_frames = int(rate * segment_seconds)
+        self.ring = AudioRingBuffer(int(self.bytes_per_second * buffer_seconds))
+        self.on_segment_ready = on_segment_ready
+        self.vad = vad
+        self.speech_only = speech_only and vad is not None
+        self.encoder = None
+        if audio_format != 'wav':
+            self.encoder = SegmentEncoder(meeting_dir, manifest, audio_format, on_segment_ready)
+        self.pulse_device = pulse_device
+        self.clock = clock
+        self.timing = timing
+        self.frames_stamped = 0
+        self.pyaudio = None
+        self.stream = None
+        self.source = None
+        self.writer_thread = None
+        self.running = False
+        self.device_name = None
+        self.input_overflows = 0
+        self.callbacks = 0
+        self.frames_written = 0
+        self.frames_captured = 0
+        self.frames_skipped = 0
+        self.segments = 0
+
+    def find_device(self):
+        """Find the system audio input device, preferring Stereo Mix"""
+        p = self.pyaudio
+
+        # First try to find Stereo Mix
+        for i in range(p.get_device_count()):
+            try:
+                info = p.get_device_info_by_index(i)
+                if info['maxInputChannels'] > 0:
+                    if 'Stereo Mix' in info['name'] or 'What U Hear' in info['name']:
+                        return i, info['name']
+            except Exception:
+                continue
+
+        # If no Stereo Mix, try to find any working input device
+        for i in range(p.get_device_count()):
+            try:
+                info = p.get_device_info_by_index(i)
+                if info['maxInputChannels'] > 0:
+                    test_stream = p.open(
+                        format=FORMAT,
+                        channels=self.channels,
+                        rate=self.rate,
+                        input=True,
+                        input_device_index=i,
+                        frames_per_buffer=self.chunk,
+                        start=False
+                    )
+                    test_stream.close()
+                    return i, info['name']
+            except Exception:
+                continue
+
+        raise Exception("No working audio input device found")
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        """PyAudio callback: copy the block into the ring and return immediately"""
+        self.callbacks += 1
+        if status & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+            AUDIO_OVERFLOWS.inc(kind='input')
+        if self.ring.write(in_data):
+            self._stamp(in_data)
+        return (None, pyaudio.paContinue)
+
+    def _on_source_data(self, data):
+        self.callbacks += 1
+        if self.ring.write(data):
+            self._stamp(data)
+
+    def _stamp(self, data):
+        """Note how much audio has been kept by now on the session clock
+
+        Only blocks the ring accepted are counted, so a block lost to an
+        overflow doesn't move the timeline past the audio actually written.
+        """
+        self.frames_stamped += len(data) // self.frame_bytes
+        if self.timing:
+            self.timing.mark(AUDIO, self.frames_stamped / self.rate, self.clock.now())
+
+    def _open_segment(self):
+        path = os.path.join(self.audio_dir, f"segment_{self.segments:05d}.wav")
+        wf = wave.open(path, 'wb')
+        wf.setnchannels(self.channels)
+        wf.setsampwidth(SAMPLE_WIDTH)
+        wf.setframerate(self.rate)
+        return {'index': self.segments, 'path': path, 'wave': wf, 'frames': 0, 'spans': []}
+
+    def _close_segment(self, segment):
+        segment['wave'].close()
+        self.segments += 1
+        entry = {
+            'index': segment['index'],
+            'file': os.path.relpath(segment['path'], self.meeting_dir),
+            'format': 'wav',
+            'start_offset': segment['spans'][0][0] if segment['spans'] else 0.0,
+            'duration': segment['frames'] / self.rate,
+            'sample_rate': self.rate,
+            'channels': self.channels
+        }
+        if self.speech_only:
+            entry['spans'] = segment['spans']
+        self.manifest.add_segment('audio', entry)
+        if self.encoder:
+            self.encoder.submit(segment['index'], segment['path'])
+        elif self.on_segment_ready:
+            self.on_segment_ready(self.manifest.segments('audio')[segment['index']])
+
+    def _mono(self, data):
+        samples = np.frombuffer(data, dtype=np.int16)
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1).astype(np.int16)
+        return samples
+
+    @staticmethod
+    def _add_span(segment, start, duration):
+        """Record which stretch of recording time a write covers, merging contiguous writes"""
+        spans = segment['spans']
+        if spans and abs(spans[-1][0] + spans[-1][1] - start) < 1e-6:
+            spans[-1][1] += duration
+        else:
+            spans.append([start, duration])
+
+    def _write_loop(self):
+        """Drain the ring to WAV segments in large blocks, rotating when a segment is full"""
+        segment = None
+        try:
+            while self.running or self.ring.available():
+                data = self.ring.read(self.block_bytes, timeout=0.5)
+                if not data:
+                    continue
+                offset = self.frames_captured / self.rate
+                self.frames_captured += len(data) // self.frame_bytes
+
+                if self.vad:
+                    is_speech = self.vad.is_speech(self._mono(data))
+                    if self.speech_only and not is_speech:
+                        self.frames_skipped += len(data) // self.frame_bytes
+                        continue
+
+                view = memoryview(data)
+                while view:
+                    if segment is None:
+                        segment = self._open_segment()
+                    room = (self.segment_frames - segment['frames']) * self.frame_bytes
+                    part = view[:room]
+                    segment['wave'].writeframes(part)
+                    frames = len(part) // self.frame_bytes
+                    self._add_span(segment, offset, frames / self.rate)
+                    offset += frames / self.rate
+                    segment['frames'] += frames
+                    self.frames_written += frames
+                    view = view[room:]
+                    if segment['frames'] >= self.segment_frames:
+                        self._close_segment(segment)
+                        segment = None
+        except Exception as e:
+            logger.error(f"Error writing audio: {e}")
+        finally:
+            if segment:
+                self._close_segment(segment)
+
+    def start(self):
+        if self.pulse_device:
+            self.device_name = self.pulse_device
+            self.source = ParecSource(self.pulse_device, self.rate, self.channels,
+                                      self.chunk * self.frame_bytes, self._on_source_data)
+            logger.info(f"Using PulseAudio source: {self.pulse_device}")
+        else:
+            self._open_stream()
+
+        self.running = True
+        if self.encoder:
+            self.encoder.start()
+        self.writer_thread = threading.Thread(target=self._write_loop, name='audio-writer', daemon=True)
+        self.writer_thread.start()
+        if self.source:
+            self.source.start()
+        else:
+            self.stream.start_stream()
+        self.manifest.set('audio_started_at', datetime.now(timezone.utc).isoformat())
+        logger.info("Started audio recording")
+
+    def _open_stream(self):
+        self.pyaudio = pyaudio.PyAudio()
+        try:
+            device_index, self.device_name = self.find_device()
+            logger.info(f"Using audio device: {self.device_name} (index: {device_index})")
+
+            self.stream = self.pyaudio.open(
+                format=FORMAT,
+                channels=self.channels,
+                rate=self.rate,
+                input=True,
+                input_device_index=device_index,
+                frames_per_buffer=self.chunk,
+                stream_callback=self._callback,
+                start=False
+            )
+        except Exception:
+            self.pyaudio.terminate()
+            self.pyaudio = None
+            raise
+
+    def stop(self):
+        """Stop the stream, flush buffered audio and close the file"""
+        if self.source:
+            self.source.stop()
+            self.source = None
+        try:
+            if self.stream:
+                self.stream.stop_stream()
+                self.stream.close()
+        except Exception as e:
+            logger.error(f"Error closing audio stream: {e}")
+        finally:
+            self.stream = None
+            if self.pyaudio:
+                self.pyaudio.terminate()
+                self.pyaudio = None
+
+        self.running = False
+        if self.writer_thread:
+            self.writer_thread.join(timeout=10)
+            if self.writer_thread.is_alive():
+                logger.warning("Audio writer did not finish in time")
+            self.writer_thread = None
+        if self.encoder:
+            self.encoder.stop()
+        if self.vad:
+            self.manifest.set('speech_segments', self.vad.finish())
+        logger.info("Audio recording completed")
+
+    def stats(self):
+        return {
+            'device': self.device_name,
+            'sample_rate': self.rate,
+            'channels': self.channels,
+            'format': self.audio_format,
+            'segments': self.segments,
+            'frames_written': self.frames_written,
+            'duration_seconds': round(self.frames_written / self.rate, 2),
+            'recorded_seconds': round(self.frames_captured / self.rate, 2),
+            'silence_skipped_seconds': round(self.frames_skipped / self.rate, 2),
+            'speech_seconds': round(self.vad.speech_frames * self.vad.vad.frame_seconds, 2) if self.vad else None,
+            'callbacks': self.callbacks,
+            'input_overflows': self.input_overflows,
+            'ring_overflows': self.ring.overflows,
+            'ring_overflow_bytes': self.ring.overflow_bytes,
+            'ring_peak_fill': round(self.ring.peak_fill / self.ring.capacity, 3)
+        }
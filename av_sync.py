@@ -0,0 +1,129 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+TIMING_FILE = 'timing.csv'
+VIDEO = 'video'
+AUDIO = 'audio'
+
+
+class SessionClock:
+    """Monotonic clock shared by every capture pipeline of one recording
+
+    now() is seconds since start on time.monotonic, so timestamps from
+    different threads (and the wall-clock anchor stored once) are directly
+    comparable and unaffected by system clock changes.
+    """
+
+    def __init__(self):
+        self.start_monotonic = time.monotonic()
+        self.started_at = datetime.now(timezone.utc)
+
+    def now(self):
+        return time.monotonic() - self.start_monotonic
+
+
+class TimingIndex:
+    """Sidecar timing.csv mapping media positions of each stream to the session clock
+
+    Each row is "stream,media_seconds,clock_seconds": the position in the
+    stream's own timeline (frames / fps, samples / rate) and the session
+    clock time the data was captured. Streams are stamped continuously, but
+    a row is kept only every `interval` seconds per stream, which is plenty
+    to fit a drift line.
+    """
+
+    def __init__(self, meeting_dir, interval=1.0):
+        self.path = os.path.join(meeting_dir, TIMING_FILE)
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last = {}
+        self.rows = 0
+        self.file = open(self.path, 'w', encoding='utf-8', buffering=1 << 16)
+        self.file.write('stream,media_seconds,clock_seconds\n')
+
+    def mark(self, stream, media_seconds, clock_seconds):
+        with self.lock:
+            if not self.file or clock_seconds - self.last.get(stream, -self.interval) < self.interval:
+                return
+            self.last[stream] = clock_seconds
+            self.file.write(f"{stream},{media_seconds:.6f},{clock_seconds:.6f}\n")
+            self.rows += 1
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+
+def load_timing(meeting_dir):
+    """{stream: [(media_seconds, clock_seconds), ...]} from a meeting's timing.csv"""
+    path = os.path.join(meeting_dir, TIMING_FILE)
+    streams = {}
+    if not os.path.exists(path):
+        return streams
+    with open(path, encoding='utf-8') as f:
+        next(f, None)
+        for line in f:
+            try:
+                stream, media, clock = line.strip().split(',')
+                streams.setdefault(stream, []).append((float(media), float(clock)))
+            except ValueError:
+                continue  # A row cut short by a crash
+    return streams
+
+
+def fit_clock(points):
+    """Least-squares clock = offset + rate * media; returns (offset, rate, max residual)"""
+    n = len(points)
+    if n < 2:
+        return None
+    mean_media = sum(media for media, _ in points) / n
+    mean_clock = sum(clock for _, clock in points) / n
+    variance = sum((media - mean_media) ** 2 for media, _ in points)
+    if variance == 0:
+        return None
+    rate = sum((media - mean_media) * (clock - mean_clock) for media, clock in points) / variance
+    offset = mean_clock - rate * mean_media
+    residual = max(abs(clock - (offset + rate * media)) for media, clock in points)
+    return offset, rate, residual
+
+
+def measure_drift(meeting_dir):
+    """Fit each stream's timeline against the session clock and work out the A/V correction
+
+    A stream whose rate is not 1.0 runs fast or slow against the clock (e.g.
+    a sound card clocked at 44.07 kHz instead of 44.1 kHz). Placing audio
+    position t at video time (audio_offset - video_offset + audio_rate * t)
+    / video_rate removes both the start offset and the drift; tempo is the
+    speed change that does this for the audio track.
+    """
+    streams = load_timing(meeting_dir)
+    fits = {stream: fit_clock(points) for stream, points in streams.items()}
+    report = {}
+    for stream, fit in fits.items():
+        if fit:
+            offset, rate, residual = fit
+            report[stream] = {
+                'offset_seconds': round(offset, 6),
+                'rate': rate,
+                'drift_ppm': round((rate - 1.0) * 1e6, 2),
+                'jitter_ms': round(residual * 1000, 2),
+                'duration_seconds': round(streams[stream][-1][0], 3)
+            }
+    if fits.get(VIDEO) and fits.get(AUDIO):
+        video_offset, video_rate, video_residual = fits[VIDEO]
+        audio_offset, audio_rate, audio_residual = fits[AUDIO]
+        duration = streams[AUDIO][-1][0]
+        report['audio_delay_seconds'] = round((audio_offset - video_offset) / video_rate, 6)
+        report['tempo'] = video_rate / audio_rate
+        # Skew at the end of the meeting if the streams were simply laid side by side
+        report['uncorrected_skew_ms'] = round((audio_rate - video_rate) * duration * 1000, 2)
+        # What the linear correction cannot remove: the streams' jitter around their fitted lines
+        report['corrected_skew_ms'] = round((video_residual + audio_residual) * 1000, 2)
+    return report
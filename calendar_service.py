@@ -2,95 +2,302 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from concurrent.futures import ThreadPoolExecutor
 import os.path
+import time
 import datetime
 import logging
 import pytz
-from config import SCOPES, CREDENTIALS_FILE, TOKEN_FILE
+from config import SCOPES, CREDENTIALS_FILE, CALENDAR_CACHE_DB, CALENDAR_SOURCES, CALENDAR_SYNC_DAYS
+from calendar_store import EventStore, to_utc_iso
 
 logger = logging.getLogger(__name__)
 
-class CalendarService:
-    def __init__(self):
+
+def parse_calendar_sources(value):
+    """Parse 'token.json:primary,team@group.calendar.google.com;other_token.json:primary'"""
+    sources = []
+    for entry in value.split(';'):
+        entry = entry.strip()
+        if not entry:
+            continue
+        token_file, _, calendars = entry.partition(':')
+        calendar_ids = [c.strip() for c in calendars.split(',') if c.strip()] or ['primary']
+        sources.append((token_file.strip(), calendar_ids))
+    return sources
+
+
+class CalendarAccount:
+    """One OAuth identity and the calendars read through it"""
+
+    def __init__(self, token_file, calendar_ids, service=None, sync_days=CALENDAR_SYNC_DAYS):
+        self.token_file = token_file
+        self.sync_days = sync_days
+        self.name = os.path.splitext(os.path.basename(token_file))[0]
+        self.calendar_ids = calendar_ids
         self.creds = None
-        self.service = None
-        self.timezone = pytz.timezone('Asia/Kolkata')  # Indian timezone
-        self.authenticate()
+        self.service = service
+        if self.service is None:
+            self.authenticate()
+
+    def calendar_key(self, calendar_id):
+        return f"{self.name}:{calendar_id}"
 
     def authenticate(self):
         """Authenticate with Google Calendar API using OAuth 2.0"""
         try:
-            if os.path.exists(TOKEN_FILE):
-                self.creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-                logger.info("Loaded existing credentials from token file")
+            if os.path.exists(self.token_file):
+                self.creds = Credentials.from_authorized_user_file(self.token_file, SCOPES)
+                logger.info(f"Loaded existing credentials from {self.token_file}")
 
             if not self.creds or not self.creds.valid:
                 if self.creds and self.creds.expired and self.creds.refresh_token:
                     logger.info("Refreshing expired credentials")
                     self.creds.refresh(Request())
                 else:
-                    logger.info("Starting new OAuth2 flow")
+                    logger.info(f"Starting new OAuth2 flow for {self.token_file}")
                     if not os.path.exists(CREDENTIALS_FILE):
                         logger.error(f"Credentials file not found: {CREDENTIALS_FILE}")
                         raise FileNotFoundError(f"Missing {CREDENTIALS_FILE}")
-                    
+
                     flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
                     self.creds = flow.run_local_server(port=0)
-                
+
                 # Save the credentials for the next run
-                with open(TOKEN_FILE, 'w') as token:
+                with open(self.token_file, 'w') as token:
                     token.write(self.creds.to_json())
-                logger.info("Saved new credentials to token file")
+                logger.info(f"Saved new credentials to {self.token_file}")
 
             self.service = build('calendar', 'v3', credentials=self.creds)
-            logger.info("Successfully initialized Calendar service")
-            
+            logger.info(f"Successfully initialized Calendar service for {self.name}")
+
         except Exception as e:
             logger.error(f"Authentication error: {e}")
             raise
 
+    def full_sync_window(self):
+        """Full syncs start a day back so meetings in progress are included, and end sync_days ahead"""
+        now = datetime.datetime.now(pytz.UTC)
+        return now - datetime.timedelta(days=1), now + datetime.timedelta(days=self.sync_days)
+
+    def list_params(self, calendar_id, sync_token, page_token=None, window=None):
+        params = {'calendarId': calendar_id, 'singleEvents': True, 'maxResults': 250}
+        if sync_token:
+            params['syncToken'] = sync_token
+        else:
+            # Without timeMax, recurring meetings with no end expand into every future occurrence
+            time_min, time_max = window or self.full_sync_window()
+            params['timeMin'] = time_min.isoformat()
+            params['timeMax'] = time_max.isoformat()
+        if page_token:
+            params['pageToken'] = page_token
+        return params
+
+    def list_changed_events(self, calendar_id, sync_token, first_page=None, window=None):
+        """Page through events changed since sync_token (or all events in the window for a full sync)"""
+        events = []
+        result = first_page
+        while True:
+            if result is None:
+                result = self.service.events().list(
+                    **self.list_params(calendar_id, sync_token, window=window)
+                ).execute()
+            events.extend(result.get('items', []))
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                return events, result.get('nextSyncToken')
+            result = self.service.events().list(
+                **self.list_params(calendar_id, sync_token, page_token, window)
+            ).execute()
+
+    def fetch_first_pages(self, sync_tokens, window):
+        """Fetch the first page of every calendar in one batched HTTP request
+
+        Returns {calendar_id: (response, exception)}; services without batch
+        support (such as test fakes) are queried one calendar at a time.
+        """
+        results = {}
+        if len(self.calendar_ids) < 2 or not hasattr(self.service, 'new_batch_http_request'):
+            for calendar_id in self.calendar_ids:
+                try:
+                    results[calendar_id] = (self.service.events().list(
+                        **self.list_params(calendar_id, sync_tokens.get(calendar_id), window=window)
+                    ).execute(), None)
+                except Exception as e:
+                    results[calendar_id] = (None, e)
+            return results
+
+        def callback(request_id, response, exception):
+            results[request_id] = (response, exception)
+
+        batch = self.service.new_batch_http_request(callback=callback)
+        for calendar_id in self.calendar_ids:
+            batch.add(
+                self.service.events().list(
+                    **self.list_params(calendar_id, sync_tokens.get(calendar_id), window=window)
+                ),
+                request_id=calendar_id
+            )
+        batch.execute()
+        return results
+
+    def fetch_changes(self, store):
+        """Get changed events for all of this account's calendars
+
+        Returns {calendar_key: (events, next_sync_token, window_end)}, where
+        window_end is the end of the time window read by a full sync and None
+        for an incremental one. A calendar whose full-sync window is about to
+        run out is fully synced again over a new window, so later meetings
+        that were never changed still reach the cache.
+        """
+        window = self.full_sync_window()
+        renew_before = datetime.datetime.now(pytz.UTC) + datetime.timedelta(days=1)
+        sync_tokens = {}
+        for calendar_id in self.calendar_ids:
+            key = self.calendar_key(calendar_id)
+            window_end = store.get_window_end(key)
+            if window_end is None or window_end < renew_before:
+                sync_tokens[calendar_id] = None
+            else:
+                sync_tokens[calendar_id] = store.get_sync_token(key)
+        first_pages = self.fetch_first_pages(sync_tokens, window)
+
+        changes = {}
+        for calendar_id in self.calendar_ids:
+            key = self.calendar_key(calendar_id)
+            sync_token = sync_tokens[calendar_id]
+            response, exception = first_pages.get(calendar_id, (None, None))
+            try:
+                if exception is not None:
+                    raise exception
+                events, next_sync_token = self.list_changed_events(calendar_id, sync_token, response, window)
+            except HttpError as e:
+                if e.resp.status != 410:
+                    logger.error(f"Error fetching calendar {key}: {e}")
+                    continue
+                # Sync token expired: drop the cache and do a full sync
+                logger.warning(f"Sync token for {key} expired, doing a full sync")
+                store.reset(key)
+                sync_token = None
+                events, next_sync_token = self.list_changed_events(calendar_id, None, window=window)
+            except Exception as e:
+                logger.error(f"Error fetching calendar {key}: {e}")
+                continue
+            changes[key] = (events, next_sync_token, None if sync_token else window[1])
+        return changes
+
+
+class CalendarService:
+    def __init__(self, accounts=None, store=None):
+        self.timezone = pytz.timezone('Asia/Kolkata')  # Indian timezone
+        self.store = store or EventStore(CALENDAR_CACHE_DB)
+        self.change_listeners = []
+        if accounts is None:
+            accounts = [CalendarAccount(token_file, calendar_ids)
+                        for token_file, calendar_ids in parse_calendar_sources(CALENDAR_SOURCES)]
+        self.accounts = accounts
+        self.executor = ThreadPoolExecutor(max_workers=max(len(accounts), 1), thread_name_prefix='calendar')
+
+    def calendar_keys(self):
+        return [account.calendar_key(c) for account in self.accounts for c in account.calendar_ids]
+
+    def add_change_listener(self, callback):
+        """Register callback(change, meeting) for added, moved, updated and cancelled meetings"""
+        self.change_listeners.append(callback)
+
+    def notify(self, change, meeting):
+        for callback in self.change_listeners:
+            try:
+                callback(change, meeting)
+            except Exception as e:
+                logger.error(f"Error in calendar change listener: {e}")
+
+    def sync(self):
+        """Pull changed events for all calendars into the local store and notify listeners
+
+        Accounts are fetched concurrently (each account's calendars in one
+        batched request), so a refresh takes as long as the slowest account.
+        """
+        started = time.monotonic()
+        futures = [self.executor.submit(account.fetch_changes, self.store) for account in self.accounts]
+
+        changes = []
+        for future in futures:
+            try:
+                fetched = future.result()
+            except Exception as e:
+                logger.error(f"Error syncing calendar account: {e}")
+                continue
+            for key, (events, next_sync_token, window_end) in fetched.items():
+                calendar_changes = []
+                for event in events:
+                    change = self.store.apply(key, event)
+                    if change:
+                        calendar_changes.append(change)
+                if next_sync_token:
+                    self.store.set_sync_token(key, next_sync_token, window_end)
+                logger.info(f"Synced {key}: {len(events)} changed events, {len(calendar_changes)} meeting changes"
+                            f"{' (full sync)' if window_end else ''}")
+                changes.extend(calendar_changes)
+
+        # Meetings are only needed until they end; keep a day for ones that overrun
+        pruned = self.store.prune(datetime.datetime.now(pytz.UTC) - datetime.timedelta(days=1))
+        if pruned:
+            logger.info(f"Removed {pruned} ended meetings from the calendar cache")
+
+        logger.info(f"Calendar sync of {len(self.calendar_keys())} calendars took {time.monotonic() - started:.2f}s")
+        for change, meeting in changes:
+            logger.info(f"Meeting {change}: {meeting['summary']} at {meeting['start']}")
+            self.notify(change, meeting)
+        return changes
+
+    @staticmethod
+    def merge_meetings(meetings):
+        """Drop copies of the same Meet event seen through several calendars"""
+        merged = []
+        seen = {}
+        for meeting in meetings:
+            start = to_utc_iso(meeting['start'])
+            keys = [('link', meeting['meet_link'], start)]
+            if meeting.get('ical_uid'):
+                keys.append(('uid', meeting['ical_uid'], start))
+            existing = next((seen[key] for key in keys if key in seen), None)
+            if existing is not None:
+                existing['calendars'].append(meeting['calendar'])
+                continue
+            meeting = dict(meeting, calendars=[meeting['calendar']])
+            merged.append(meeting)
+            for key in keys:
+                seen[key] = meeting
+        return merged
+
     def get_upcoming_meetings(self, time_window_minutes=60):
-        """Get upcoming Google Meet meetings within the specified time window"""
+        """Get upcoming Google Meet meetings from all calendars within the specified time window"""
+        try:
+            self.sync()
+        except Exception as e:
+            # Serve the cached events if the API is unreachable
+            logger.error(f"Error syncing calendar: {e}")
+            import traceback
+            logger.error(f"Traceback: {traceback.format_exc()}")
+
         try:
             # Get current time in UTC
             now = datetime.datetime.now(pytz.UTC)
             time_window = now + datetime.timedelta(minutes=time_window_minutes)
 
             logger.info(f"Fetching meetings between {now} and {time_window}")
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=now.isoformat(),
-                timeMax=time_window.isoformat(),
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-
-            meetings = []
-            for event in events_result.get('items', []):
-                # Check if event has Google Meet link
-                if 'hangoutLink' in event:
-                    # Ensure timezone information is preserved
-                    start = event['start'].get('dateTime')
-                    end = event['end'].get('dateTime')
-                    
-                    if start and end:  # Only process events with specific times (not all-day events)
-                        meeting_info = {
-                            'id': event['id'],
-                            'summary': event['summary'],
-                            'start': start,
-                            'end': end,
-                            'meet_link': event['hangoutLink']
-                        }
-                        meetings.append(meeting_info)
-                        
-                        # Convert to local time for logging
-                        start_local = datetime.datetime.fromisoformat(start).astimezone(self.timezone)
-                        logger.info(f"Found meeting: {meeting_info['summary']} at {start_local}")
+            meetings = self.merge_meetings(self.store.upcoming(now, time_window, self.calendar_keys()))
+            for meeting_info in meetings:
+                # Convert to local time for logging
+                start_local = datetime.datetime.fromisoformat(meeting_info['start']).astimezone(self.timezone)
+                logger.info(f"Found meeting: {meeting_info['summary']} at {start_local}")
 
             return meetings
-            
+
         except Exception as e:
             logger.error(f"Error fetching meetings: {e}")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
-            return [] 
\ No newline at end of file
+            return []
\ No newline at end of file
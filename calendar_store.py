@@ -0,0 +1,176 @@
+import sqlite3
+import logging
+import threading
+import datetime
+import pytz
+
+logger = logging.getLogger(__name__)
+
+ADDED = 'added'
+MOVED = 'moved'
+UPDATED = 'updated'
+CANCELLED = 'cancelled'
+
+
+def to_utc_iso(value):
+    """Normalize a Calendar API dateTime string to a UTC ISO string (sortable as text)"""
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = pytz.UTC.localize(parsed)
+    return parsed.astimezone(pytz.UTC).isoformat()
+
+
+def event_to_meeting(event):
+    """Convert a Calendar API event to a meeting dict, or None if it is not a timed Meet event"""
+    if event.get('status') == 'cancelled' or 'hangoutLink' not in event:
+        return None
+    start = event.get('start', {}).get('dateTime')
+    end = event.get('end', {}).get('dateTime')
+    if not start or not end:  # Skip all-day events
+        return None
+    return {
+        'id': event['id'],
+        'ical_uid': event.get('iCalUID'),
+        'summary': event.get('summary', '(no title)'),
+        'start': start,
+        'end': end,
+        'meet_link': event['hangoutLink']
+    }
+
+
+class EventStore:
+    """Persistent SQLite cache of Meet events and per-calendar sync tokens"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS events (
+                    calendar_key TEXT NOT NULL,
+                    event_id TEXT NOT NULL,
+                    ical_uid TEXT,
+                    summary TEXT,
+                    start TEXT NOT NULL,
+                    end TEXT NOT NULL,
+                    start_utc TEXT NOT NULL,
+                    end_utc TEXT NOT NULL,
+                    meet_link TEXT NOT NULL,
+                    PRIMARY KEY (calendar_key, event_id)
+                );
+                CREATE INDEX IF NOT EXISTS events_by_time ON events (start_utc, end_utc);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    calendar_key TEXT PRIMARY KEY,
+                    sync_token TEXT,
+                    synced_at TEXT,
+                    window_end TEXT
+                );
+            """)
+            columns = [row['name'] for row in self.conn.execute("PRAGMA table_info(sync_state)")]
+            if 'window_end' not in columns:
+                # Caches created before full syncs were bounded
+                self.conn.execute("ALTER TABLE sync_state ADD COLUMN window_end TEXT")
+
+    def get_sync_token(self, calendar_key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT sync_token FROM sync_state WHERE calendar_key = ?", (calendar_key,)
+            ).fetchone()
+        return row['sync_token'] if row else None
+
+    def get_window_end(self, calendar_key):
+        """End of the time window the calendar's last full sync covered, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT window_end FROM sync_state WHERE calendar_key = ?", (calendar_key,)
+            ).fetchone()
+        return datetime.datetime.fromisoformat(row['window_end']) if row and row['window_end'] else None
+
+    def set_sync_token(self, calendar_key, sync_token, window_end=None):
+        """Save the next sync token; window_end is given after a full sync and kept otherwise"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                """INSERT OR REPLACE INTO sync_state (calendar_key, sync_token, synced_at, window_end)
+                   VALUES (?, ?, ?, COALESCE(?, (SELECT window_end FROM sync_state WHERE calendar_key = ?)))""",
+                (calendar_key, sync_token, datetime.datetime.now(pytz.UTC).isoformat(),
+                 window_end.astimezone(pytz.UTC).isoformat() if window_end else None, calendar_key)
+            )
+
+    def reset(self, calendar_key):
+        """Forget a calendar's events and sync token before a full resync"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM events WHERE calendar_key = ?", (calendar_key,))
+            self.conn.execute("DELETE FROM sync_state WHERE calendar_key = ?", (calendar_key,))
+
+    def apply(self, calendar_key, event):
+        """Store one changed event and return (change, meeting), or None if nothing changed"""
+        meeting = event_to_meeting(event)
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT * FROM events WHERE calendar_key = ? AND event_id = ?",
+                (calendar_key, event['id'])
+            ).fetchone()
+            old = self._row_to_meeting(row) if row else None
+
+            if meeting is None:
+                if old is None:
+                    return None
+                self.conn.execute(
+                    "DELETE FROM events WHERE calendar_key = ? AND event_id = ?",
+                    (calendar_key, event['id'])
+                )
+                return CANCELLED, old
+
+            self.conn.execute(
+                """INSERT OR REPLACE INTO events
+                   (calendar_key, event_id, ical_uid, summary, start, end, start_utc, end_utc, meet_link)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (calendar_key, meeting['id'], meeting['ical_uid'], meeting['summary'],
+                 meeting['start'], meeting['end'], to_utc_iso(meeting['start']),
+                 to_utc_iso(meeting['end']), meeting['meet_link'])
+            )
+
+        meeting['calendar'] = calendar_key
+        if old is None:
+            return ADDED, meeting
+        if (to_utc_iso(old['start']), to_utc_iso(old['end'])) != (to_utc_iso(meeting['start']), to_utc_iso(meeting['end'])):
+            return MOVED, meeting
+        if old['summary'] != meeting['summary'] or old['meet_link'] != meeting['meet_link']:
+            return UPDATED, meeting
+        return None
+
+    def prune(self, before):
+        """Delete meetings that ended before the given time; returns how many"""
+        with self.lock, self.conn:
+            cursor = self.conn.execute("DELETE FROM events WHERE end_utc < ?",
+                                       (before.astimezone(pytz.UTC).isoformat(),))
+        return cursor.rowcount
+
+    def upcoming(self, start, end, calendar_keys=None):
+        """Meetings overlapping [start, end), ordered by start time"""
+        query = "SELECT * FROM events WHERE end_utc > ? AND start_utc < ?"
+        params = [start.astimezone(pytz.UTC).isoformat(), end.astimezone(pytz.UTC).isoformat()]
+        if calendar_keys is not None:
+            query += f" AND calendar_key IN ({','.join('?' * len(calendar_keys))})"
+            params.extend(calendar_keys)
+        query += " ORDER BY start_utc"
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [self._row_to_meeting(row) for row in rows]
+
+    @staticmethod
+    def _row_to_meeting(row):
+        return {
+            'id': row['event_id'],
+            'ical_uid': row['ical_uid'],
+            'summary': row['summary'],
+            'start': row['start'],
+            'end': row['end'],
+            'meet_link': row['meet_link'],
+            'calendar': row['calendar_key']
+        }
+
+    def close(self):
+        self.conn.close()
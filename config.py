@@ -8,15 +8,187 @@ load_dotenv()
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
 CREDENTIALS_FILE = 'credentials.json'
 TOKEN_FILE = 'token.json'
+# Local SQLite cache of calendar events, kept current with incremental sync
+CALENDAR_CACHE_DB = os.getenv('CALENDAR_CACHE_DB', 'calendar_cache.db')
+# Calendars to watch: 'token_file:calendar_id,calendar_id;other_token_file:calendar_id'
+# Each token file is one Google account; accounts are fetched concurrently
+CALENDAR_SOURCES = os.getenv('CALENDAR_SOURCES', f'{TOKEN_FILE}:primary')
+# A full sync reads this many days ahead (recurring events are expanded into
+# single meetings, so it must be bounded); it is redone when a day is left
+CALENDAR_SYNC_DAYS = float(os.getenv('CALENDAR_SYNC_DAYS', '7'))
+
+# Meeting scheduling
+# Join meetings this many minutes before they start
+JOIN_LEAD_MINUTES = float(os.getenv('JOIN_LEAD_MINUTES', '5'))
+# Calendar refresh interval bounds: frequent when a meeting is close, rare when the day is empty
+MIN_CALENDAR_REFRESH_SECONDS = float(os.getenv('MIN_CALENDAR_REFRESH_SECONDS', '60'))
+MAX_CALENDAR_REFRESH_SECONDS = float(os.getenv('MAX_CALENDAR_REFRESH_SECONDS', '900'))
 
 # Recording Configuration
 RECORDING_DIR = 'recordings'
 TRANSCRIPTION_DIR = 'transcriptions'
 
+# Screen recording mode:
+#   fullscreen - whole primary monitor at native resolution
+#   meet_tab   - only the Meet content area of the browser window
+#   scaled     - whole screen resized to RECORDING_OUTPUT_SIZE
+#   slides     - Meet content area, resized to RECORDING_OUTPUT_SIZE, grayscale
+RECORDING_MODE = os.getenv('RECORDING_MODE', 'fullscreen')
+# Output resolution for the scaled and slides modes
+RECORDING_OUTPUT_SIZE = tuple(int(v) for v in os.getenv('RECORDING_OUTPUT_SIZE', '1280x720').lower().split('x'))
+
+# Skip converting and queueing frames whose content has not changed, and
+# save a keyframe index of the moments it did
+CHANGE_DETECTION = os.getenv('CHANGE_DETECTION', 'true').lower() == 'true'
+# Mean absolute pixel difference (0-255) of a block that counts as a change
+CHANGE_THRESHOLD = float(os.getenv('CHANGE_THRESHOLD', '3.0'))
+
+# Where video frames come from:
+#   screen     - grab the screen (or virtual display) region
+#   screencast - Chrome's DevTools screencast of the Meet tab, sent only when the page repaints
+VIDEO_SOURCE = os.getenv('VIDEO_SOURCE', 'screen')
+# JPEG quality (0-100) of screencast frames
+SCREENCAST_QUALITY = int(os.getenv('SCREENCAST_QUALITY', '80'))
+
+# Frame rate declared to the video writer; capture is paced to match it
+VIDEO_FPS = float(os.getenv('VIDEO_FPS', '20'))
+# Preallocated frame slots between the capture thread and the encoder
+VIDEO_RING_SLOTS = int(os.getenv('VIDEO_RING_SLOTS', '8'))
+# What to do when the encoder falls behind: 'drop_newest' or 'drop_oldest'
+VIDEO_DROP_POLICY = os.getenv('VIDEO_DROP_POLICY', 'drop_newest')
+# Run the video encoder in a separate process instead of a thread
+VIDEO_ENCODER_PROCESS = os.getenv('VIDEO_ENCODER_PROCESS', 'false').lower() == 'true'
+# Video is written as independently playable segments of this many seconds
+VIDEO_SEGMENT_SECONDS = float(os.getenv('VIDEO_SEGMENT_SECONDS', '60'))
+
+# Seconds between caption drains from the Meet page
+CAPTION_DRAIN_INTERVAL = float(os.getenv('CAPTION_DRAIN_INTERVAL', '2.0'))
+# Captions kept in the page's ring buffer between drains
+CAPTION_BUFFER_SIZE = int(os.getenv('CAPTION_BUFFER_SIZE', '500'))
+# Milliseconds a caption must stay unchanged before it is committed as one utterance
+CAPTION_IDLE_COMMIT_MS = int(os.getenv('CAPTION_IDLE_COMMIT_MS', '1500'))
+# Seconds between flushes and fsyncs of a meeting's captions.jsonl
+CAPTION_FSYNC_SECONDS = float(os.getenv('CAPTION_FSYNC_SECONDS', '10'))
+# SQLite full-text index over every meeting's captions and speech transcript
+TRANSCRIPT_INDEX_DB = os.getenv('TRANSCRIPT_INDEX_DB', os.path.join(TRANSCRIPTION_DIR, 'transcripts.db'))
+
+# Audio capture (16 kHz mono is plenty for speech)
+AUDIO_RATE = int(os.getenv('AUDIO_RATE', '16000'))
+AUDIO_CHANNELS = int(os.getenv('AUDIO_CHANNELS', '1'))
+# Audio is stored in segments of this many minutes
+AUDIO_SEGMENT_MINUTES = float(os.getenv('AUDIO_SEGMENT_MINUTES', '1'))
+# Segment storage format: 'wav', 'flac' or 'opus'
+AUDIO_FORMAT = os.getenv('AUDIO_FORMAT', 'flac')
+# Run voice activity detection on the audio as it is recorded
+AUDIO_VAD = os.getenv('AUDIO_VAD', 'true').lower() == 'true'
+# Only store audio blocks that contain speech (requires AUDIO_VAD)
+AUDIO_SPEECH_ONLY = os.getenv('AUDIO_SPEECH_ONLY', 'false').lower() == 'true'
+# Seconds of audio the capture ring can hold while the writer catches up
+AUDIO_BUFFER_SECONDS = float(os.getenv('AUDIO_BUFFER_SECONDS', '10'))
+# Seconds of audio written to disk per block
+AUDIO_WRITE_BLOCK_SECONDS = float(os.getenv('AUDIO_WRITE_BLOCK_SECONDS', '1'))
+
+# Offline speech-to-text of the recorded audio; needs the backend's package (e.g. pocketsphinx) installed
+TRANSCRIBE_AUDIO = os.getenv('TRANSCRIBE_AUDIO', 'false').lower() == 'true'
+# Transcribe each audio segment as soon as it closes instead of after the meeting
+LIVE_TRANSCRIPTION = os.getenv('LIVE_TRANSCRIPTION', 'false').lower() == 'true'
+# speech_recognition backend: 'sphinx', 'whisper' or 'vosk'
+TRANSCRIPTION_BACKEND = os.getenv('TRANSCRIPTION_BACKEND', 'sphinx')
+# Worker processes for transcription (0 = half the CPU cores)
+TRANSCRIPTION_WORKERS = int(os.getenv('TRANSCRIPTION_WORKERS', '0'))
+
 # Create necessary directories if they don't exist
 os.makedirs(RECORDING_DIR, exist_ok=True)
 os.makedirs(TRANSCRIPTION_DIR, exist_ok=True)
 
 # Browser configuration
 CHROME_PROFILE_PATH = os.path.join(os.getcwd(), 'chrome_profile')
-os.makedirs(CHROME_PROFILE_PATH, exist_ok=True) 
\ No newline at end of file
+# Chrome executable; leave empty to let the driver find it
+CHROME_BINARY = os.getenv(
+    'CHROME_BINARY', r'C:\Program Files\Google\Chrome\Application\chrome.exe' if os.name == 'nt' else ''
+)
+# Where the browser runs:
+#   desktop - on the current desktop (needs a monitor or remote session)
+#   xvfb    - on its own Xvfb virtual display, for Linux servers without a monitor
+#   headless - Chrome headless mode; video always comes from the DevTools screencast
+BROWSER_DISPLAY = os.getenv('BROWSER_DISPLAY', 'desktop')
+VIRTUAL_DISPLAY_SIZE = tuple(int(v) for v in os.getenv('VIRTUAL_DISPLAY_SIZE', '1920x1080').lower().split('x'))
+# With xvfb, give each browser its own PulseAudio null sink and record from its monitor
+VIRTUAL_AUDIO = os.getenv('VIRTUAL_AUDIO', 'true').lower() == 'true'
+# Which Meet selector worked last, per Meet UI version
+MEET_SELECTOR_CACHE = os.getenv('MEET_SELECTOR_CACHE', 'meet_selectors.json')
+os.makedirs(CHROME_PROFILE_PATH, exist_ok=True) 
+
+# Recorder pool: overlapping meetings are recorded in separate slots, each
+# with its own copy of the Chrome profile. Slots only record different
+# meetings when every browser has its own display and audio sink; on the
+# desktop they would all capture the same screen and sound card, so there
+# is one slot unless the browsers are isolated
+RECORDER_ISOLATED = BROWSER_DISPLAY in ('xvfb', 'headless') and VIRTUAL_AUDIO
+RECORDER_SLOTS = int(os.getenv('RECORDER_SLOTS', '2' if RECORDER_ISOLATED else '1'))
+RECORDER_PROFILE_DIR = os.path.join(os.getcwd(), 'chrome_profiles')
+# Admission control: don't start another recording below this much free memory or above this CPU load
+RECORDER_MIN_FREE_MEMORY_MB = float(os.getenv('RECORDER_MIN_FREE_MEMORY_MB', '1500'))
+RECORDER_MAX_CPU_PERCENT = float(os.getenv('RECORDER_MAX_CPU_PERCENT', '85'))
+# Seconds between per-slot CPU/memory samples, and before retrying a meeting that was not admitted
+RECORDER_SAMPLE_SECONDS = float(os.getenv('RECORDER_SAMPLE_SECONDS', '10'))
+RECORDER_ADMISSION_RETRY_SECONDS = float(os.getenv('RECORDER_ADMISSION_RETRY_SECONDS', '30'))
+# Launch a standby browser this long before each scheduled join, and reuse a
+# browser for this many meetings before restarting it
+BROWSER_WARM_LEAD_SECONDS = float(os.getenv('BROWSER_WARM_LEAD_SECONDS', '90'))
+BROWSER_MAX_SESSIONS = int(os.getenv('BROWSER_MAX_SESSIONS', '5'))
+
+# Post-processing of finished meetings: mux, re-encode to MP4, thumbnails, metadata
+POSTPROCESS = os.getenv('POSTPROCESS', 'true').lower() == 'true'
+# Meetings post-processed at once (each in its own worker process)
+POSTPROCESS_WORKERS = int(os.getenv('POSTPROCESS_WORKERS', '1'))
+# How much to lower the workers' priority, so live recordings always come first
+POSTPROCESS_NICENESS = int(os.getenv('POSTPROCESS_NICENESS', '10'))
+POSTPROCESS_DB = os.getenv('POSTPROCESS_DB', os.path.join(RECORDING_DIR, 'postprocess.db'))
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+# H.264 preset/quality and threads per ffmpeg run
+POSTPROCESS_PRESET = os.getenv('POSTPROCESS_PRESET', 'veryfast')
+POSTPROCESS_CRF = int(os.getenv('POSTPROCESS_CRF', '28'))
+POSTPROCESS_THREADS = int(os.getenv('POSTPROCESS_THREADS', '2'))
+POSTPROCESS_AUDIO_BITRATE = os.getenv('POSTPROCESS_AUDIO_BITRATE', '64k')
+# Keep the recorded video segments after the MP4 is made
+POSTPROCESS_KEEP_SOURCE = os.getenv('POSTPROCESS_KEEP_SOURCE', 'true').lower() == 'true'
+# Frames in the thumbnail strip and their height in pixels
+POSTPROCESS_THUMBNAILS = int(os.getenv('POSTPROCESS_THUMBNAILS', '10'))
+POSTPROCESS_THUMBNAIL_HEIGHT = int(os.getenv('POSTPROCESS_THUMBNAIL_HEIGHT', '120'))
+# Largest audio/video clock drift corrected when muxing; a fit beyond this is
+# treated as a bad measurement and the streams are aligned by start time only
+POSTPROCESS_MAX_DRIFT_PPM = float(os.getenv('POSTPROCESS_MAX_DRIFT_PPM', '500'))
+
+# Disk budget for RECORDING_DIR (0 turns a limit or rule off)
+STORAGE_DB = os.getenv('STORAGE_DB', os.path.join(RECORDING_DIR, 'storage.db'))
+STORAGE_QUOTA_GB = float(os.getenv('STORAGE_QUOTA_GB', '0'))
+# Which meetings give up space first when over quota: 'lru' (least recently searched or recorded) or 'age'
+STORAGE_POLICY = os.getenv('STORAGE_POLICY', 'lru')
+# Delete the video of meetings older than this, keeping audio and transcripts
+STORAGE_DOWNGRADE_DAYS = float(os.getenv('STORAGE_DOWNGRADE_DAYS', '0'))
+# Cold storage directory (e.g. a larger, slower disk); meetings older than STORAGE_COLD_DAYS move there
+STORAGE_COLD_DIR = os.getenv('STORAGE_COLD_DIR', '')
+STORAGE_COLD_DAYS = float(os.getenv('STORAGE_COLD_DAYS', '0'))
+# Delete meetings older than this entirely
+STORAGE_RETENTION_DAYS = float(os.getenv('STORAGE_RETENTION_DAYS', '0'))
+# Disk space to leave free after a recording; below it meetings are recorded as audio only, or not at all
+STORAGE_MIN_FREE_MB = float(os.getenv('STORAGE_MIN_FREE_MB', '2048'))
+# Expected video bitrate, used to predict a meeting's size until there are past meetings to learn from
+STORAGE_VIDEO_KBPS = float(os.getenv('STORAGE_VIDEO_KBPS', '2000'))
+# The rules are applied after every recording and also this often (0 turns the periodic pass off)
+STORAGE_ENFORCE_MINUTES = float(os.getenv('STORAGE_ENFORCE_MINUTES', '60'))
+
+# Metrics: Prometheus text at http://METRICS_HOST:METRICS_PORT/metrics (0 turns the endpoint off)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9464'))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+# JSON snapshot of all metrics, rewritten every METRICS_SNAPSHOT_SECONDS (0 = off)
+METRICS_SNAPSHOT_FILE = os.getenv('METRICS_SNAPSHOT_FILE', 'metrics.json')
+METRICS_SNAPSHOT_SECONDS = float(os.getenv('METRICS_SNAPSHOT_SECONDS', '60'))
+# Seconds between per-thread CPU and process memory samples
+METRICS_SAMPLE_SECONDS = float(os.getenv('METRICS_SAMPLE_SECONDS', '5'))
+# Run the sampling profiler from startup (it can also be toggled at /profile/start and /profile/stop)
+PROFILER = os.getenv('PROFILER', 'false').lower() == 'true'
+PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', '10'))
+# Folded stacks (flamegraph input) saved here on exit
+PROFILE_FILE = os.getenv('PROFILE_FILE', 'profile.folded')
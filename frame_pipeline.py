@@ -0,0 +1,321 @@
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+
+# Slot index telling the encoder to write its last frame again
+REPEAT_LAST = -1
+
+FRAMES_DROPPED = metrics.counter('meet_notes_video_frames_dropped_total',
+                                 'Frames dropped because the encoder fell behind')
+ENCODE_SECONDS = metrics.histogram('meet_notes_video_encode_seconds', 'Time to encode one output frame')
+# Encode times are sent to the publisher thread in batches of this many frames
+ENCODE_TIMING_BATCH = 50
+
+
+class FrameRing:
+    """Bounded pool of preallocated frame slots shared by the capture and encoder sides
+
+    Slot indices circulate between a free queue and a filled queue, so frames
+    are never allocated or copied between capture and encode. The encoder
+    keeps the slot it wrote last until the next one arrives, so unchanged
+    frames can be repeated by reference with repeat_last. With
+    use_processes the slots live in shared memory and the queues are
+    multiprocessing queues, so the encoder can run in another process.
+    """
+
+    def __init__(self, slots, shape, drop_policy=DROP_NEWEST, use_processes=False):
+        if drop_policy not in (DROP_NEWEST, DROP_OLDEST):
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        if slots < 2:
+            raise ValueError("A frame ring needs at least two slots")
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.drop_policy = drop_policy
+        self.use_processes = use_processes
+        self.shm = None
+
+        nbytes = slots * int(np.prod(self.shape))
+        if use_processes:
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf)
+            self.free = multiprocessing.Queue()
+            self.filled = multiprocessing.Queue()
+        else:
+            self.frames = np.empty((slots,) + self.shape, dtype=np.uint8)
+            self.free = queue.Queue()
+            self.filled = queue.Queue()
+
+        for index in range(slots):
+            self.free.put(index)
+
+        # Producer-side counters
+        self.enqueued = 0
+        self.dropped = 0
+        self.repeated = 0
+        # Repeats owed by dropped frames, added to the next committed frame so
+        # the encoded frame count still follows the wall clock
+        self.carry = 0
+
+    def acquire(self):
+        """Get a free slot index for the next frame, or None if the frame must be dropped"""
+        try:
+            return self.free.get_nowait()
+        except queue.Empty:
+            pass
+
+        if self.drop_policy == DROP_OLDEST:
+            while True:
+                try:
+                    index, repeat = self.filled.get_nowait()
+                except queue.Empty:
+                    break
+                self.carry += repeat
+                self.dropped += 1
+                FRAMES_DROPPED.inc()
+                if index != REPEAT_LAST:
+                    return index
+        return None
+
+    def drop(self, repeat):
+        """Record a frame that could not be queued"""
+        self.carry += repeat
+        self.dropped += 1
+        FRAMES_DROPPED.inc()
+
+    def commit(self, index, repeat):
+        """Hand a filled slot to the encoder"""
+        self.filled.put((index, repeat + self.carry))
+        self.carry = 0
+        self.enqueued += 1
+
+    def repeat_last(self, repeat):
+        """Ask the encoder to write the previous frame again instead of a new one"""
+        self.filled.put((REPEAT_LAST, repeat + self.carry))
+        self.carry = 0
+        self.repeated += repeat
+
+    def close(self):
+        """Tell the encoder no more frames are coming"""
+        self.filled.put(None)
+
+    def release(self):
+        """Free shared memory once the encoder has exited"""
+        if self.shm:
+            self.frames = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class SegmentedVideoWriter:
+    """Writes video as a run of fixed-length AVI files instead of one monolithic file
+
+    Every segment_frames frames the current file is finalized and a new one
+    is started, so each closed segment is a complete, playable file and a
+    crash loses at most the segment being written. on_closed is called with
+    each closed segment's manifest entry.
+    """
+
+    def __init__(self, video_dir, fps, size, is_color, segment_frames, on_closed):
+        self.video_dir = video_dir
+        self.fps = fps
+        self.size = size
+        self.is_color = is_color
+        self.segment_frames = max(1, int(segment_frames))
+        self.on_closed = on_closed
+        self.fourcc = cv2.VideoWriter_fourcc(*'XVID')
+        self.writer = None
+        self.index = 0
+        self.frames = 0
+        self.start_frame = 0
+
+    def _path(self):
+        return os.path.join(self.video_dir, f"segment_{self.index:05d}.avi")
+
+    def write(self, frame, repeat):
+        while repeat > 0:
+            if self.writer is None:
+                self.writer = cv2.VideoWriter(self._path(), self.fourcc, self.fps, self.size, isColor=self.is_color)
+            count = min(repeat, self.segment_frames - self.frames)
+            for _ in range(count):
+                self.writer.write(frame)
+            self.frames += count
+            repeat -= count
+            if self.frames >= self.segment_frames:
+                self.close()
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.writer.release()
+        self.writer = None
+        self.on_closed({
+            'index': self.index,
+            'file': os.path.join(os.path.basename(self.video_dir), os.path.basename(self._path())),
+            'start_frame': self.start_frame,
+            'frames': self.frames,
+            'start_offset': self.start_frame / self.fps,
+            'duration': self.frames / self.fps,
+            'fps': self.fps
+        })
+        self.index += 1
+        self.start_frame += self.frames
+        self.frames = 0
+
+
+def encode_frames(frames, free, filled, video_dir, fps, size, is_color, encoded, segment_frames, closed):
+    """Encoder loop: write queued slots to rolling video segments and return them to the free queue
+
+    Closed segments are put on `closed` as manifest entries, and the time
+    spent per frame as ('encode_seconds', [...]) batches, so the metrics
+    reach the main process when the encoder runs in its own process.
+    """
+    writer = SegmentedVideoWriter(video_dir, fps, size, is_color, segment_frames, closed.put)
+    held = None
+    timings = []
+    try:
+        while True:
+            item = filled.get()
+            if item is None:
+                break
+            index, repeat = item
+            if index != REPEAT_LAST:
+                # Keep the new slot for later repeats and release the previous one
+                if held is not None:
+                    free.put(held)
+                held = index
+            if held is None:
+                continue
+            started = time.perf_counter()
+            writer.write(frames[held], repeat)
+            timings.append((time.perf_counter() - started) / max(repeat, 1))
+            encoded.value += repeat
+            if len(timings) >= ENCODE_TIMING_BATCH:
+                closed.put(('encode_seconds', timings))
+                timings = []
+    except Exception as e:
+        logger.error(f"Error in video encoder: {e}")
+    finally:
+        writer.close()
+        if timings:
+            closed.put(('encode_seconds', timings))
+
+
+def _encode_frames_process(shm_name, slots, shape, free, filled, video_dir, fps, size, is_color, encoded,
+                           segment_frames, closed):
+    """Process entry point: attach to the shared frame slots and run the encoder loop"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        frames = np.ndarray((slots,) + tuple(shape), dtype=np.uint8, buffer=shm.buf)
+        encode_frames(frames, free, filled, video_dir, fps, size, is_color, encoded, segment_frames, closed)
+        del frames
+    finally:
+        shm.close()
+
+
+class VideoEncoder:
+    """Video encoder fed through a FrameRing, running in its own thread or process
+
+    Video is written to video_dir as segments of segment_seconds each.
+    on_segment is called in this process with each closed segment's entry,
+    e.g. to add it to the meeting manifest.
+    """
+
+    def __init__(self, video_dir, fps, size, is_color=True, slots=8,
+                 drop_policy=DROP_NEWEST, use_process=False, segment_seconds=60, on_segment=None):
+        width, height = size
+        shape = (height, width, 3) if is_color else (height, width)
+        self.ring = FrameRing(slots, shape, drop_policy=drop_policy, use_processes=use_process)
+        self.video_dir = video_dir
+        os.makedirs(video_dir, exist_ok=True)
+        self.fps = fps
+        self.size = size
+        self.is_color = is_color
+        self.use_process = use_process
+        self.segment_frames = max(1, int(round(segment_seconds * fps)))
+        self.on_segment = on_segment
+        self.closed = multiprocessing.Queue() if use_process else queue.Queue()
+        self.segments = 0
+        self.encoded = multiprocessing.Value('q', 0, lock=False)
+        self.worker = None
+        self.publisher = None
+
+    def start(self):
+        args = (self.ring.free, self.ring.filled, self.video_dir, self.fps, self.size, self.is_color,
+                self.encoded, self.segment_frames, self.closed)
+        if self.use_process:
+            self.worker = multiprocessing.Process(
+                target=_encode_frames_process,
+                args=(self.ring.shm.name, self.ring.slots, self.ring.shape) + args,
+                name='video-encoder',
+                daemon=True
+            )
+        else:
+            self.worker = threading.Thread(
+                target=encode_frames,
+                args=(self.ring.frames,) + args,
+                name='video-encoder',
+                daemon=True
+            )
+        self.publisher = threading.Thread(target=self._publish_segments, name='video-segments', daemon=True)
+        self.publisher.start()
+        self.worker.start()
+        logger.info(f"Started video encoder ({'process' if self.use_process else 'thread'}, "
+                    f"{self.segment_frames}-frame segments)")
+
+    def _publish_segments(self):
+        """Hand closed segments to on_segment as soon as the encoder finishes them"""
+        while True:
+            entry = self.closed.get()
+            if entry is None:
+                break
+            if isinstance(entry, tuple):
+                for seconds in entry[1]:
+                    ENCODE_SECONDS.observe(seconds)
+                continue
+            self.segments += 1
+            if self.on_segment:
+                try:
+                    self.on_segment(entry)
+                except Exception as e:
+                    logger.error(f"Error publishing video segment {entry['index']}: {e}")
+
+    def stop(self, timeout=30):
+        """Flush queued frames, close the last segment and release the ring"""
+        if not self.worker:
+            return
+        self.ring.close()
+        self.worker.join(timeout=timeout)
+        if self.worker.is_alive():
+            logger.warning("Video encoder did not finish in time")
+            if self.use_process:
+                self.worker.terminate()
+                self.worker.join()
+        self.worker = None
+        self.closed.put(None)
+        self.publisher.join(timeout=timeout)
+        self.ring.release()
+
+    def stats(self):
+        return {
+            'encoder': 'process' if self.use_process else 'thread',
+            'ring_slots': self.ring.slots,
+            'drop_policy': self.ring.drop_policy,
+            'frames_enqueued': self.ring.enqueued,
+            'frames_encoded': self.encoded.value,
+            'segments': self.segments,
+            'frames_repeated_by_reference': self.ring.repeated,
+            'frames_dropped_by_ring': self.ring.dropped
+        }
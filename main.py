@@ -1,10 +1,29 @@
+import sys
+import json
 import time
-import threading
 import logging
+import argparse
 from datetime import datetime, timedelta
 import pytz
-from calendar_service import CalendarService
-from meeting_recorder import MeetingRecorder
+from scheduler import MeetingScheduler, JOIN, parse_time
+from calendar_store import MOVED, CANCELLED, to_utc_iso
+from manifest import load_manifest
+from transcript_store import TranscriptIndex, media_offsets, shared_index
+from storage import StorageManager, AUDIO_ONLY, HOT, COLD, estimated_byte_rates
+import metrics
+from config import (
+    JOIN_LEAD_MINUTES, MIN_CALENDAR_REFRESH_SECONDS, MAX_CALENDAR_REFRESH_SECONDS,
+    CHROME_PROFILE_PATH, RECORDER_SLOTS, RECORDER_ISOLATED, RECORDER_PROFILE_DIR, RECORDER_MIN_FREE_MEMORY_MB,
+    RECORDER_MAX_CPU_PERCENT, RECORDER_SAMPLE_SECONDS, RECORDER_ADMISSION_RETRY_SECONDS,
+    BROWSER_WARM_LEAD_SECONDS, BROWSER_MAX_SESSIONS, RECORDING_DIR, TRANSCRIPTION_DIR,
+    TRANSCRIPT_INDEX_DB, POSTPROCESS, POSTPROCESS_WORKERS, POSTPROCESS_NICENESS, POSTPROCESS_DB,
+    FFMPEG_BINARY, POSTPROCESS_PRESET, POSTPROCESS_CRF, POSTPROCESS_THREADS, POSTPROCESS_AUDIO_BITRATE,
+    POSTPROCESS_KEEP_SOURCE, POSTPROCESS_THUMBNAILS, POSTPROCESS_THUMBNAIL_HEIGHT, POSTPROCESS_MAX_DRIFT_PPM,
+    AUDIO_RATE, AUDIO_CHANNELS, AUDIO_FORMAT, STORAGE_DB, STORAGE_QUOTA_GB, STORAGE_POLICY,
+    STORAGE_DOWNGRADE_DAYS, STORAGE_COLD_DIR, STORAGE_COLD_DAYS, STORAGE_RETENTION_DAYS,
+    STORAGE_MIN_FREE_MB, STORAGE_VIDEO_KBPS, STORAGE_ENFORCE_MINUTES, METRICS_PORT, METRICS_HOST, METRICS_SNAPSHOT_FILE,
+    METRICS_SNAPSHOT_SECONDS, METRICS_SAMPLE_SECONDS, PROFILER, PROFILER_INTERVAL_MS, PROFILE_FILE
+)
 
 # Set up logging
 logging.basicConfig(
@@ -17,14 +36,84 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+STORAGE_BYTES = metrics.gauge('meet_notes_storage_bytes', 'Disk space used by recordings', ['tier'])
+POSTPROCESS_JOBS = metrics.gauge('meet_notes_postprocess_jobs', 'Post-processing jobs by state', ['state'])
+
 class MeetingManager:
     def __init__(self):
+        # The recording stack (browser, screen and audio capture, Calendar API)
+        # is imported here so that searching works without it installed
+        from calendar_service import CalendarService
+        from meeting_recorder import MeetingRecorder
+        from recorder_pool import RecorderPool
+        from postprocess import PostProcessor
+
         logger.info("Initializing MeetingManager...")
         self.calendar_service = CalendarService()
-        self.meeting_recorder = MeetingRecorder()
-        self.current_meeting = None
+        self.postprocessor = None
+        if POSTPROCESS:
+            self.postprocessor = PostProcessor(
+                POSTPROCESS_DB,
+                workers=POSTPROCESS_WORKERS,
+                niceness=POSTPROCESS_NICENESS,
+                options={
+                    'ffmpeg': FFMPEG_BINARY,
+                    'preset': POSTPROCESS_PRESET,
+                    'crf': POSTPROCESS_CRF,
+                    'threads': POSTPROCESS_THREADS,
+                    'audio_bitrate': POSTPROCESS_AUDIO_BITRATE,
+                    'keep_source': POSTPROCESS_KEEP_SOURCE,
+                    'thumbnails': POSTPROCESS_THUMBNAILS,
+                    'thumbnail_height': POSTPROCESS_THUMBNAIL_HEIGHT,
+                    'max_drift_ppm': POSTPROCESS_MAX_DRIFT_PPM
+                }
+            )
+        self.recorder_pool = RecorderPool(
+            MeetingRecorder,
+            size=recorder_slots(),
+            profile_source=CHROME_PROFILE_PATH,
+            profile_dir=RECORDER_PROFILE_DIR,
+            min_free_memory_mb=RECORDER_MIN_FREE_MEMORY_MB,
+            max_cpu_percent=RECORDER_MAX_CPU_PERCENT,
+            sample_seconds=RECORDER_SAMPLE_SECONDS,
+            max_sessions=BROWSER_MAX_SESSIONS,
+            on_finished=self.recording_finished
+        )
+        self.storage = create_storage(
+            is_busy=self.meeting_in_use,
+            transcript_index=shared_index(TRANSCRIPT_INDEX_DB)
+        )
         self.timezone = pytz.timezone('Asia/Kolkata')  # Indian timezone
         self.failed_meetings = set()  # Track failed meeting attempts
+        self.failed_cleared_at = datetime.now(pytz.UTC)
+        self.scheduler = MeetingScheduler(
+            self.fetch_meetings,
+            self.join_scheduled_meeting,
+            self.leave_scheduled_meeting,
+            join_lead_minutes=JOIN_LEAD_MINUTES,
+            min_refresh_seconds=MIN_CALENDAR_REFRESH_SECONDS,
+            max_refresh_seconds=MAX_CALENDAR_REFRESH_SECONDS,
+            on_warm=self.warm_browser,
+            warm_lead_seconds=BROWSER_WARM_LEAD_SECONDS
+        )
+        self.calendar_service.add_change_listener(self.on_calendar_change)
+        metrics.REGISTRY.add_collector(self.collect_metrics)
+
+    def collect_metrics(self):
+        """Storage use and the post-processing queue, refreshed on every metrics read"""
+        for tier in (HOT, COLD):
+            STORAGE_BYTES.set(self.storage.usage(tier)['bytes'], tier=tier)
+        if self.postprocessor:
+            for state, count in self.postprocessor.store.counts().items():
+                POSTPROCESS_JOBS.set(count, state=state)
+
+    def on_calendar_change(self, change, meeting):
+        """Keep the scheduler in step with moved and cancelled meetings"""
+        if change == CANCELLED:
+            # Also leaves the meeting, through leave_scheduled_meeting, if it is being recorded
+            self.scheduler.cancel_meeting(meeting['id'])
+        elif change == MOVED and self.is_valid_meeting(meeting):
+            self.scheduler.update_meeting(meeting)
 
     def is_valid_meeting(self, meeting):
         """Check if a meeting is valid and hasn't failed before"""
@@ -45,81 +134,229 @@ class MeetingManager:
             logger.error(f"Error validating meeting: {e}")
             return False
 
-    def check_and_join_meetings(self):
-        while True:
-            try:
-                # Get upcoming meetings in the next hour
-                logger.info("Checking for upcoming meetings...")
-                meetings = self.calendar_service.get_upcoming_meetings(time_window_minutes=60)
-                
-                if meetings:
-                    logger.info(f"Found {len(meetings)} upcoming meetings")
-                    for meeting in meetings:
-                        if not self.is_valid_meeting(meeting):
-                            continue
-                            
-                        logger.info(f"Meeting: {meeting['summary']}")
-                        logger.info(f"Start time: {meeting['start']}")
-                        logger.info(f"Meet link: {meeting['meet_link']}")
-                        
-                        start_time = datetime.fromisoformat(meeting['start'].replace('Z', '+00:00'))
-                        end_time = datetime.fromisoformat(meeting['end'].replace('Z', '+00:00'))
-                        current_time = datetime.now(pytz.UTC)
-                        
-                        # Convert all times to UTC for comparison
-                        if start_time.tzinfo is None:
-                            start_time = pytz.UTC.localize(start_time)
-                        if end_time.tzinfo is None:
-                            end_time = pytz.UTC.localize(end_time)
-                        
-                        logger.info(f"Current time (UTC): {current_time}")
-                        logger.info(f"Meeting start time (UTC): {start_time}")
-                        logger.info(f"Meeting end time (UTC): {end_time}")
-
-                        # Check if it's time to join the meeting (5 minutes before start)
-                        if current_time >= start_time - timedelta(minutes=5) and current_time <= end_time:
-                            if self.current_meeting != meeting['id']:
-                                logger.info(f"Time to join meeting: {meeting['summary']}")
-                                
-                                # Join the meeting
-                                if self.meeting_recorder.join_meeting(meeting['meet_link']):
-                                    self.current_meeting = meeting['id']
-                                    logger.info(f"Successfully joined meeting: {meeting['summary']}")
-                                    
-                                    # Start recording in a separate thread
-                                    recording_thread = threading.Thread(
-                                        target=self.meeting_recorder.start_recording,
-                                        args=(meeting['id'],)
-                                    )
-                                    recording_thread.start()
-                                    logger.info("Started recording thread")
-                                else:
-                                    logger.error(f"Failed to join meeting: {meeting['summary']}")
-                                    self.failed_meetings.add(meeting['id'])
-                        
-                        # Check if current meeting has ended
-                        elif self.current_meeting == meeting['id'] and current_time > end_time:
-                            logger.info(f"Meeting ended: {meeting['summary']}")
-                            self.meeting_recorder.leave_meeting()
-                            self.current_meeting = None
-                else:
-                    logger.info("No upcoming meetings found")
+    def fetch_meetings(self):
+        """Get valid upcoming meetings for the scheduler"""
+        # Clear failed meetings list periodically (every hour)
+        if self.failed_meetings and datetime.now(pytz.UTC) - self.failed_cleared_at > timedelta(hours=1):
+            self.failed_meetings.clear()
+            self.failed_cleared_at = datetime.now(pytz.UTC)
+            logger.info("Cleared failed meetings list")
+
+        logger.info("Checking for upcoming meetings...")
+        meetings = self.calendar_service.get_upcoming_meetings(time_window_minutes=60)
+        if not meetings:
+            logger.info("No upcoming meetings found")
+            return []
+
+        logger.info(f"Found {len(meetings)} upcoming meetings")
+        return [meeting for meeting in meetings if self.is_valid_meeting(meeting)]
+
+    def warm_browser(self, meeting):
+        """Have a signed-in browser ready before a meeting's join time"""
+        if self.recorder_pool.prewarm():
+            logger.info(f"Warming a browser for {meeting['summary']}")
+
+    def meeting_in_use(self, meeting_dir):
+        """Whether a meeting is being recorded or post-processed, so storage must leave it alone"""
+        return (meeting_dir in self.recorder_pool.recording_dirs()
+                or bool(self.postprocessor and self.postprocessor.is_pending(meeting_dir)))
 
+    def recording_finished(self, meeting_dir):
+        """Hand a finished recording to post-processing and bring the disk back within budget"""
+        if self.postprocessor:
+            try:
+                self.postprocessor.submit(meeting_dir)
             except Exception as e:
-                logger.error(f"Error in meeting manager: {e}")
-                import traceback
-                logger.error(f"Traceback: {traceback.format_exc()}")
-            
-            # Clear failed meetings list periodically (every hour)
-            if len(self.failed_meetings) > 0 and datetime.now().minute == 0:
-                self.failed_meetings.clear()
-                logger.info("Cleared failed meetings list")
-            
-            # Check every minute
-            time.sleep(60)
+                logger.error(f"Error queueing {meeting_dir} for post-processing: {e}")
+        self.storage.update(meeting_dir)
+        self.storage.enforce()
+
+    def plan_storage(self, meeting):
+        """Check there is room to record a meeting; False if there isn't even room for audio"""
+        try:
+            duration = (parse_time(meeting['end']) - parse_time(meeting['start'])).total_seconds()
+        except Exception as e:
+            logger.error(f"Error reading meeting duration: {e}")
+            return True
+        level, needed, free = self.storage.plan(duration)
+        if level is None:
+            logger.error(f"Not enough disk space for {meeting['summary']}: "
+                         f"needs {needed / 2 ** 30:.1f} GB, {free / 2 ** 30:.1f} GB available")
+            return False
+        if level == AUDIO_ONLY:
+            logger.warning(f"Recording {meeting['summary']} as audio and captions only: video needs "
+                           f"{needed / 2 ** 30:.1f} GB, {free / 2 ** 30:.1f} GB available")
+        meeting['record_video'] = level != AUDIO_ONLY
+        return True
+
+    def join_scheduled_meeting(self, meeting, latency):
+        """Join a meeting when its scheduled join time arrives"""
+        if self.recorder_pool.is_recording(meeting['id']):
+            return
+
+        logger.info(f"Time to join meeting: {meeting['summary']}")
+        logger.info(f"Meet link: {meeting['meet_link']}")
+
+        if not self.plan_storage(meeting):
+            # Space may be freed by post-processing or the retention rules; try again shortly
+            retry_at = self.scheduler.clock.now() + timedelta(seconds=RECORDER_ADMISSION_RETRY_SECONDS)
+            logger.info(f"Retrying {meeting['summary']} at {retry_at}")
+            self.scheduler.schedule(retry_at, JOIN, meeting)
+            return
+
+        # Join and record the meeting in a free recorder slot
+        started, reason = self.recorder_pool.start(meeting, latency)
+        if started:
+            logger.info(f"Successfully joined meeting: {meeting['summary']} "
+                        f"(scheduler latency {latency:.2f}s)")
+        elif reason:
+            # No slot or resources to spare right now; try again shortly
+            retry_at = self.scheduler.clock.now() + timedelta(seconds=RECORDER_ADMISSION_RETRY_SECONDS)
+            logger.info(f"Retrying {meeting['summary']} at {retry_at}")
+            self.scheduler.schedule(retry_at, JOIN, meeting)
+        else:
+            logger.error(f"Failed to join meeting: {meeting['summary']}")
+            self.failed_meetings.add(meeting['id'])
+
+    def leave_scheduled_meeting(self, meeting):
+        """Leave a meeting when its scheduled end time arrives"""
+        if self.recorder_pool.stop(meeting['id']):
+            logger.info(f"Meeting ended: {meeting['summary']}")
+
+    def check_and_join_meetings(self):
+        """Run the meeting scheduler until interrupted"""
+        # Start the first browser while the calendar is being read
+        self.recorder_pool.prewarm()
+        # Pick up post-processing left unfinished by the last run
+        if self.postprocessor:
+            self.postprocessor.start()
+        self.storage.enforce()
+        logger.info(f"Recordings use {self.storage.usage()['bytes'] / 2 ** 30:.1f} GB")
+        self.storage.start(STORAGE_ENFORCE_MINUTES * 60)
+        self.scheduler.run()
+
+def recorder_slots():
+    """RECORDER_SLOTS, limited to one unless each browser has its own display and audio"""
+    if RECORDER_SLOTS > 1 and not RECORDER_ISOLATED:
+        logger.warning(f"RECORDER_SLOTS={RECORDER_SLOTS} ignored: without BROWSER_DISPLAY=xvfb or headless and "
+                       f"VIRTUAL_AUDIO=true every slot records the same screen and sound card; using 1 slot")
+        return 1
+    return max(1, RECORDER_SLOTS)
+
+
+def create_storage(is_busy=None, transcript_index=None):
+    video_rate, audio_rate = estimated_byte_rates(STORAGE_VIDEO_KBPS, AUDIO_RATE, AUDIO_CHANNELS, AUDIO_FORMAT)
+    return StorageManager(
+        STORAGE_DB,
+        RECORDING_DIR,
+        cold_dir=STORAGE_COLD_DIR or None,
+        quota_bytes=STORAGE_QUOTA_GB * 2 ** 30,
+        policy=STORAGE_POLICY,
+        downgrade_days=STORAGE_DOWNGRADE_DAYS,
+        cold_days=STORAGE_COLD_DAYS,
+        retention_days=STORAGE_RETENTION_DAYS,
+        min_free_bytes=STORAGE_MIN_FREE_MB * 2 ** 20,
+        video_bytes_per_second=video_rate,
+        audio_bytes_per_second=audio_rate,
+        is_busy=is_busy,
+        transcript_index=transcript_index
+    )
+
+
+def format_position(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours}:{minutes:02d}:{seconds:04.1f}"
+
+
+def search(args):
+    """Search the captions and speech transcripts of all recorded meetings"""
+    index = TranscriptIndex(TRANSCRIPT_INDEX_DB)
+    started = time.perf_counter()
+    # Only meetings and files that changed since the last run are read
+    roots = [RECORDING_DIR, TRANSCRIPTION_DIR] + ([STORAGE_COLD_DIR] if STORAGE_COLD_DIR else [])
+    meetings, added = index.index_all(roots)
+    indexed = time.perf_counter()
+    results = index.search(
+        ' '.join(args.query) or None,
+        speaker=args.speaker,
+        start=args.since,
+        end=args.until,
+        meeting_id=args.meeting,
+        limit=args.limit
+    )
+    searched = time.perf_counter()
+    index.close()
+
+    manifests = {}
+    for result in results:
+        meeting_dir = result['meeting_dir']
+        if meeting_dir not in manifests:
+            manifests[meeting_dir] = load_manifest(meeting_dir) or {}
+        result['media'] = media_offsets(meeting_dir, result['timestamp'], manifests[meeting_dir])
+
+    # Meetings that come up in searches are the last to give up space under the LRU policy
+    if results:
+        storage = create_storage()
+        for meeting_dir in manifests:
+            storage.touch(meeting_dir)
+        storage.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(f"{result['meeting_id']}  {result['timestamp'] or '-'}  "
+                  f"{result['speaker'] or 'Unknown'} ({result['source']})")
+            print(f"    {result['snippet'] or result['text']}")
+            for stream, position in result['media'].items():
+                if position:
+                    print(f"    {stream}: {position[0]} @ {format_position(position[1])}")
+        print(f"{len(results)} results in {(searched - indexed) * 1000:.1f} ms "
+              f"(index refresh: {added} new entries from {meetings} meetings "
+              f"in {(indexed - started) * 1000:.1f} ms)")
+
+
+def utc_time(value):
+    """argparse type for --since/--until: an ISO time, UTC unless it has an offset"""
+    try:
+        return to_utc_iso(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid ISO time: {value!r} (e.g. 2025-03-01 or 2025-03-01T09:00)")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Meet Notes")
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('run', help="join and record scheduled meetings (default)")
+    search_parser = commands.add_parser('search', help="search transcripts of recorded meetings")
+    search_parser.add_argument('query', nargs='*', help="words that must all appear")
+    search_parser.add_argument('--speaker', help="only this speaker")
+    search_parser.add_argument('--since', type=utc_time, help="only from this UTC time (ISO format)")
+    search_parser.add_argument('--until', type=utc_time, help="only before this UTC time (ISO format)")
+    search_parser.add_argument('--meeting', help="only this meeting ID")
+    search_parser.add_argument('--limit', type=int, default=20, help="maximum number of results")
+    search_parser.add_argument('--json', action='store_true', help="print results as JSON")
+    return parser.parse_args(argv)
+
 
 def main():
+    args = parse_args(sys.argv[1:])
+    if args.command == 'search':
+        search(args)
+        return
+
     logger.info("Starting Meet Notes Manager...")
+    monitoring = metrics.MetricsService(
+        port=METRICS_PORT,
+        host=METRICS_HOST,
+        snapshot_path=METRICS_SNAPSHOT_FILE,
+        snapshot_seconds=METRICS_SNAPSHOT_SECONDS,
+        sample_seconds=METRICS_SAMPLE_SECONDS,
+        profile=PROFILER,
+        profile_interval=PROFILER_INTERVAL_MS / 1000,
+        profile_path=PROFILE_FILE
+    ).start()
     manager = MeetingManager()
     
     try:
@@ -127,8 +364,12 @@ def main():
         manager.check_and_join_meetings()
     except KeyboardInterrupt:
         logger.info("\nShutting down Meet Notes Manager...")
-        if manager.current_meeting:
-            manager.meeting_recorder.leave_meeting()
+        manager.scheduler.stop()
+        manager.recorder_pool.stop_all()
+        manager.storage.stop()
+        if manager.postprocessor:
+            manager.postprocessor.stop()
+        monitoring.stop()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
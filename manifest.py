@@ -0,0 +1,68 @@
+import os
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+
+
+class RecordingManifest:
+    """Segment list for a recording, rewritten atomically on every change
+
+    The manifest is written to a temporary file and moved over the old one,
+    so a crash never leaves a half-written manifest behind.
+    """
+
+    def __init__(self, meeting_dir):
+        self.path = os.path.join(meeting_dir, MANIFEST_FILE)
+        self.lock = threading.Lock()
+        self.data = {'streams': {}}
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                self.data = json.load(f)
+
+    def segments(self, stream):
+        with self.lock:
+            return [dict(segment) for segment in self.data['streams'].get(stream, [])]
+
+    def add_segment(self, stream, segment):
+        with self.lock:
+            self.data['streams'].setdefault(stream, []).append(dict(segment))
+            self._write()
+
+    def update_segment(self, stream, index, **fields):
+        with self.lock:
+            for segment in self.data['streams'].get(stream, []):
+                if segment['index'] == index:
+                    segment.update(fields)
+            self._write()
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self._write()
+
+    def _write(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def load_manifest(meeting_dir):
+    """Read a meeting's manifest, or None if it has none"""
+    path = os.path.join(meeting_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def segment_paths(meeting_dir, manifest, stream):
+    """Full paths of a stream's segment files, in recording order"""
+    segments = sorted((manifest or {}).get('streams', {}).get(stream, []), key=lambda segment: segment['index'])
+    return [os.path.join(meeting_dir, segment['file']) for segment in segments]
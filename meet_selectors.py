@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CSS = 'css'
+XPATH = 'xpath'
+
+# One caption line per speaker, and the speaker name and text inside it
+CAPTION_LINE_SELECTOR = '.a4cQT, .zs7s8d, .VR3bTd'
+CAPTION_SPEAKER_SELECTOR = '.M4LFnf, .YTbUzc'
+CAPTION_TEXT_SELECTOR = '.VR3bTd, .CNusmb, .Pf3Ezf'
+
+# Candidate locators for each Meet UI element, in order of preference. Meet
+# changes its class names often, so every element has several strategies.
+SELECTOR_STRATEGIES = {
+    'prejoin_ready': [
+        (XPATH, "//button[.//span[contains(text(), 'Join now') or contains(text(), 'Ask to join')]]"),
+        (CSS, "button[data-id*='join-now'], button[aria-label*='Join now']"),
+        (XPATH, "//*[contains(text(), 'Check your meeting code') or contains(text(), \"You can't join this video call\")]")
+    ],
+    'join_button': [
+        (XPATH, "//button[contains(@class, 'VfPpkd-LgbsSe')]//span[contains(text(), 'Join now')]/ancestor::button"),
+        (XPATH, "//button[contains(@class, 'UywwFc-LgbsSe')]//span[contains(text(), 'Join now')]/ancestor::button"),
+        (XPATH, "//button[contains(@class, 'Jyj1Td')]//span[contains(text(), 'Join now')]/ancestor::button"),
+        (XPATH, "//button[contains(@data-id, 'join-now')]"),
+        (XPATH, "//button[contains(@aria-label, 'Join now')]"),
+        (XPATH, "//button[.//span[contains(text(), 'Ask to join')]]")
+    ],
+    'in_meeting': [
+        (CSS, "[data-meeting-title]"),
+        (CSS, "[role='main']")
+    ],
+    'captions_button': [
+        (XPATH, "//button[contains(@aria-label, 'captions') or contains(@aria-label, 'subtitle')]"),
+        (XPATH, "//button[@jsname='r8qRAd']"),
+        (XPATH, "//button[contains(@data-tooltip, 'captions')]"),
+        (XPATH, "//div[@role='button'][contains(., 'captions')]")
+    ],
+    # CSS only: the caption observer looks these up with querySelector
+    'caption_region': [
+        (CSS, "div[role='region'][aria-label*='Captions']"),
+        (CSS, CAPTION_LINE_SELECTOR)
+    ],
+    'leave_button': [
+        (CSS, "button[aria-label*='Leave call']"),
+        (XPATH, "//button[@jsname='CQylAd']"),
+        (XPATH, "//button[contains(@data-tooltip, 'Leave call')]")
+    ]
+}
+
+# Waits for the first candidate that matches a visible, enabled element.
+# Candidates are checked right away and again after every batch of DOM
+# mutations, so the wait ends as soon as any of them appears.
+# arguments[0]: [[kind, selector], ...], arguments[1]: timeout in ms
+WAIT_FOR_ANY_SCRIPT = """
+const candidates = arguments[0];
+const timeout = arguments[1];
+const done = arguments[arguments.length - 1];
+
+function usable(element) {
+    return element && !element.disabled && element.getClientRects().length > 0;
+}
+
+function find(kind, selector) {
+    if (kind === 'xpath') {
+        const result = document.evaluate(selector, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (let i = 0; i < result.snapshotLength; i++) {
+            if (usable(result.snapshotItem(i))) {
+                return result.snapshotItem(i);
+            }
+        }
+        return null;
+    }
+    for (const element of document.querySelectorAll(selector)) {
+        if (usable(element)) {
+            return element;
+        }
+    }
+    return null;
+}
+
+function check() {
+    for (let index = 0; index < candidates.length; index++) {
+        try {
+            const element = find(candidates[index][0], candidates[index][1]);
+            if (element) {
+                return {index: index, element: element};
+            }
+        } catch (e) {
+            // An invalid selector only disqualifies itself
+        }
+    }
+    return null;
+}
+
+const found = check();
+if (found) {
+    done(found);
+} else {
+    let timer = null;
+    const observer = new MutationObserver(() => {
+        const match = check();
+        if (match) {
+            observer.disconnect();
+            clearTimeout(timer);
+            done(match);
+        }
+    });
+    observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true});
+    timer = setTimeout(() => {
+        observer.disconnect();
+        done(null);
+    }, timeout);
+}
+"""
+
+# Meet's frontend build label, used to key the selector cache
+UI_VERSION_SCRIPT = """
+try {
+    return (window.WIZ_global_data && window.WIZ_global_data.cfb2h) || null;
+} catch (e) {
+    return null;
+}
+"""
+
+
+class SelectorCache:
+    """Winning selector per element and Meet UI version, persisted as JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except Exception as e:
+                logger.error(f"Error reading selector cache {path}: {e}")
+
+    def get(self, version, name):
+        with self.lock:
+            return self.data.get(version or 'unknown', {}).get(name)
+
+    def put(self, version, name, candidate):
+        with self.lock:
+            entries = self.data.setdefault(version or 'unknown', {})
+            if entries.get(name) == list(candidate):
+                return
+            entries[name] = list(candidate)
+            self._write()
+
+    def _write(self):
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def shared_cache(path):
+    """One SelectorCache per file, shared by every browser in the process"""
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = SelectorCache(path)
+        return _caches[path]
+
+
+class SelectorEngine:
+    """Finds Meet UI elements by waiting on all their candidate locators at once
+
+    One in-page MutationObserver watches for every candidate of an element,
+    so a wait costs as long as the element takes to appear rather than a
+    timeout per selector that misses. The candidate that matched is tried
+    first next time the same Meet UI version is seen. Any page works,
+    including static HTML opened from a file:// URL.
+    """
+
+    def __init__(self, driver, cache=None, strategies=None):
+        self.driver = driver
+        self.cache = cache or SelectorCache(None)
+        self.strategies = strategies or SELECTOR_STRATEGIES
+        self.timings = []
+
+    def ui_version(self):
+        try:
+            return self.driver.execute_script(UI_VERSION_SCRIPT)
+        except Exception:
+            return None
+
+    def candidates(self, name, version):
+        candidates = [tuple(candidate) for candidate in self.strategies[name]]
+        cached = self.cache.get(version, name)
+        if cached and tuple(cached) in candidates:
+            candidates.remove(tuple(cached))
+            candidates.insert(0, tuple(cached))
+        return candidates
+
+    def find(self, name, timeout=10):
+        """Wait up to timeout seconds for an element and return it, or None"""
+        version = self.ui_version()
+        candidates = self.candidates(name, version)
+        started = time.monotonic()
+        try:
+            self.driver.set_script_timeout(timeout + 5)
+            found = self.driver.execute_async_script(
+                WAIT_FOR_ANY_SCRIPT, [list(candidate) for candidate in candidates], int(timeout * 1000)
+            )
+        except Exception as e:
+            logger.error(f"Error waiting for {name}: {e}")
+            found = None
+        elapsed = time.monotonic() - started
+
+        if not found:
+            logger.warning(f"No selector for {name} matched within {timeout}s (Meet UI {version})")
+            self.timings.append({'name': name, 'seconds': round(elapsed, 3), 'selector': None})
+            return None
+
+        winner = candidates[found['index']]
+        self.cache.put(version, name, winner)
+        self.timings.append({'name': name, 'seconds': round(elapsed, 3), 'selector': winner[1]})
+        logger.info(f"Found {name} in {elapsed:.2f}s with {winner[0]} selector #{found['index']}")
+        return found['element']
@@ -5,16 +5,43 @@ import undetected_chromedriver as uc
 import pyautogui
 import cv2
 import numpy as np
-import speech_recognition as sr
 import time
 import os
 import json
 import logging
-from datetime import datetime
-from config import CHROME_PROFILE_PATH, RECORDING_DIR, TRANSCRIPTION_DIR
+from datetime import datetime, timezone
+from config import (
+    CHROME_PROFILE_PATH, CHROME_BINARY, BROWSER_DISPLAY, VIRTUAL_DISPLAY_SIZE, VIRTUAL_AUDIO,
+    MEET_SELECTOR_CACHE, RECORDING_DIR, TRANSCRIPTION_DIR, CAPTION_DRAIN_INTERVAL,
+    CAPTION_BUFFER_SIZE, CAPTION_IDLE_COMMIT_MS, CAPTION_FSYNC_SECONDS, TRANSCRIPT_INDEX_DB, VIDEO_FPS,
+    VIDEO_RING_SLOTS, VIDEO_DROP_POLICY, VIDEO_ENCODER_PROCESS,
+    RECORDING_MODE, RECORDING_OUTPUT_SIZE, CHANGE_DETECTION, CHANGE_THRESHOLD,
+    VIDEO_SOURCE, SCREENCAST_QUALITY, VIDEO_SEGMENT_SECONDS,
+    AUDIO_RATE, AUDIO_CHANNELS, AUDIO_BUFFER_SECONDS, AUDIO_WRITE_BLOCK_SECONDS,
+    AUDIO_SEGMENT_MINUTES, AUDIO_FORMAT,
+    TRANSCRIBE_AUDIO, LIVE_TRANSCRIPTION, TRANSCRIPTION_BACKEND, TRANSCRIPTION_WORKERS,
+    AUDIO_VAD, AUDIO_SPEECH_ONLY
+)
+from screen_capture import (
+    MssFrameSource, FramePacer, FrameConverter, ChangeDetector, RECORDING_MODES,
+    primary_monitor, clip_region, even_size
+)
+from frame_pipeline import VideoEncoder
+from screencast import ScreencastFrameSource
+from audio_capture import AudioRecorder
+from manifest import RecordingManifest
+from meet_selectors import (
+    SelectorEngine, shared_cache, SELECTOR_STRATEGIES,
+    CAPTION_LINE_SELECTOR, CAPTION_SPEAKER_SELECTOR, CAPTION_TEXT_SELECTOR
+)
+from virtual_session import VirtualSession
+from transcriber import Transcriber, backend_available
+from transcript_store import CaptionWriter, shared_index
+from vad import EnergyVAD, StreamingVAD
+from av_sync import SessionClock, TimingIndex, measure_drift, VIDEO
+import metrics
 import threading
 from selenium.common.exceptions import TimeoutException
-from PIL import ImageGrab  
 from urllib3 import PoolManager
 from urllib3.util import Retry
 from selenium.webdriver.common.action_chains import ActionChains
@@ -35,13 +62,317 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+FRAMES_CAPTURED = metrics.counter('meet_notes_video_frames_captured_total', 'Frames grabbed from the frame source')
+CAPTURE_SECONDS = metrics.histogram('meet_notes_video_capture_seconds', 'Time to grab one frame')
+CAPTURE_FPS = metrics.gauge('meet_notes_video_capture_fps', 'Frames grabbed per second over the last second', ['slot'])
+CAPTION_LAG_SECONDS = metrics.histogram(
+    'meet_notes_caption_lag_seconds', 'Time from a caption being committed in the page to it being written',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 30.0, 60.0)
+)
+WEBDRIVER_SECONDS = metrics.histogram('meet_notes_webdriver_seconds', 'WebDriver command round-trip time', ['command'])
+
+# Caption lookups handed to the observer script below
+CAPTION_SELECTORS = {
+    'line': CAPTION_LINE_SELECTOR,
+    'speaker': CAPTION_SPEAKER_SELECTOR,
+    'text': CAPTION_TEXT_SELECTOR,
+    'regions': [selector for kind, selector in SELECTOR_STRATEGIES['caption_region']]
+}
+
+# Caption observer injected into the Meet page. Finished utterances go into a
+# fixed-size ring buffer that Python reads with a sequence cursor.
+# arguments[0]: ring buffer capacity, arguments[1]: idle ms before an utterance is committed,
+# arguments[2]: {line, speaker, text, regions} selectors from meet_selectors
+CAPTION_OBSERVER_SCRIPT = """
+const CAPACITY = arguments[0];
+const IDLE_COMMIT_MS = arguments[1];
+const CAPTION_SELECTOR = arguments[2].line;
+const SPEAKER_SELECTOR = arguments[2].speaker;
+const TEXT_SELECTOR = arguments[2].text;
+const REGION_SELECTORS = arguments[2].regions;
+// Characters a scrolled caption line must share with its previous text to count as the same line
+const MIN_OVERLAP = 20;
+
+if (window.meetNotesCaptions) {
+    window.meetNotesCaptions.stop();
+}
+
+const state = {
+    buffer: new Array(CAPACITY),
+    seq: 0,
+    pending: {},
+    // Per speaker, the caption line on screen and how many of its characters were already committed
+    lines: {},
+    scope: null,
+    observer: null,
+    bootstrapObserver: null,
+    bootstrapTimer: null,
+    idleTimer: null,
+    stats: {
+        observerCalls: 0,
+        mutationRecords: 0,
+        bootstrapCalls: 0,
+        scans: 0,
+        merged: 0,
+        committed: 0,
+        overwritten: 0
+    }
+};
+window.meetNotesCaptions = state;
+
+function commonPrefixLength(a, b) {
+    const n = Math.min(a.length, b.length);
+    let i = 0;
+    while (i < n && a.charCodeAt(i) === b.charCodeAt(i)) {
+        i++;
+    }
+    return i;
+}
+
+function overlapLength(a, b) {
+    // Longest end of a that b starts with: the line scrolled and dropped its oldest words
+    for (let k = Math.min(a.length, b.length); k > 0; k--) {
+        if (a.endsWith(b.substring(0, k))) {
+            return k;
+        }
+    }
+    return 0;
+}
+
+function wordStart(text, index) {
+    while (index > 0 && !/\s/.test(text.charAt(index - 1))) {
+        index--;
+    }
+    return index;
+}
+
+function commit(speaker) {
+    const utterance = state.pending[speaker];
+    if (!utterance) {
+        return;
+    }
+    delete state.pending[speaker];
+    const line = state.lines[speaker];
+    if (line) {
+        line.committed = line.text.length;
+    }
+    if (state.seq >= CAPACITY) {
+        state.stats.overwritten++;
+    }
+    state.seq++;
+    const caption = {
+        seq: state.seq,
+        timestamp: utterance.timestamp,
+        committedAt: new Date().toISOString(),
+        speaker: speaker,
+        text: utterance.text
+    };
+    state.buffer[state.seq % CAPACITY] = caption;
+    state.stats.committed++;
+    window.dispatchEvent(new CustomEvent('newCaption', {detail: caption}));
+}
+
+function commitIdle() {
+    const now = Date.now();
+    for (const speaker of Object.keys(state.pending)) {
+        if (now - state.pending[speaker].updated >= IDLE_COMMIT_MS) {
+            commit(speaker);
+        }
+    }
+    state.idleTimer = Object.keys(state.pending).length
+        ? setTimeout(commitIdle, IDLE_COMMIT_MS)
+        : null;
+}
+
+function update(speaker, text) {
+    // Meet keeps a caption line on screen while it grows, scrolls and gets
+    // revised, so only the part after what was already committed is new
+    const line = state.lines[speaker];
+    if (line && line.text === text) {
+        return;
+    }
+    let committed = 0;
+    if (line) {
+        const prefix = commonPrefixLength(line.text, text);
+        let overlap = 0;
+        if (prefix >= Math.min(line.text.length, text.length) * 0.6) {
+            // Growing or revised; a revision inside the committed part is resent from its word
+            committed = prefix >= line.committed ? line.committed : wordStart(text, prefix);
+            state.stats.merged++;
+        } else if ((overlap = overlapLength(line.text, text)) >= Math.min(MIN_OVERLAP, text.length)) {
+            committed = Math.max(0, line.committed - (line.text.length - overlap));
+            state.stats.merged++;
+        } else {
+            // A different line starts a new utterance
+            commit(speaker);
+        }
+    }
+    state.lines[speaker] = {text: text, committed: committed};
+
+    const fresh = text.substring(committed).trim();
+    if (!fresh) {
+        delete state.pending[speaker];
+        return;
+    }
+    const utterance = state.pending[speaker];
+    if (utterance) {
+        utterance.text = fresh;
+        utterance.updated = Date.now();
+        return;
+    }
+    state.pending[speaker] = {
+        timestamp: new Date().toISOString(),
+        text: fresh,
+        updated: Date.now()
+    };
+    if (!state.idleTimer) {
+        state.idleTimer = setTimeout(commitIdle, IDLE_COMMIT_MS);
+    }
+}
+
+function processCaptions() {
+    state.stats.scans++;
+    const onScreen = new Set();
+    state.scope.querySelectorAll(CAPTION_SELECTOR).forEach(container => {
+        const speakerElem = container.querySelector(SPEAKER_SELECTOR);
+        const textElem = container.querySelector(TEXT_SELECTOR);
+        const speakerName = speakerElem ? speakerElem.textContent.trim() : '';
+        const captionText = textElem ? textElem.textContent.trim() : '';
+
+        // Only process if we have both speaker and text
+        if (speakerName && captionText) {
+            onScreen.add(speakerName);
+            update(speakerName, captionText);
+        }
+    });
+    // A speaker's line left the screen; their next caption is a new line even if the text repeats
+    for (const speaker of Object.keys(state.lines)) {
+        if (!onScreen.has(speaker)) {
+            commit(speaker);
+            delete state.lines[speaker];
+        }
+    }
+}
+
+function attach(scope) {
+    state.scope = scope;
+    state.observer = new MutationObserver((mutations) => {
+        state.stats.observerCalls++;
+        state.stats.mutationRecords += mutations.length;
+        if (!state.scope.isConnected) {
+            // Captions were turned off or the panel was rebuilt
+            state.observer.disconnect();
+            state.observer = null;
+            bootstrap();
+            return;
+        }
+        processCaptions();
+    });
+    state.observer.observe(scope, {
+        childList: true,
+        subtree: true,
+        characterData: true
+    });
+    processCaptions();
+}
+
+function findScope() {
+    for (const selector of REGION_SELECTORS) {
+        const region = document.querySelector(selector);
+        if (region) {
+            // A caption line is scoped to the panel that holds all lines
+            return region.matches(CAPTION_SELECTOR) ? (region.parentElement || region) : region;
+        }
+    }
+    return null;
+}
+
+function bootstrap() {
+    // Watch the page only until the caption region exists, checking at most twice a second
+    state.bootstrapObserver = new MutationObserver(() => {
+        state.stats.bootstrapCalls++;
+        if (state.bootstrapTimer) {
+            return;
+        }
+        state.bootstrapTimer = setTimeout(() => {
+            state.bootstrapTimer = null;
+            const scope = findScope();
+            if (scope && state.bootstrapObserver) {
+                state.bootstrapObserver.disconnect();
+                state.bootstrapObserver = null;
+                attach(scope);
+            }
+        }, 500);
+    });
+    state.bootstrapObserver.observe(document.body, {childList: true, subtree: true});
+}
+
+state.drain = function(cursor) {
+    const first = Math.max(cursor, state.seq - CAPACITY) + 1;
+    const captions = [];
+    for (let seq = first; seq <= state.seq; seq++) {
+        captions.push(state.buffer[seq % CAPACITY]);
+    }
+    return captions;
+};
+
+state.flush = function() {
+    for (const speaker of Object.keys(state.pending)) {
+        commit(speaker);
+    }
+};
+
+state.stop = function() {
+    if (state.observer) {
+        state.observer.disconnect();
+        state.observer = null;
+    }
+    if (state.bootstrapObserver) {
+        state.bootstrapObserver.disconnect();
+        state.bootstrapObserver = null;
+    }
+    clearTimeout(state.bootstrapTimer);
+    clearTimeout(state.idleTimer);
+    state.idleTimer = null;
+};
+
+const scope = findScope();
+if (scope) {
+    attach(scope);
+} else {
+    bootstrap();
+}
+"""
+
 class MeetingRecorder:
-    def __init__(self):
+    def __init__(self, profile_path=None):
         self.recording = False
-        self.profile_path = CHROME_PROFILE_PATH
+        self.profile_path = profile_path or CHROME_PROFILE_PATH
+        self.join_stats = None
+        # Cleared by the storage manager to record only audio and captions when disk space is short
+        self.record_video = True
+        # Recorder pool slot, used to label this recorder's metrics
+        self.slot = 0
+        # Directory of the meeting being recorded; None between meetings
+        self.meeting_dir = None
+        self.session = None
         logger.info(f"Initialized MeetingRecorder with profile path: {self.profile_path}")
         self.setup_browser()
 
+    def time_webdriver_commands(self):
+        """Time every WebDriver command's round trip to chromedriver"""
+        executor = self.driver.command_executor
+        execute = executor.execute
+
+        def timed_execute(command, params):
+            started = time.perf_counter()
+            try:
+                return execute(command, params)
+            finally:
+                WEBDRIVER_SECONDS.observe(time.perf_counter() - started, command=command)
+
+        executor.execute = timed_execute
+
     def verify_cookies(self):
         """Verify if Google cookies are present"""
         try:
@@ -70,10 +401,22 @@ class MeetingRecorder:
             # Simplified UC-compatible configuration
             options = uc.ChromeOptions()
             options.add_argument(f"--user-data-dir={self.profile_path}")
-            options.add_argument("--start-maximized")
             options.add_argument("--no-default-browser-check")
             options.add_argument("--log-level=3")
-            options.binary_location = r'C:\Program Files\Google\Chrome\Application\chrome.exe'
+            if CHROME_BINARY:
+                options.binary_location = CHROME_BINARY
+            
+            window_size = (1920, 1080)
+            if BROWSER_DISPLAY in ('xvfb', 'headless'):
+                # Own virtual display (or none) and audio sink; there is no window manager to maximize with
+                self.session = VirtualSession(
+                    VIRTUAL_DISPLAY_SIZE, audio=VIRTUAL_AUDIO, display=BROWSER_DISPLAY == 'xvfb'
+                ).start()
+                window_size = VIRTUAL_DISPLAY_SIZE
+                options.add_argument("--window-position=0,0")
+                options.add_argument(f"--window-size={window_size[0]},{window_size[1]}")
+            else:
+                options.add_argument("--start-maximized")
             
             # Use webdriver manager to get the appropriate chromedriver for version 114
             driver_path = ChromeDriverManager(
@@ -81,17 +424,28 @@ class MeetingRecorder:
                 chrome_type=ChromeType.CHROMIUM
             ).install()
             
-            self.driver = uc.Chrome(
-                options=options,
-                driver_executable_path=driver_path,
-                headless=False
-            )
+            if self.session:
+                with self.session.environment():
+                    self.driver = uc.Chrome(
+                        options=options,
+                        driver_executable_path=driver_path,
+                        headless=BROWSER_DISPLAY == 'headless'
+                    )
+            else:
+                self.driver = uc.Chrome(
+                    options=options,
+                    driver_executable_path=driver_path,
+                    headless=False
+                )
+            
+            self.time_webdriver_commands()
+            self.selectors = SelectorEngine(self.driver, shared_cache(MEET_SELECTOR_CACHE))
             
             # Remove navigator.webdriver flag
             self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
             
             # Set normal screen resolution
-            self.driver.set_window_size(1920, 1080)
+            self.driver.set_window_size(*window_size)
             self.driver.set_page_load_timeout(30)
             
             # Verify Google login status
@@ -100,18 +454,32 @@ class MeetingRecorder:
             
         except Exception as e:
             logger.error(f"Error initializing undetected-chromedriver: {e}")
+            if self.session:
+                self.session.stop()
+                self.session = None
             raise
         
         except Exception as e:
             logger.error(f"Failed to initialize browser: {e}")
             raise
 
+    def wait_for_page_load(self, timeout=10):
+        """Wait until the current page has finished loading"""
+        try:
+            WebDriverWait(self.driver, timeout).until(
+                lambda driver: driver.execute_script("return document.readyState") == 'complete'
+            )
+            return True
+        except TimeoutException:
+            logger.warning(f"Page did not finish loading within {timeout}s")
+            return False
+
     def verify_google_login(self):
         """Verify Google login status using multiple checks"""
         try:
             # First check: Try accessing Google Calendar
             self.driver.get('https://calendar.google.com')
-            time.sleep(3)  # Wait for redirect if not logged in
+            self.wait_for_page_load()  # Includes the redirect if not logged in
             
             # Check if we're on the calendar page
             current_url = self.driver.current_url
@@ -121,7 +489,7 @@ class MeetingRecorder:
             
             # Second check: Try accessing Google account page
             self.driver.get('https://myaccount.google.com')
-            time.sleep(3)
+            self.wait_for_page_load()
             
             current_url = self.driver.current_url
             if 'myaccount.google.com' in current_url and 'signin' not in current_url:
@@ -154,7 +522,7 @@ class MeetingRecorder:
         """Verify if the meeting link is valid and accessible"""
         try:
             self.driver.get(meet_link)
-            time.sleep(3)  # Wait for page to load
+            self.wait_for_page_load()
             
             # Check for error messages
             error_messages = [
@@ -217,18 +585,13 @@ class MeetingRecorder:
             # Extract meeting code from the link
             meeting_code = meet_link.split('/')[-1].split('?')[0]
             
-            # First go to Google Calendar to access the meeting (more natural approach)
-            self.driver.get('https://calendar.google.com')
-            time.sleep(3)
-            
-            # Then go to the meeting through the proper channel
+            # Go straight to the meeting; the browser is already signed in
             meet_url = f"https://meet.google.com/{meeting_code}?authuser=0"
             self.driver.get(meet_url)
-            time.sleep(5)
             
             # Wait for the pre-meeting screen to load
             logger.info("Waiting for pre-meeting screen...")
-            time.sleep(3)
+            self.selectors.find('prejoin_ready', timeout=20)
             
             # Try to handle camera and microphone permissions naturally
             try:
@@ -237,7 +600,6 @@ class MeetingRecorder:
                 for button in dismiss_buttons:
                     try:
                         button.click()
-                        time.sleep(1)
                     except:
                         pass
             except:
@@ -251,29 +613,11 @@ class MeetingRecorder:
                     if "camera" in aria_label.lower() or "microphone" in aria_label.lower():
                         if "on" in aria_label.lower():
                             button.click()
-                            time.sleep(1)
                 except:
                     continue
 
-            # Look for the join button with multiple selectors
-            join_button_selectors = [
-                "//button[contains(@class, 'VfPpkd-LgbsSe')]//span[contains(text(), 'Join now')]/ancestor::button",
-                "//button[contains(@class, 'UywwFc-LgbsSe')]//span[contains(text(), 'Join now')]/ancestor::button",
-                "//button[contains(@class, 'Jyj1Td')]//span[contains(text(), 'Join now')]/ancestor::button",
-                "//button[contains(@data-id, 'join-now')]",
-                "//button[contains(@aria-label, 'Join now')]"
-            ]
-            
-            join_button = None
-            for selector in join_button_selectors:
-                try:
-                    join_button = WebDriverWait(self.driver, 10).until(
-                        EC.element_to_be_clickable((By.XPATH, selector))
-                    )
-                    if join_button.is_displayed() and join_button.is_enabled():
-                        break
-                except:
-                    continue
+            # Wait for whichever join button variant this Meet UI uses
+            join_button = self.selectors.find('join_button', timeout=10)
 
             if join_button:
                 logger.info("Found join button, attempting to click...")
@@ -291,15 +635,11 @@ class MeetingRecorder:
                 logger.info("Clicked join button, waiting for meeting to load...")
                 
                 # Wait for meeting to load
-                try:
-                    WebDriverWait(self.driver, 30).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, "[role='main'], [data-meeting-title]"))
-                    )
+                if self.selectors.find('in_meeting', timeout=30):
                     logger.info("Successfully joined the meeting")
                     return True
-                except:
-                    logger.error("Failed to detect meeting load after clicking join button")
-                    return False
+                logger.error("Failed to detect meeting load after clicking join button")
+                return False
             else:
                 logger.error("Could not find join button")
                 return False
@@ -349,6 +689,70 @@ class MeetingRecorder:
             logger.error(f"Error getting Chrome window: {e}")
             return None
 
+    def get_meet_viewport_rect(self):
+        """Get the screen region of the Meet content from the browser, in physical pixels"""
+        try:
+            rect = self.driver.execute_script("""
+                const main = document.querySelector("[role='main']");
+                const box = main ? main.getBoundingClientRect()
+                                 : {left: 0, top: 0, width: window.innerWidth, height: window.innerHeight};
+                const border = Math.max((window.outerWidth - window.innerWidth) / 2, 0);
+                const toolbar = Math.max(window.outerHeight - window.innerHeight - border, 0);
+                const ratio = window.devicePixelRatio || 1;
+                return {
+                    left: Math.round((window.screenX + border + box.left) * ratio),
+                    top: Math.round((window.screenY + toolbar + box.top) * ratio),
+                    width: Math.round(box.width * ratio),
+                    height: Math.round(box.height * ratio)
+                };
+            """)
+            if rect and rect['width'] > 0 and rect['height'] > 0:
+                return rect['left'], rect['top'], rect['width'], rect['height']
+            return None
+        except Exception as e:
+            logger.error(f"Error getting Meet viewport: {e}")
+            return None
+
+    def display_name(self):
+        """X display the browser draws to, or None for the current desktop"""
+        return self.session.display_name if self.session else None
+
+    def video_source(self):
+        """'screen' or 'screencast'; a headless browser can only be captured by screencast"""
+        return 'screencast' if BROWSER_DISPLAY == 'headless' else VIDEO_SOURCE
+
+    def debugger_address(self):
+        """host:port of the browser's DevTools endpoint"""
+        address = self.driver.capabilities.get('goog:chromeOptions', {}).get('debuggerAddress')
+        return address or getattr(self.driver.options, 'debugger_address', None)
+
+    def get_page_viewport_size(self):
+        """The tab's viewport in device pixels, as the screencast delivers it"""
+        width, height = self.driver.execute_script("""
+            const ratio = window.devicePixelRatio || 1;
+            return [Math.round(window.innerWidth * ratio), Math.round(window.innerHeight * ratio)];
+        """)
+        return even_size(width, height)
+
+    def get_recording_region(self, region_type):
+        """Get the (left, top, width, height) region to capture for a recording mode"""
+        screen = primary_monitor(self.display_name())
+        if region_type != 'meet_tab':
+            return screen
+
+        region = self.get_meet_viewport_rect()
+        if region is None and os.name == 'nt':
+            window_rect = self.get_chrome_window_rect()
+            if window_rect:
+                left, top, right, bottom = window_rect
+                region = (left, top, right - left, bottom - top)
+
+        region = clip_region(region, screen) if region else None
+        if region is None:
+            logger.warning("Could not locate the Meet tab, recording the full screen")
+            return screen
+        return region
+
     def start_recording(self, meeting_url):
         """Start recording the meeting"""
         try:
@@ -358,48 +762,42 @@ class MeetingRecorder:
             # Create meeting-specific directories
             meeting_dir = os.path.join(RECORDING_DIR, f"{meeting_url}_{timestamp}")
             os.makedirs(meeting_dir, exist_ok=True)
+            self.meeting_dir = meeting_dir
+            self.metadata = {
+                'meeting_id': meeting_url,
+                'started_at': datetime.now().isoformat()
+            }
+            if self.join_stats:
+                self.metadata['join'] = self.join_stats
             
-            # Get screen dimensions
-            screen = ImageGrab.grab()
-            screen_width, screen_height = screen.size
-
-            # Initialize video writer with proper codec and FPS
-            fourcc = cv2.VideoWriter_fourcc(*'XVID')
-            video_path = os.path.join(meeting_dir, "screen_recording.avi")
-            self.video_writer = cv2.VideoWriter(
-                video_path, 
-                fourcc, 
-                20.0, 
-                (screen_width, screen_height),
-                isColor=True
-            )
-            
-            # Initialize audio recording
-            audio_path = os.path.join(meeting_dir, "audio.wav")
-            self.audio_file = audio_path
+            # Audio is written as segments listed in the meeting manifest
+            self.manifest = RecordingManifest(meeting_dir)
+            # Both capture pipelines stamp their data on one clock so drift can be measured
+            self.clock = SessionClock()
+            self.timing = TimingIndex(meeting_dir)
+            self.manifest.set('clock_started_at', self.clock.started_at.isoformat())
+            self.transcriber = None
+            if TRANSCRIBE_AUDIO and LIVE_TRANSCRIPTION and backend_available(TRANSCRIPTION_BACKEND):
+                self.transcriber = Transcriber(TRANSCRIPTION_BACKEND, TRANSCRIPTION_WORKERS or None)
             
-            # Initialize transcription file
-            self.transcription_file = os.path.join(meeting_dir, "transcription.txt")
-            with open(self.transcription_file, 'w', encoding='utf-8') as f:
-                f.write("=== Meeting Transcription ===\n\n")
+            # Captions are appended to captions.jsonl and indexed for search as they are synced
+            self.recording_started_at = datetime.now(timezone.utc)
+            self.metadata['started_at_utc'] = self.recording_started_at.isoformat()
+            self.transcript_index = shared_index(TRANSCRIPT_INDEX_DB)
+            self.caption_writer = CaptionWriter(
+                meeting_dir, self.transcript_index, fsync_interval=CAPTION_FSYNC_SECONDS
+            )
             
-            # Enable captions in Meet
+            # Wait for the main content to load, then enable captions in Meet
+            if not self.selectors.find('in_meeting', timeout=20):
+                raise TimeoutException("Meeting content did not load")
             self.enable_captions()
             
-            # Wait for the main content to load with a more reliable selector
-            WebDriverWait(self.driver, 20).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "div[role='main'], [data-meeting-title]"))
-            )
-            
-            # Enable captions
-            try:
-                captions_button = WebDriverWait(self.driver, 10).until(
-                    EC.element_to_be_clickable((By.XPATH, "//button[contains(@aria-label, 'captions')]"))
-                )
-                captions_button.click()
-                logger.info("Enabled captions in Meet")
-            except TimeoutException:
-                logger.warning("Captions button not found - may already be enabled")
+            if self.record_video:
+                self.start_video(meeting_dir)
+            else:
+                logger.info("Recording audio and captions only")
+                self.metadata['recording'] = {'mode': 'audio_only'}
             
             # Add meeting end detection
             script = """
@@ -445,16 +843,20 @@ class MeetingRecorder:
             self.driver.command_executor._conn = pool
             
             # Start recording threads
-            self.screen_thread = threading.Thread(target=self.record_screen, args=(0, 0, screen_width, screen_height))
-            self.audio_thread = threading.Thread(target=self.record_audio)
-            self.caption_thread = threading.Thread(target=self.capture_captions)
+            # Named per slot, so per-thread CPU in the metrics can be told apart
+            self.screen_thread = threading.Thread(
+                target=self.record_screen, name=f"screen-{self.slot}"
+            ) if self.record_video else None
+            self.audio_thread = threading.Thread(target=self.record_audio, name=f"audio-{self.slot}")
+            self.caption_thread = threading.Thread(target=self.capture_captions, name=f"captions-{self.slot}")
             
             # Set threads as daemon threads so they stop when main thread stops
-            self.screen_thread.daemon = True
             self.audio_thread.daemon = True
             self.caption_thread.daemon = True
             
-            self.screen_thread.start()
+            if self.screen_thread:
+                self.screen_thread.daemon = True
+                self.screen_thread.start()
             self.audio_thread.start()
             self.caption_thread.start()
             
@@ -463,6 +865,11 @@ class MeetingRecorder:
             start_time = time.time()
             
             while True:
+                # Stopped from outside, e.g. the scheduled end time was reached
+                if not self.recording:
+                    logger.info("Recording stopped, leaving the meeting")
+                    break
+                
                 # Check for timeout
                 if time.time() - start_time > max_duration:
                     logger.info("Maximum recording duration reached (3 hours)")
@@ -488,37 +895,81 @@ class MeetingRecorder:
                     
             # Ensure recording stops
             self.stop_recording()
+            self.transcribe_recording()
             
         except Exception as e:
             logger.error(f"Error in recording: {str(e)}")
             self.stop_recording()
             raise
 
+    def start_video(self, meeting_dir):
+        """Set up the frame source, converter and segment encoder for the screen recording"""
+        # Work out the capture region and output format for the recording mode
+        mode = RECORDING_MODES.get(RECORDING_MODE)
+        if mode is None:
+            logger.warning(f"Unknown recording mode {RECORDING_MODE}, using fullscreen")
+            mode = RECORDING_MODES['fullscreen']
+        video_source = self.video_source()
+        if video_source == 'screencast':
+            # The screencast is always the whole tab viewport
+            region = (0, 0) + self.get_page_viewport_size()
+            self.frame_source = ScreencastFrameSource(
+                self.debugger_address(), region[2:], quality=SCREENCAST_QUALITY
+            )
+        else:
+            region = self.get_recording_region(mode['region'])
+            self.frame_source = MssFrameSource(*region, display=self.display_name())
+        output_size = even_size(*region[2:])
+        if mode['scaled'] and RECORDING_OUTPUT_SIZE:
+            output_size = even_size(*RECORDING_OUTPUT_SIZE)
+        self.frame_converter = FrameConverter(
+            region[2:], output_size, grayscale=mode['grayscale'], channels=self.frame_source.channels
+        )
+        self.metadata['recording'] = {
+            'mode': RECORDING_MODE,
+            'source': video_source,
+            'region': list(region),
+            'output_size': list(output_size),
+            'grayscale': mode['grayscale'],
+            'display': self.display_name() or 'desktop'
+        }
+        logger.info(f"Recording mode {RECORDING_MODE}: region {region}, output {output_size}")
+
+        # Initialize the video encoder, fed by the capture thread through a frame ring.
+        # Video is written as rolling segments listed in the manifest as they close.
+        self.video_encoder = VideoEncoder(
+            os.path.join(meeting_dir, "video"),
+            VIDEO_FPS,
+            output_size,
+            is_color=not mode['grayscale'],
+            slots=VIDEO_RING_SLOTS,
+            drop_policy=VIDEO_DROP_POLICY,
+            use_process=VIDEO_ENCODER_PROCESS,
+            segment_seconds=VIDEO_SEGMENT_SECONDS,
+            on_segment=lambda entry: self.manifest.add_segment('video', entry)
+        )
+        self.video_encoder.start()
+
     def enable_captions(self):
         """Enable captions in Google Meet"""
         try:
-            # Try multiple possible caption button selectors
-            caption_button_xpaths = [
-                "//button[contains(@aria-label, 'captions') or contains(@aria-label, 'subtitle')]",
-                "//button[@jsname='r8qRAd']",
-                "//button[contains(@data-tooltip, 'captions')]",
-                "//div[@role='button'][contains(., 'captions')]"
-            ]
+            caption_button = self.selectors.find('captions_button', timeout=5)
+            if caption_button is None:
+                logger.warning("Could not find caption button - captions may already be enabled")
+                return
+            if caption_button.get_attribute('aria-pressed') == 'true':
+                logger.info("Captions already enabled")
+                return
             
-            for xpath in caption_button_xpaths:
-                try:
-                    caption_button = WebDriverWait(self.driver, 5).until(
-                        EC.presence_of_element_located((By.XPATH, xpath))
-                    )
-                    if caption_button.is_displayed() and caption_button.is_enabled():
-                        caption_button.click()
-                        logger.info("Enabled captions in Meet")
-                        time.sleep(2)  # Wait for captions to initialize
-                        return
-                except:
-                    continue
-                
-            logger.warning("Could not find caption button - captions may already be enabled")
+            caption_button.click()
+            logger.info("Enabled captions in Meet")
+            # Wait for the button to report captions on rather than a fixed delay
+            try:
+                WebDriverWait(self.driver, 2).until(
+                    lambda driver: caption_button.get_attribute('aria-pressed') == 'true'
+                )
+            except TimeoutException:
+                pass
             
         except Exception as e:
             logger.error(f"Error enabling captions: {e}")
@@ -526,249 +977,277 @@ class MeetingRecorder:
     def capture_captions(self):
         """Capture live captions from Google Meet"""
         try:
-            # Set up caption observer with improved selector and handling
-            script = """
-            window.captionHistory = [];
-            window.lastProcessedText = '';
-            
-            function processCaptions() {
-                // Look for captions container with multiple possible selectors
-                const containers = document.querySelectorAll('.a4cQT, .zs7s8d, .VR3bTd');
-                
-                containers.forEach(container => {
-                    let speakerName = '';
-                    let captionText = '';
-                    
-                    // Try different speaker name selectors
-                    const speakerElem = container.querySelector('.M4LFnf, .YTbUzc');
-                    if (speakerElem) {
-                        speakerName = speakerElem.textContent.trim();
-                    }
-                    
-                    // Try different caption text selectors
-                    const textElem = container.querySelector('.VR3bTd, .CNusmb, .Pf3Ezf');
-                    if (textElem) {
-                        captionText = textElem.textContent.trim();
-                    }
-                    
-                    // Only process if we have both speaker and text
-                    if (speakerName && captionText && captionText !== window.lastProcessedText) {
-                        const timestamp = new Date().toISOString();
-                        const captionData = {
-                            timestamp: timestamp,
-                            speaker: speakerName,
-                            text: captionText
-                        };
-                        
-                        window.captionHistory.push(captionData);
-                        window.lastProcessedText = captionText;
-                        
-                        // Dispatch event for new caption
-                        window.dispatchEvent(new CustomEvent('newCaption', {
-                            detail: captionData
-                        }));
-                    }
-                });
-            }
-            
-            // Create mutation observer
-            window.captionObserver = new MutationObserver((mutations) => {
-                processCaptions();
-            });
-            
-            // Start observing with broader scope
-            window.captionObserver.observe(document.body, {
-                childList: true,
-                subtree: true,
-                characterData: true,
-                characterDataOldValue: true
-            });
-            
-            // Also set up periodic checking as backup
-            window.captionInterval = setInterval(processCaptions, 1000);
-            """
-            
-            self.driver.execute_script(script)
+            # Set up the scoped caption observer and ring buffer
+            self.driver.execute_script(
+                CAPTION_OBSERVER_SCRIPT, CAPTION_BUFFER_SIZE, CAPTION_IDLE_COMMIT_MS, CAPTION_SELECTORS
+            )
             logger.info("Caption observer initialized")
             
-            # Process captions
+            # Drain queued captions in batches
+            last_seq = 0
+            drains = 0
             while self.recording:
+                time.sleep(CAPTION_DRAIN_INTERVAL)
                 try:
-                    # Get latest caption data
-                    caption_data = self.driver.execute_script("""
-                        const history = window.captionHistory || [];
-                        return history[history.length - 1];
-                    """)
-                    
-                    if caption_data and caption_data.get('text'):
-                        # Format caption with timestamp and speaker
-                        formatted_caption = (
-                            f"[{caption_data['timestamp']}] "
-                            f"{caption_data['speaker']}: {caption_data['text']}\n"
-                        )
-                        
-                        # Write to file with proper encoding
-                        try:
-                            with open(self.transcription_file, 'a', encoding='utf-8') as f:
-                                f.write(formatted_caption)
-                                f.flush()  # Ensure it's written immediately
-                            logger.debug(f"Captured caption: {formatted_caption.strip()}")
-                        except Exception as e:
-                            logger.error(f"Error writing caption to file: {e}")
-                    
-                    time.sleep(0.5)  # Check every 500ms
-                    
+                    last_seq = self.drain_captions(last_seq)
+                    drains += 1
                 except Exception as e:
                     logger.error(f"Error processing caption: {e}")
-                    time.sleep(1)  # Wait longer on error
+            
+            # Commit in-progress utterances and pick up anything queued since the last drain
+            try:
+                self.driver.execute_script("""
+                    if (window.meetNotesCaptions) {
+                        window.meetNotesCaptions.flush();
+                    }
+                """)
+                last_seq = self.drain_captions(last_seq)
+                drains += 1
+            except Exception as e:
+                logger.error(f"Error draining final captions: {e}")
+            
+            logger.info(f"Caption capture finished: {last_seq} captions in {drains} drains")
+            try:
+                stats = self.driver.execute_script(
+                    "return window.meetNotesCaptions ? window.meetNotesCaptions.stats : null;"
+                )
+                if stats:
+                    logger.info(f"Caption observer stats: {stats}")
+            except Exception as e:
+                logger.error(f"Error reading caption observer stats: {e}")
                 
         except Exception as e:
             logger.error(f"Error in caption capture: {e}")
         finally:
-            # Clean up interval if it exists
+            # Disconnect observers and timers if they exist
             try:
                 self.driver.execute_script("""
-                    if (window.captionInterval) {
-                        clearInterval(window.captionInterval);
+                    if (window.meetNotesCaptions) {
+                        window.meetNotesCaptions.stop();
                     }
                 """)
             except:
                 pass
+            try:
+                self.caption_writer.close()
+            except Exception as e:
+                logger.error(f"Error closing caption file: {e}")
 
-    def record_screen(self, left, top, width, height):
-        """Record screen content"""
+    def drain_captions(self, last_seq):
+        """Fetch captions newer than last_seq in one round-trip and write them to the caption store"""
+        captions = self.driver.execute_script("""
+            return window.meetNotesCaptions ? window.meetNotesCaptions.drain(arguments[0]) : [];
+        """, last_seq) or []
+        
+        if not captions:
+            return last_seq
+        
+        records = []
+        now = datetime.now(timezone.utc)
+        for caption_data in captions:
+            seq = caption_data.get('seq', last_seq + 1)
+            if seq <= last_seq:
+                continue
+            if seq > last_seq + 1:
+                logger.warning(f"Missed captions {last_seq + 1}-{seq - 1}")
+            last_seq = seq
+            
+            if caption_data.get('text'):
+                # From the commit in the page, not the utterance start, so long utterances don't count as lag
+                lag = self.caption_lag(caption_data.get('committedAt') or caption_data['timestamp'], now)
+                if lag is not None:
+                    CAPTION_LAG_SECONDS.observe(lag)
+                records.append({
+                    'seq': seq,
+                    'timestamp': caption_data['timestamp'],
+                    'speaker': caption_data['speaker'],
+                    'text': caption_data['text'],
+                    'offset': self.caption_offset(caption_data['timestamp'])
+                })
+        
+        # Write the whole batch at once; the writer batches the fsyncs
         try:
+            self.caption_writer.write(records)
+            logger.debug(f"Captured {len(records)} captions (last seq {last_seq})")
+        except Exception as e:
+            logger.error(f"Error writing caption to file: {e}")
+        
+        return last_seq
+
+    @staticmethod
+    def caption_lag(timestamp, now):
+        """Seconds between a caption's UTC timestamp and now"""
+        try:
+            return max(0.0, (now - datetime.fromisoformat(timestamp.replace('Z', '+00:00'))).total_seconds())
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    def caption_offset(self, timestamp):
+        """Seconds from the start of the recording to a caption's UTC timestamp"""
+        try:
+            caption_time = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+            return round((caption_time - self.recording_started_at).total_seconds(), 3)
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    def record_screen(self):
+        """Capture frames paced against a monotonic clock and queue them for encoding"""
+        source = self.frame_source
+        pacer = FramePacer(VIDEO_FPS)
+        ring = self.video_encoder.ring
+        converter = self.frame_converter
+        detector = ChangeDetector(threshold=CHANGE_THRESHOLD) if CHANGE_DETECTION else None
+        keyframes = []
+        slot = str(self.slot)
+        window_start = self.clock.now()
+        window_frames = 0
+        try:
+            source.open()
+            pacer.start()
+            # Lets captions and search results be mapped to a position in the video
+            self.manifest.set('video_started_at', datetime.now(timezone.utc).isoformat())
             while self.recording:
-                # Capture the entire screen
-                screenshot = ImageGrab.grab(bbox=(left, top, width, height))
-                frame = np.array(screenshot)
+                pacer.wait()
+                
+                # Nothing repainted since the last frame: repeat it without grabbing or decoding
+                if not source.has_new_frame():
+                    repeat = pacer.fill()
+                    if repeat:
+                        ring.repeat_last(repeat)
+                    continue
+                grab_started = time.perf_counter()
+                frame = source.grab()
+                CAPTURE_SECONDS.observe(time.perf_counter() - grab_started)
+                FRAMES_CAPTURED.inc()
+                captured = self.clock.now()
+                window_frames += 1
+                if captured - window_start >= 1.0:
+                    CAPTURE_FPS.set(round(window_frames / (captured - window_start), 2), slot=slot)
+                    window_start, window_frames = captured, 0
                 
-                # Convert from RGB to BGR (OpenCV format)
-                frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+                # Write the frame as often as the clock requires (0 = drop, >1 = duplicate)
+                repeat = pacer.due()
+                if not repeat:
+                    continue
+                self.timing.mark(VIDEO, (pacer.written - repeat) / pacer.fps, captured)
                 
-                # Write frame
-                if frame.size > 0:
-                    self.video_writer.write(frame)
+                # Unchanged content is repeated by reference without converting or queueing a frame
+                if detector and not detector.changed(frame):
+                    ring.repeat_last(repeat)
+                    continue
                 
-                time.sleep(0.05)  # 20 FPS
+                # Convert straight into a ring slot; drop the frame if the encoder is behind
+                index = ring.acquire()
+                if index is None:
+                    ring.drop(repeat)
+                    continue
+                converter.convert(frame, ring.frames[index])
+                ring.commit(index, repeat)
+                if detector:
+                    detector.accept()
+                    keyframes.append({
+                        'frame': pacer.written - repeat,
+                        'time': round(pacer.elapsed(), 3)
+                    })
                 
         except Exception as e:
             logger.error(f"Error in screen recording: {e}")
             self.recording = False
+        finally:
+            source.close()
+            CAPTURE_FPS.remove(slot=slot)
+            stats = pacer.stats()
+            if hasattr(source, 'stats'):
+                stats.update(source.stats())
+            if detector:
+                stats['keyframes'] = len(keyframes)
+                self.save_keyframe_index(keyframes)
+            self.metadata.setdefault('video', {}).update(stats)
+            logger.info(
+                f"Screen recording finished: {stats['achieved_fps']} fps captured, "
+                f"{stats['declared_fps']} fps declared, {stats['frames_duplicated']} duplicated, "
+                f"{stats['frames_repeated']} repeated unchanged, {stats['frames_dropped']} dropped"
+            )
 
-    def record_audio(self):
-        """Record system audio using PyAudio"""
+    def save_keyframe_index(self, keyframes):
+        """Save the frames where screen content changed, e.g. slide transitions"""
         try:
-            import pyaudio
-            import wave
-            import numpy as np
-            from contextlib import contextmanager
-
-            CHUNK = 1024
-            FORMAT = pyaudio.paInt16
-            CHANNELS = 2
-            RATE = 44100
-
-            # Create a context manager for PyAudio to ensure proper cleanup
-            @contextmanager
-            def audio_manager():
-                p = pyaudio.PyAudio()
-                try:
-                    yield p
-                finally:
-                    p.terminate()
-
-            with audio_manager() as p:
-                # Find the system audio input device
-                device_index = None
-                info = None
-                
-                # First try to find Stereo Mix
-                for i in range(p.get_device_count()):
-                    try:
-                        info = p.get_device_info_by_index(i)
-                        if info['maxInputChannels'] > 0:
-                            if 'Stereo Mix' in info['name'] or 'What U Hear' in info['name']:
-                                device_index = i
-                                break
-                    except Exception:
-                        continue
-
-                # If no Stereo Mix, try to find any working input device
-                if device_index is None:
-                    for i in range(p.get_device_count()):
-                        try:
-                            info = p.get_device_info_by_index(i)
-                            if info['maxInputChannels'] > 0:
-                                test_stream = p.open(
-                                    format=FORMAT,
-                                    channels=CHANNELS,
-                                    rate=RATE,
-                                    input=True,
-                                    input_device_index=i,
-                                    frames_per_buffer=CHUNK,
-                                    start=False
-                                )
-                                test_stream.close()
-                                device_index = i
-                                break
-                        except Exception:
-                            continue
-
-                if device_index is None:
-                    raise Exception("No working audio input device found")
-
-                logger.info(f"Using audio device: {info['name']} (index: {device_index})")
-
-                # Configure audio stream with larger buffer
-                stream = p.open(
-                    format=FORMAT,
-                    channels=CHANNELS,
-                    rate=RATE,
-                    input=True,
-                    input_device_index=device_index,
-                    frames_per_buffer=CHUNK * 4,  # Increased buffer size
-                    stream_callback=None
-                )
-            
-            # Open wave file for writing
-                with wave.open(self.audio_file, 'wb') as wf:
-                    wf.setnchannels(CHANNELS)
-                    wf.setsampwidth(p.get_sample_size(FORMAT))
-                    wf.setframerate(RATE)
-
-                    logger.info("Started audio recording")
-                    stream.start_stream()
-
-            while self.recording:
-                try:
-                    data = stream.read(CHUNK, exception_on_overflow=False)
-                    if data:  # Only write if we got data
-                        wf.writeframes(data)
-                except IOError as e:
-                    if e.errno == -9981:  # Buffer overflow
-                        logger.warning("Audio buffer overflow - adjusting...")
-                        time.sleep(0.1)  # Give the buffer time to clear
-                        continue
-                    else:
-                        logger.error(f"Audio recording error: {e}")
-                        break
-                except Exception as e:
-                    logger.error(f"Error reading audio chunk: {e}")
-                    break
+            keyframes_path = os.path.join(self.meeting_dir, "keyframes.json")
+            with open(keyframes_path, 'w', encoding='utf-8') as f:
+                json.dump({'fps': VIDEO_FPS, 'keyframes': keyframes}, f, indent=2)
+            logger.info(f"Saved {len(keyframes)} keyframes to {keyframes_path}")
+        except Exception as e:
+            logger.error(f"Error saving keyframe index: {e}")
 
-                    # Clean up stream
-                    try:
-                        stream.stop_stream()
-                        stream.close()
-                    except Exception as e:
-                        logger.error(f"Error closing audio stream: {e}")
+    def on_audio_segment_ready(self, segment):
+        """Queue a finished audio segment for near-real-time transcription"""
+        if not getattr(self, 'transcriber', None):
+            return
+        try:
+            chunks = self.transcriber.submit_segment(self.meeting_dir, segment)
+            logger.info(f"Queued {chunks} speech chunks from audio segment {segment['index']}")
+        except Exception as e:
+            logger.error(f"Error queueing audio segment for transcription: {e}")
 
-                logger.info("Audio recording completed")
+    def transcribe_recording(self):
+        """Finish the speech-to-text transcript for the meeting that just ended"""
+        transcriber = getattr(self, 'transcriber', None)
+        if not TRANSCRIBE_AUDIO or not getattr(self, 'meeting_dir', None):
+            return
+        if not transcriber and not backend_available(TRANSCRIPTION_BACKEND):
+            return
+        try:
+            if transcriber:
+                transcriber.collect(self.meeting_dir)
+            else:
+                transcriber = Transcriber(TRANSCRIPTION_BACKEND, TRANSCRIPTION_WORKERS or None)
+                transcriber.transcribe_meeting(self.meeting_dir)
+            shared_index(TRANSCRIPT_INDEX_DB).index_meeting(self.meeting_dir)
+        except Exception as e:
+            logger.error(f"Error transcribing meeting audio: {e}")
+        finally:
+            if transcriber:
+                transcriber.close()
+            self.transcriber = None
 
+    def record_audio(self):
+        """Record system audio using PyAudio callbacks and a background writer"""
+        recorder = None
+        try:
+            recorder = AudioRecorder(
+                self.meeting_dir,
+                self.manifest,
+                rate=AUDIO_RATE,
+                channels=AUDIO_CHANNELS,
+                buffer_seconds=AUDIO_BUFFER_SECONDS,
+                block_seconds=AUDIO_WRITE_BLOCK_SECONDS,
+                segment_seconds=AUDIO_SEGMENT_MINUTES * 60,
+                audio_format=AUDIO_FORMAT,
+                on_segment_ready=self.on_audio_segment_ready,
+                vad=StreamingVAD(EnergyVAD(AUDIO_RATE)) if AUDIO_VAD else None,
+                speech_only=AUDIO_SPEECH_ONLY,
+                pulse_device=self.session.audio_device if self.session else None,
+                clock=self.clock,
+                timing=self.timing
+            )
+            recorder.start()
+            
+            while self.recording:
+                time.sleep(0.5)
+                
         except Exception as e:
             logger.error(f"Error in audio recording: {e}")
             self.recording = False
+        finally:
+            if recorder:
+                recorder.stop()
+                stats = recorder.stats()
+                self.metadata['audio'] = stats
+                if stats['input_overflows'] or stats['ring_overflows']:
+                    logger.warning(
+                        f"Audio overflows: {stats['input_overflows']} input, "
+                        f"{stats['ring_overflows']} ring ({stats['ring_overflow_bytes']} bytes)"
+                    )
 
     def stop_recording(self):
         """Stop all recording activities"""
@@ -781,9 +1260,8 @@ class MeetingRecorder:
             try:
                 if self.driver:
                     self.driver.execute_script("""
-                        if (window.captionObserver) {
-                            window.captionObserver.disconnect();
-                            window.captionObserver = null;
+                        if (window.meetNotesCaptions) {
+                            window.meetNotesCaptions.stop();
                         }
                     """)
                     logger.info("Caption observer stopped")
@@ -808,43 +1286,106 @@ class MeetingRecorder:
                 except Exception as e:
                     logger.error(f"Error stopping {name} thread: {e}")
 
-            # Release video writer
+            # Flush and release the video encoder
             try:
-                if hasattr(self, 'video_writer') and self.video_writer:
-                    self.video_writer.release()
-                    logger.info("Video writer released")
+                if getattr(self, 'video_encoder', None):
+                    self.video_encoder.stop()
+                    encoder_stats = self.video_encoder.stats()
+                    self.metadata.setdefault('video', {}).update(encoder_stats)
+                    logger.info(f"Video encoder released: {encoder_stats}")
             except Exception as e:
-                logger.error(f"Error releasing video writer: {e}")
+                logger.error(f"Error releasing video encoder: {e}")
+
+            # Every segment is already complete on disk; finishing the recording is one manifest write
+            if getattr(self, 'manifest', None):
+                self.manifest.set('finalized_at', datetime.now(timezone.utc).isoformat())
 
-            # Close browser last
+            # Measure how far the audio and video clocks drifted apart
             try:
-                if hasattr(self, 'driver') and self.driver:
-                    self.driver.quit()
-                    logger.info("Browser closed")
+                if getattr(self, 'timing', None):
+                    self.timing.close()
+                    self.metadata['sync'] = measure_drift(self.meeting_dir)
+                    logger.info(f"A/V sync: {self.metadata['sync']}")
             except Exception as e:
-                logger.error(f"Error closing browser: {e}")
+                logger.error(f"Error measuring A/V drift: {e}")
+
+            if getattr(self, 'selectors', None) and getattr(self, 'metadata', None) is not None:
+                self.metadata['selector_waits'] = self.selectors.timings
+                self.selectors.timings = []
+            self.write_metadata()
+
+            # Leave the call but keep the browser for the next meeting
+            self.leave_call()
 
         except Exception as e:
             logger.error(f"Error in stop_recording: {str(e)}")
         finally:
             # Reset all attributes
             self.recording = False
-            self.video_writer = None
-            self.driver = None
+            self.video_encoder = None
+            self.timing = None
+            self.join_stats = None
             self.screen_thread = None
             self.audio_thread = None
             self.caption_thread = None
             logger.info("Recording stopped and resources cleaned up")
 
+    def write_metadata(self):
+        """Write the meeting's metadata.json next to its recordings"""
+        try:
+            if getattr(self, 'meeting_dir', None) and getattr(self, 'metadata', None):
+                self.metadata['ended_at'] = datetime.now().isoformat()
+                metadata_path = os.path.join(self.meeting_dir, "metadata.json")
+                with open(metadata_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.metadata, f, indent=2)
+                logger.info(f"Saved meeting metadata to {metadata_path}")
+        except Exception as e:
+            logger.error(f"Error writing meeting metadata: {e}")
+
+    def reset_session(self):
+        """Forget the last meeting and leave any call, ready for the next one; return whether the browser is usable"""
+        self.meeting_dir = None
+        return self.leave_call()
+
+    def leave_call(self):
+        """Leave any call and park the browser on a blank page; return whether it is still usable"""
+        try:
+            if getattr(self, 'driver', None) is None:
+                return False
+            if self.driver.current_url.startswith('https://meet.google.com/'):
+                # Hang up first so the call sees us leave rather than drop
+                leave_button = self.selectors.find('leave_button', timeout=2)
+                if leave_button is not None:
+                    leave_button.click()
+            self.driver.get('about:blank')
+            return True
+        except Exception as e:
+            logger.error(f"Error resetting browser session: {e}")
+            return False
+
+    def close_browser(self):
+        """Quit the browser"""
+        try:
+            if getattr(self, 'driver', None):
+                self.driver.quit()
+                logger.info("Browser closed")
+        except Exception as e:
+            logger.error(f"Error closing browser: {e}")
+        finally:
+            self.driver = None
+            if self.session:
+                self.session.stop()
+                self.session = None
+
     def leave_meeting(self):
         """Leave the current meeting"""
         try:
             self.stop_recording()
-            self.driver.quit()
+            self.close_browser()
         except Exception as e:
             logger.error(f"Error leaving meeting: {e}")
 
     def __del__(self):
         """Cleanup resources"""
-        if hasattr(self, 'driver'):
+        if getattr(self, 'driver', None):
             self.driver.quit() 
@@ -0,0 +1,464 @@
+import os
+import sys
+import json
+import time
+import bisect
+import logging
+import threading
+from collections import Counter as Tally
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers sub-millisecond frame work up to multi-second WebDriver stalls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+                     for name, value in labels.items())
+    return '{' + pairs + '}'
+
+
+class Metric:
+    """A named metric with one value per combination of label values"""
+
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def remove(self, **labels):
+        with self.lock:
+            self.values.pop(self._key(labels), None)
+
+    def items(self):
+        """[(labels dict, value)] for every label combination seen so far"""
+        with self.lock:
+            items = list(self.values.items())
+        return [(dict(zip(self.labels, key)), self._copy(value)) for key, value in items]
+
+    def _copy(self, value):
+        return value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self, labels, value):
+        yield self.name, labels, value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def samples(self, labels, value):
+        yield self.name, labels, value
+
+
+class Histogram(Metric):
+    """Counts of observations per bucket, plus their sum and count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][position] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _copy(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+    def samples(self, labels, value):
+        counts, total, count = value
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            yield self.name + '_bucket', dict(labels, le=format_value(float(bound))), cumulative
+        yield self.name + '_sum', labels, total
+        yield self.name + '_count', labels, count
+
+    def quantile(self, value, q):
+        """Upper bound of the bucket holding the q-th quantile; None if it is past the last bucket"""
+        counts, _, count = value
+        if not count:
+            return None
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= q * count:
+                return bound
+        return None
+
+
+class Registry:
+    """All metrics of the process, plus collectors that refresh gauges when metrics are read"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.collectors = []
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, labels, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def add_collector(self, collect):
+        """collect() is called before every scrape and snapshot, e.g. to set gauges from a stats dict"""
+        with self.lock:
+            self.collectors.append(collect)
+
+    def collect(self):
+        with self.lock:
+            collectors = list(self.collectors)
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        for collect in collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {e}")
+        return metrics
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in metric.items():
+                for name, sample_labels, sample in metric.samples(labels, value):
+                    lines.append(f"{name}{format_labels(sample_labels)} {format_value(sample)}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """Every metric as plain data; histograms as count, sum, mean and bucket-bound p50/p95/p99"""
+        metrics = {}
+        for metric in self.collect():
+            values = []
+            for labels, value in metric.items():
+                if isinstance(metric, Histogram):
+                    counts, total, count = value
+                    value = {
+                        'count': count,
+                        'sum': round(total, 6),
+                        'mean': round(total / count, 6) if count else None,
+                        'p50': metric.quantile(value, 0.5),
+                        'p95': metric.quantile(value, 0.95),
+                        'p99': metric.quantile(value, 0.99)
+                    }
+                values.append({'labels': labels, 'value': value})
+            metrics[metric.name] = {'type': metric.kind, 'help': metric.help, 'values': values}
+        return {'timestamp': datetime.now(timezone.utc).isoformat(), 'metrics': metrics}
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help_text, labels=()):
+    return REGISTRY.counter(name, help_text, labels)
+
+
+def gauge(name, help_text, labels=()):
+    return REGISTRY.gauge(name, help_text, labels)
+
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.histogram(name, help_text, labels, buckets)
+
+
+class ThreadSampler:
+    """CPU per Python thread and memory of the process, from psutil
+
+    Memory is only accounted per process by the OS, so RSS is reported for
+    the whole recorder process; the browsers' RSS is reported per recorder
+    slot by the recorder pool. CPU is reported per thread name, summed over
+    the threads with that name; threads psutil sees that are not Python
+    threads (PortAudio, ffmpeg readers, ...) are summed as 'native'.
+    """
+
+    def __init__(self, registry=REGISTRY):
+        self.process = psutil.Process()
+        self.cpu_seconds = registry.counter('meet_notes_thread_cpu_seconds_total',
+                                            'CPU time used by each thread', ['thread'])
+        self.cpu_percent = registry.gauge('meet_notes_thread_cpu_percent',
+                                          'CPU use of each thread since the previous sample', ['thread'])
+        self.rss = registry.gauge('meet_notes_process_rss_bytes', 'Resident memory of the recorder process')
+        self.process_threads = registry.gauge('meet_notes_process_threads', 'Threads in the recorder process')
+        self.last = {}
+        self.last_names = set()
+        self.last_sampled = None
+        self.lock = threading.Lock()
+
+    def sample(self):
+        with self.lock:
+            now = time.monotonic()
+            names = {thread.native_id: thread.name for thread in threading.enumerate()}
+            # Totals are tracked per OS thread: threads that share a name (one per
+            # recorder slot, restarted workers) would otherwise mask each other
+            totals = {}
+            used = {}
+            threads = self.process.threads()
+            for thread_id, user, system in threads:
+                seconds = user + system
+                previous = self.last.get(thread_id, 0.0)
+                # A lower total means the thread ID was reused by a new thread
+                delta = seconds - previous if seconds >= previous else seconds
+                name = names.get(thread_id, 'native')
+                used[name] = used.get(name, 0.0) + delta
+                totals[thread_id] = seconds
+            elapsed = now - self.last_sampled if self.last_sampled else None
+            for name, seconds in used.items():
+                self.cpu_seconds.inc(seconds, thread=name)
+                if elapsed:
+                    self.cpu_percent.set(round(100 * seconds / elapsed, 1), thread=name)
+            for name in self.last_names - set(used):
+                self.cpu_percent.remove(thread=name)
+            self.last = totals
+            self.last_names = set(used)
+            self.last_sampled = now
+            self.rss.set(self.process.memory_info().rss)
+            self.process_threads.set(len(threads))
+
+
+class SamplingProfiler:
+    """Opt-in statistical profiler: samples every thread's Python stack at a fixed interval
+
+    Samples are kept as folded stacks ("thread;module:function;... count"),
+    the input format of flamegraph tools. Only the sampling thread does any
+    work, so the recorder threads run at full speed; the cost is roughly one
+    stack walk per thread per interval.
+    """
+
+    def __init__(self, interval=0.01, registry=REGISTRY):
+        self.interval = interval
+        self.stacks = Tally()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = threading.Event()
+        self.sample_count = registry.counter('meet_notes_profiler_samples_total', 'Stack samples taken by the profiler')
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        with self.lock:
+            if self.running:
+                return False
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self.thread.start()
+        logger.info(f"Sampling profiler started ({self.interval * 1000:.0f} ms interval)")
+        return True
+
+    def stop(self):
+        with self.lock:
+            if not self.running:
+                return False
+            self.stopped.set()
+            thread = self.thread
+        thread.join()
+        logger.info(f"Sampling profiler stopped after {sum(self.stacks.values())} samples")
+        return True
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            samples = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.splitext(os.path.basename(code.co_filename))[0]}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                samples.append(';'.join(reversed(stack)))
+            with self.lock:
+                self.stacks.update(samples)
+            self.sample_count.inc()
+
+    def folded(self):
+        with self.lock:
+            stacks = self.stacks.most_common()
+        return ''.join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def reset(self):
+        with self.lock:
+            self.stacks.clear()
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.folded())
+        logger.info(f"Saved profile to {path}")
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """/metrics (Prometheus), /metrics.json, and /profile, /profile/start, /profile/stop"""
+
+    registry = REGISTRY
+    profiler = None
+
+    def do_GET(self):
+        path = self.path.split('?')[0].rstrip('/')
+        if path == '/metrics':
+            self._reply(self.registry.render(), 'text/plain; version=0.0.4; charset=utf-8')
+        elif path == '/metrics.json':
+            self._reply(json.dumps(self.registry.snapshot(), indent=2), 'application/json')
+        elif path.startswith('/profile') and self.profiler is None:
+            self._reply("Profiler not available\n", 'text/plain', 404)
+        elif path == '/profile':
+            self._reply(self.profiler.folded(), 'text/plain; charset=utf-8')
+        elif path == '/profile/start':
+            self.profiler.reset()
+            self.profiler.start()
+            self._reply("Profiler started\n", 'text/plain')
+        elif path == '/profile/stop':
+            self.profiler.stop()
+            self._reply("Profiler stopped\n", 'text/plain')
+        else:
+            self._reply("Not found\n", 'text/plain', 404)
+
+    def _reply(self, body, content_type, status=200):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would otherwise fill the log
+        logger.debug(format % args)
+
+
+class MetricsService:
+    """Serves the registry over HTTP, writes periodic JSON snapshots and samples thread CPU
+
+    The HTTP server only listens on host (localhost by default); port 0
+    disables it, as does snapshot_seconds 0 for the snapshots. With
+    profile=True the sampling profiler runs from the start, otherwise it
+    can be switched on and off through /profile/start and /profile/stop.
+    """
+
+    def __init__(self, port=0, host='127.0.0.1', snapshot_path=None, snapshot_seconds=0, sample_seconds=5,
+                 profile=False, profile_interval=0.01, profile_path=None, registry=REGISTRY):
+        self.port = port
+        self.host = host
+        self.snapshot_path = snapshot_path
+        self.snapshot_seconds = snapshot_seconds
+        self.sample_seconds = sample_seconds
+        self.profile = profile
+        self.profile_path = profile_path
+        self.registry = registry
+        self.threads = ThreadSampler(registry)
+        self.profiler = SamplingProfiler(profile_interval, registry)
+        self.server = None
+        self.stopped = threading.Event()
+        self.worker = None
+
+    def start(self):
+        if self.port:
+            handler = type('Handler', (MetricsHandler,), {'registry': self.registry, 'profiler': self.profiler})
+            try:
+                self.server = ThreadingHTTPServer((self.host, self.port), handler)
+                self.server.daemon_threads = True
+                threading.Thread(target=self.server.serve_forever, name='metrics-http', daemon=True).start()
+                logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+            except OSError as e:
+                logger.error(f"Error starting metrics server on port {self.port}: {e}")
+                self.server = None
+        if self.profile:
+            self.profiler.start()
+        self.worker = threading.Thread(target=self._run, name='metrics-sampler', daemon=True)
+        self.worker.start()
+        return self
+
+    def _run(self):
+        last_snapshot = time.monotonic()
+        while not self.stopped.wait(self.sample_seconds):
+            try:
+                self.threads.sample()
+            except Exception as e:
+                logger.error(f"Error sampling thread CPU: {e}")
+            if self.snapshot_seconds and time.monotonic() - last_snapshot >= self.snapshot_seconds:
+                last_snapshot = time.monotonic()
+                self.write_snapshot()
+
+    def write_snapshot(self):
+        """Replace the snapshot file atomically, so readers never see a partial one"""
+        if not self.snapshot_path:
+            return
+        try:
+            temp_path = self.snapshot_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.registry.snapshot(), f, indent=2)
+            os.replace(temp_path, self.snapshot_path)
+        except Exception as e:
+            logger.error(f"Error writing metrics snapshot: {e}")
+
+    def stop(self):
+        self.stopped.set()
+        if self.worker:
+            self.worker.join(timeout=5)
+        if self.snapshot_seconds:
+            self.write_snapshot()
+        self.profiler.stop()
+        if self.profile_path and self.profiler.stacks:
+            self.profiler.save(self.profile_path)
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
@@ -0,0 +1,583 @@
+import os
+import json
+import time
+import queue
+import shutil
+import sqlite3
+import logging
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import psutil
+from functools import partial
+from manifest import load_manifest, segment_paths
+from transcript_store import seconds_between, FINAL_VIDEO, LEGACY_VIDEO
+from av_sync import measure_drift
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+AUDIO_TRACK = 'audio_track.flac'
+VIDEO_LIST = 'video_segments.ffconcat'
+MUXED_VIDEO = 'muxed.mkv'
+THUMBNAILS = 'thumbnails.jpg'
+# Sound card and capture clocks are off by tens of ppm; far beyond that the timing fit is wrong
+MAX_DRIFT_PPM = 500
+
+
+def lower_priority(niceness):
+    """Pool initializer: run post-processing below the live recorders' priority"""
+    try:
+        if hasattr(os, 'nice'):
+            os.nice(niceness)
+        else:
+            psutil.Process().nice(psutil.BELOW_NORMAL_PRIORITY_CLASS)
+    except Exception as e:
+        logger.warning(f"Could not lower post-processing priority: {e}")
+
+
+def init_worker(niceness, worker_pids):
+    """Pool initializer: report the worker's PID so stop() can end it, then lower its priority"""
+    worker_pids.put(os.getpid())
+    lower_priority(niceness)
+
+
+def find_ffmpeg(options):
+    ffmpeg = shutil.which(options['ffmpeg'])
+    if not ffmpeg:
+        raise FileNotFoundError(f"{options['ffmpeg']} not found")
+    return ffmpeg
+
+
+def run_ffmpeg(args, options):
+    ffmpeg = find_ffmpeg(options)
+    result = subprocess.run(
+        [ffmpeg, '-hide_banner', '-loglevel', 'error', '-y'] + args,
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()[-500:]}")
+
+
+def build_audio_track(meeting_dir, segments, out_path):
+    """Join the audio segments into one continuous track, filling dropped silence with zeros"""
+    import numpy as np
+    import soundfile as sf
+
+    rate = segments[0]['sample_rate']
+    channels = segments[0]['channels']
+    block = rate * 10
+    silence = np.zeros((block, channels), dtype=np.int16)
+    position = 0.0
+    tmp_path = out_path + '.tmp'
+    with sf.SoundFile(tmp_path, 'w', samplerate=rate, channels=channels, format='FLAC', subtype='PCM_16') as dst:
+        for segment in segments:
+            spans = segment.get('spans') or [[segment['start_offset'], segment['duration']]]
+            with sf.SoundFile(os.path.join(meeting_dir, segment['file'])) as src:
+                for start, duration in spans:
+                    gap = int(round((start - position) * rate))
+                    while gap > 0:
+                        dst.write(silence[:min(gap, block)])
+                        gap -= block
+                    remaining = int(round(duration * rate))
+                    while remaining > 0:
+                        data = src.read(min(remaining, block), dtype='int16', always_2d=True)
+                        if not len(data):
+                            break
+                        dst.write(data)
+                        remaining -= len(data)
+                    position = start + duration
+    os.replace(tmp_path, out_path)
+    return position
+
+
+def source_videos(meeting_dir, manifest):
+    """The recorded video files in order: the manifest's segments, or an older single AVI"""
+    paths = segment_paths(meeting_dir, manifest, 'video')
+    legacy_path = os.path.join(meeting_dir, LEGACY_VIDEO)
+    if not paths and os.path.exists(legacy_path):
+        paths = [legacy_path]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def output_videos(meeting_dir):
+    """The final MP4 if there is one, otherwise the recorded video files"""
+    final_path = os.path.join(meeting_dir, FINAL_VIDEO)
+    if os.path.exists(final_path):
+        return [final_path]
+    return source_videos(meeting_dir, load_manifest(meeting_dir))
+
+
+def stage_mux(meeting_dir, options, results):
+    """Put the screen recording and a continuous audio track into one file, aligned and drift-corrected"""
+    manifest = load_manifest(meeting_dir) or {}
+    videos = source_videos(meeting_dir, manifest)
+    if not videos:
+        return {'skipped': 'no screen recording'}
+    find_ffmpeg(options)
+    segments = manifest.get('streams', {}).get('audio', [])
+
+    # The video segments play back to back as one stream through the concat demuxer
+    list_path = os.path.join(meeting_dir, VIDEO_LIST)
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.write('ffconcat version 1.0\n')
+        for path in videos:
+            f.write(f"file '{os.path.relpath(path, meeting_dir)}'\n")
+    args = ['-f', 'concat', '-safe', '0', '-i', list_path]
+    codecs = ['-c', 'copy']
+    result = {'output': MUXED_VIDEO}
+    if segments:
+        audio_path = os.path.join(meeting_dir, AUDIO_TRACK)
+        result['audio_seconds'] = build_audio_track(meeting_dir, segments, audio_path)
+        sync = measure_drift(meeting_dir)
+        max_drift_ppm = options.get('max_drift_ppm', MAX_DRIFT_PPM)
+        drift_ppm = abs(sync['tempo'] - 1.0) * 1e6 if 'tempo' in sync else None
+        if drift_ppm is not None and drift_ppm > max_drift_ppm:
+            logger.warning(f"Ignoring implausible A/V drift for {meeting_dir}: tempo {sync['tempo']:.6f} "
+                           f"({drift_ppm:.0f} ppm, limit {max_drift_ppm:.0f} ppm); aligning by start times")
+            result['drift_correction_skipped'] = (f"tempo {sync['tempo']:.6f} is {drift_ppm:.0f} ppm off, "
+                                                  f"limit {max_drift_ppm:.0f} ppm")
+            sync = {}
+        if 'tempo' in sync:
+            # Shift the audio onto the video timeline and stretch it by the measured clock drift
+            delay = sync['audio_delay_seconds']
+            result.update(tempo=sync['tempo'], uncorrected_skew_ms=sync['uncorrected_skew_ms'],
+                          corrected_skew_ms=sync['corrected_skew_ms'])
+            codecs = ['-c:v', 'copy', '-af', f"atempo={sync['tempo']:.9f}", '-c:a', 'flac']
+        else:
+            # No timing index (older recordings) or an implausible fit: align by the start times alone
+            delay = seconds_between(manifest.get('video_started_at'), manifest.get('audio_started_at')) or 0.0
+        result['audio_delay_seconds'] = delay
+        if delay >= 0:
+            args += ['-itsoffset', f"{delay:.6f}", '-i', audio_path]
+        else:
+            args += ['-ss', f"{-delay:.6f}", '-i', audio_path]
+        args += ['-map', '0:v', '-map', '1:a']
+    out_path = os.path.join(meeting_dir, MUXED_VIDEO)
+    run_ffmpeg(args + codecs + ['-f', 'matroska', out_path + '.tmp'], options)
+    os.replace(out_path + '.tmp', out_path)
+    os.remove(list_path)
+    result['video_segments'] = len(videos)
+    return result
+
+
+def stage_encode(meeting_dir, options, results):
+    """Re-encode the muxed recording to H.264/AAC MP4"""
+    muxed_path = os.path.join(meeting_dir, MUXED_VIDEO)
+    if not os.path.exists(muxed_path):
+        return {'skipped': 'nothing muxed'}
+    out_path = os.path.join(meeting_dir, FINAL_VIDEO)
+    run_ffmpeg([
+        '-i', muxed_path,
+        '-c:v', 'libx264', '-preset', options['preset'], '-crf', str(options['crf']),
+        '-pix_fmt', 'yuv420p', '-threads', str(options['threads']),
+        '-c:a', 'aac', '-b:a', options['audio_bitrate'],
+        '-movflags', '+faststart', '-f', 'mp4', out_path + '.tmp'
+    ], options)
+    os.replace(out_path + '.tmp', out_path)
+    videos = source_videos(meeting_dir, load_manifest(meeting_dir))
+    source_bytes = sum(os.path.getsize(path) for path in videos)
+    os.remove(muxed_path)
+    audio_path = os.path.join(meeting_dir, AUDIO_TRACK)
+    if os.path.exists(audio_path):
+        os.remove(audio_path)  # Now inside the MP4; the segment files are kept
+    if not options['keep_source']:
+        for path in videos:
+            os.remove(path)
+    return {'output': FINAL_VIDEO, 'source_bytes': source_bytes, 'output_bytes': os.path.getsize(out_path)}
+
+
+def stage_thumbnails(meeting_dir, options, results):
+    """Save evenly spaced frames side by side as one thumbnail strip"""
+    import cv2
+
+    videos = output_videos(meeting_dir)
+    if not videos:
+        return {'skipped': 'no video'}
+    # Frame counts come from the AVI/MP4 headers, so this doesn't decode anything
+    counts = []
+    fps = 1
+    for path in videos:
+        capture = cv2.VideoCapture(path)
+        counts.append(int(capture.get(cv2.CAP_PROP_FRAME_COUNT)))
+        fps = capture.get(cv2.CAP_PROP_FPS) or fps
+        capture.release()
+    total = sum(counts)
+    count = max(1, options['thumbnails'])
+    height = options['thumbnail_height']
+    thumbs = []
+    times = []
+    for i in range(count):
+        frame_index = int(total * (i + 0.5) / count)
+        # Find the file holding this frame
+        local_index = frame_index
+        for path, frames in zip(videos, counts):
+            if local_index < frames:
+                break
+            local_index -= frames
+        capture = cv2.VideoCapture(path)
+        try:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, local_index)
+            ok, frame = capture.read()
+        finally:
+            capture.release()
+        if not ok:
+            continue
+        width = max(1, int(frame.shape[1] * height / frame.shape[0]))
+        thumbs.append(cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA))
+        times.append(round(frame_index / fps, 3))
+    if not thumbs:
+        return {'skipped': 'no readable frames'}
+    tmp_path = os.path.join(meeting_dir, 'thumbnails.tmp.jpg')
+    cv2.imwrite(tmp_path, cv2.hconcat(thumbs), [cv2.IMWRITE_JPEG_QUALITY, 80])
+    os.replace(tmp_path, os.path.join(meeting_dir, THUMBNAILS))
+    return {'output': THUMBNAILS, 'times': times}
+
+
+def stage_metadata(meeting_dir, options, results):
+    """Record the outputs, durations and stage timings in metadata.json"""
+    import cv2
+
+    summary = {'stages': results, 'files': {}}
+    for name in sorted(os.listdir(meeting_dir)):
+        path = os.path.join(meeting_dir, name)
+        if os.path.isfile(path) and not name.endswith('.tmp'):
+            summary['files'][name] = os.path.getsize(path)
+    videos = output_videos(meeting_dir)
+    if videos:
+        frames = 0
+        for path in videos:
+            capture = cv2.VideoCapture(path)
+            fps = capture.get(cv2.CAP_PROP_FPS)
+            frames += int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            capture.release()
+        summary['video'] = {
+            'files': [os.path.relpath(path, meeting_dir) for path in videos],
+            'fps': fps,
+            'frames': frames,
+            'width': width,
+            'height': height,
+            'duration_seconds': round(frames / fps, 3) if fps else None
+        }
+
+    metadata_path = os.path.join(meeting_dir, 'metadata.json')
+    metadata = {}
+    if os.path.exists(metadata_path):
+        with open(metadata_path, encoding='utf-8') as f:
+            metadata = json.load(f)
+    metadata['postprocess'] = summary
+    with open(metadata_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(metadata_path + '.tmp', metadata_path)
+    return {'files': len(summary['files'])}
+
+
+STAGES = [
+    ('mux', stage_mux),
+    ('encode', stage_encode),
+    ('thumbnails', stage_thumbnails),
+    ('metadata', stage_metadata)
+]
+
+
+def run_stage(name, meeting_dir, options, results):
+    """Worker entry point: run one stage and time it"""
+    started = time.perf_counter()
+    try:
+        result = dict(STAGES)[name](meeting_dir, options, results)
+    except FileNotFoundError as e:
+        # A missing tool or input only skips this stage
+        result = {'skipped': str(e)}
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    return result
+
+
+class JobStore:
+    """Persistent SQLite table of post-processing jobs and their finished stages"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    meeting_dir TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    results TEXT NOT NULL DEFAULT '{}',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, created_at);
+            """)
+
+    def add(self, meeting_dir):
+        """Queue a meeting; returns False if it is already queued or done"""
+        now = time.time()
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO jobs (meeting_dir, state, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (meeting_dir, PENDING, now, now)
+            )
+            return cursor.rowcount > 0
+
+    def get(self, meeting_dir):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE meeting_dir = ?", (meeting_dir,)).fetchone()
+        if not row:
+            return None
+        job = dict(row)
+        job['results'] = json.loads(job['results'])
+        return job
+
+    def update(self, meeting_dir, **fields):
+        if 'results' in fields:
+            fields['results'] = json.dumps(fields['results'])
+        fields['updated_at'] = time.time()
+        columns = ', '.join(f"{column} = ?" for column in fields)
+        with self.lock, self.conn:
+            self.conn.execute(f"UPDATE jobs SET {columns} WHERE meeting_dir = ?",
+                              list(fields.values()) + [meeting_dir])
+
+    def next_pending(self, exclude):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT meeting_dir FROM jobs WHERE state = ? ORDER BY created_at", (PENDING,)
+            ).fetchall()
+        for row in rows:
+            if row['meeting_dir'] not in exclude:
+                return row['meeting_dir']
+        return None
+
+    def requeue_interrupted(self):
+        """Jobs left running by a crash go back to pending; their finished stages are kept"""
+        with self.lock, self.conn:
+            return self.conn.execute(
+                "UPDATE jobs SET state = ? WHERE state = ?", (PENDING, RUNNING)
+            ).rowcount
+
+    def all_results(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT results FROM jobs").fetchall()
+        return [json.loads(row['results']) for row in rows]
+
+    def counts(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT state, COUNT(*) AS jobs FROM jobs GROUP BY state").fetchall()
+        return {row['state']: row['jobs'] for row in rows}
+
+    def close(self):
+        self.conn.close()
+
+
+class PostProcessor:
+    """Background post-processing of finished meetings in a process pool
+
+    Each meeting is a job that runs the STAGES in order, one stage at a time
+    in a worker process. At most `workers` jobs run at once, and the workers
+    run at lowered priority so they don't take CPU from live recordings.
+    The job table records every finished stage and its result, so after a
+    crash or restart a job continues from the first unfinished stage. A
+    stage that fails is retried up to max_attempts times.
+
+    Finished stages are handed to a dispatcher thread, so the pool's
+    callbacks never take the lock or submit work themselves. A job whose
+    stage can't be submitted (for example after a worker died and broke
+    the pool) goes back to pending and the pool is replaced.
+    """
+
+    def __init__(self, db_path, workers=1, options=None, niceness=10, max_attempts=3):
+        self.store = JobStore(db_path)
+        self.workers = max(1, workers)
+        self.options = options or {}
+        self.niceness = niceness
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.active = set()
+        self.executor = None
+        self.worker_pids = None
+        self.completions = queue.Queue()
+        self.dispatcher = None
+        self.stopped = False
+
+    def start(self):
+        interrupted = self.store.requeue_interrupted()
+        if interrupted:
+            logger.info(f"Resuming {interrupted} interrupted post-processing jobs")
+        self.executor = self._new_executor()
+        self.dispatcher = threading.Thread(target=self._dispatch, name='postprocess-dispatch', daemon=True)
+        self.dispatcher.start()
+        self._fill()
+        return self
+
+    def _new_executor(self):
+        self.worker_pids = multiprocessing.Queue()
+        return ProcessPoolExecutor(
+            max_workers=self.workers, initializer=init_worker, initargs=(self.niceness, self.worker_pids)
+        )
+
+    def submit(self, meeting_dir):
+        """Queue a finished meeting for post-processing"""
+        meeting_dir = os.path.normpath(meeting_dir)
+        if self.store.add(meeting_dir):
+            logger.info(f"Queued {meeting_dir} for post-processing")
+        self._fill()
+
+    def is_pending(self, meeting_dir):
+        """Whether a meeting is still queued or being post-processed"""
+        job = self.store.get(os.path.normpath(meeting_dir))
+        return bool(job) and job['state'] in (PENDING, RUNNING)
+
+    def _fill(self):
+        """Start pending jobs until the concurrency limit is reached"""
+        started = []
+        with self.lock:
+            while not self.stopped and self.executor and len(self.active) < self.workers:
+                meeting_dir = self.store.next_pending(self.active)
+                if meeting_dir is None:
+                    break
+                self.active.add(meeting_dir)
+                self.store.update(meeting_dir, state=RUNNING)
+                started.append(meeting_dir)
+        # Submitted outside the lock: a stage's callback may run before submit returns
+        for meeting_dir in started:
+            self._run_next_stage(meeting_dir)
+
+    def _run_next_stage(self, meeting_dir):
+        """Submit the job's first unfinished stage, or finish the job; called without self.lock"""
+        results = self.store.get(meeting_dir)['results']
+        for name, _ in STAGES:
+            if name not in results:
+                executor = self.executor
+                try:
+                    future = executor.submit(run_stage, name, meeting_dir, self.options, results)
+                except Exception as e:
+                    self._submit_failed(meeting_dir, executor, e)
+                    return
+                future.add_done_callback(partial(self._stage_finished, meeting_dir, name))
+                return
+        self._finish(meeting_dir, results)
+
+    def _submit_failed(self, meeting_dir, executor, error):
+        """Put a job that couldn't be submitted back in the queue and replace a broken pool"""
+        self.store.update(meeting_dir, state=PENDING)
+        with self.lock:
+            self.active.discard(meeting_dir)
+            if self.stopped:
+                return
+            logger.error(f"Could not start post-processing of {meeting_dir}, restarting the worker pool: {error}")
+            # Jobs that failed on the same pool replace it only once
+            replace = executor is not None and self.executor is executor
+            if replace:
+                self.executor = self._new_executor()
+        if replace:
+            executor.shutdown(wait=False, cancel_futures=True)
+        threading.Thread(target=self._fill, daemon=True).start()
+
+    def _stage_finished(self, meeting_dir, name, future):
+        """Pool callback: hand the stage to the dispatcher thread"""
+        self.completions.put((meeting_dir, name, future))
+
+    def _dispatch(self):
+        while True:
+            item = self.completions.get()
+            if item is None:
+                return
+            try:
+                self._stage_done(*item)
+            except Exception as e:
+                logger.error(f"Error continuing post-processing of {item[0]}: {e}")
+
+    def _stage_done(self, meeting_dir, name, future):
+        if self.stopped:
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            job = self.store.get(meeting_dir)
+            attempts = job['attempts'] + 1
+            state = FAILED if attempts >= self.max_attempts else PENDING
+            logger.error(f"Post-processing stage {name} failed for {meeting_dir} "
+                         f"(attempt {attempts}/{self.max_attempts}): {e}")
+            self.store.update(meeting_dir, state=state, attempts=attempts, error=f"{name}: {e}")
+            with self.lock:
+                self.active.discard(meeting_dir)
+            self._fill()
+            return
+
+        results = self.store.get(meeting_dir)['results']
+        results[name] = result
+        self.store.update(meeting_dir, results=results)
+        logger.info(f"Post-processing {name} for {meeting_dir} took {result['seconds']:.1f}s"
+                    + (f" (skipped: {result['skipped']})" if 'skipped' in result else ""))
+        if not self.stopped:
+            self._run_next_stage(meeting_dir)
+
+    def _finish(self, meeting_dir, results):
+        """Mark a job done and start the next one"""
+        self.store.update(meeting_dir, state=DONE, error=None)
+        with self.lock:
+            self.active.discard(meeting_dir)
+        total = sum(result.get('seconds', 0) for result in results.values())
+        logger.info(f"Post-processing finished for {meeting_dir} in {total:.1f}s")
+        self._fill()
+
+    def stats(self):
+        """Job counts by state and per-stage timings over all finished stages"""
+        timings = {}
+        for results in self.store.all_results():
+            for name, result in results.items():
+                if 'skipped' not in result:
+                    timings.setdefault(name, []).append(result['seconds'])
+        stages = {}
+        for name, seconds in timings.items():
+            seconds.sort()
+            stages[name] = {
+                'count': len(seconds),
+                'mean_seconds': round(sum(seconds) / len(seconds), 3),
+                'median_seconds': seconds[len(seconds) // 2],
+                'max_seconds': seconds[-1]
+            }
+        return {'jobs': self.store.counts(), 'active': len(self.active), 'stages': stages}
+
+    def stop(self):
+        """Stop taking new stages; unfinished jobs resume on the next start"""
+        with self.lock:
+            self.stopped = True
+            executor, self.executor = self.executor, None
+        self.completions.put(None)
+        if executor:
+            # Stage outputs are written atomically, so a stage cut short is simply run again
+            self._terminate_workers()
+            executor.shutdown(wait=False, cancel_futures=True)
+        logger.info(f"Post-processing stopped: {self.stats()}")
+        self.store.close()
+
+    def _terminate_workers(self):
+        """End the pool's worker processes and the ffmpeg runs they started"""
+        pids = set()
+        while True:
+            try:
+                pids.add(self.worker_pids.get_nowait())
+            except queue.Empty:
+                break
+        for pid in pids:
+            try:
+                worker = psutil.Process(pid)
+                for child in worker.children(recursive=True):
+                    child.terminate()
+                worker.terminate()
+            except psutil.NoSuchProcess:
+                pass
+            except Exception as e:
+                logger.error(f"Error stopping post-processing worker {pid}: {e}")
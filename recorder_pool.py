@@ -0,0 +1,407 @@
+import os
+import time
+import shutil
+import logging
+import threading
+import psutil
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SLOTS_BUSY = metrics.gauge('meet_notes_recorder_slots_busy', 'Recorder slots recording a meeting')
+BROWSER_RSS = metrics.gauge('meet_notes_browser_rss_bytes', 'Resident memory of a busy slot\'s browser processes',
+                            ['slot'])
+BROWSER_CPU = metrics.gauge('meet_notes_browser_cpu_seconds', 'CPU time of a busy slot\'s browser this meeting',
+                            ['slot'])
+RECORDER_CPU = metrics.gauge('meet_notes_recorder_cpu_seconds', 'CPU time of a busy slot\'s recorder threads',
+                             ['slot'])
+
+# Chrome refuses to open a profile that another instance holds; these files
+# are per-instance state and caches that need not be copied
+PROFILE_COPY_IGNORE = shutil.ignore_patterns(
+    'SingletonLock', 'SingletonCookie', 'SingletonSocket', 'lockfile', '*.lock',
+    'Cache', 'Code Cache', 'GPUCache', 'ShaderCache', 'GrShaderCache', 'Crashpad'
+)
+
+
+def copy_profile(source, destination):
+    """Copy the logged-in Chrome profile for one slot, once"""
+    if os.path.exists(destination):
+        return destination
+    if not os.path.exists(source):
+        os.makedirs(destination, exist_ok=True)
+        return destination
+    started = time.monotonic()
+    shutil.copytree(source, destination, ignore=PROFILE_COPY_IGNORE)
+    logger.info(f"Copied Chrome profile to {destination} in {time.monotonic() - started:.1f}s")
+    return destination
+
+
+def process_tree(pids):
+    """psutil processes for the given pids and all their children"""
+    processes = {}
+    for pid in pids:
+        if not pid:
+            continue
+        try:
+            root = psutil.Process(pid)
+            for process in [root] + root.children(recursive=True):
+                processes[process.pid] = process
+        except psutil.Error:
+            continue
+    return list(processes.values())
+
+
+class RecorderSlot:
+    """One recording worker: its own browser profile, recorder and resource usage"""
+
+    def __init__(self, index, profile_path):
+        self.index = index
+        self.profile_path = profile_path
+        self.recorder = None
+        self.meeting = None
+        self.thread = None
+        self.started_at = None
+        self.usage = {}
+        self.warm_thread = None
+        self.sessions = 0
+
+    @property
+    def busy(self):
+        return self.meeting is not None
+
+    def begin(self, meeting):
+        self.meeting = meeting
+        self.started_at = time.monotonic()
+        self.usage = {
+            'slot': self.index,
+            'samples': 0,
+            'browser_cpu_seconds': 0.0,
+            'browser_rss_mb': 0.0,
+            'browser_peak_rss_mb': 0.0,
+            'recorder_cpu_seconds': 0.0
+        }
+        self._cpu_base = None
+
+    def recorder_threads(self):
+        recorder = self.recorder
+        threads = [self.thread]
+        if recorder:
+            threads += [getattr(recorder, name, None) for name in ('screen_thread', 'audio_thread', 'caption_thread')]
+            encoder = getattr(recorder, 'video_encoder', None)
+            if encoder and not encoder.use_process:
+                threads.append(encoder.worker)
+        return [thread for thread in threads if thread is not None and thread.native_id]
+
+    def browser_pids(self):
+        driver = getattr(self.recorder, 'driver', None)
+        if driver is None:
+            return []
+        pids = [getattr(driver, 'browser_pid', None)]
+        service = getattr(driver, 'service', None)
+        process = getattr(service, 'process', None)
+        if process is not None:
+            pids.append(process.pid)
+        encoder = getattr(self.recorder, 'video_encoder', None)
+        if encoder and encoder.use_process and encoder.worker:
+            pids.append(encoder.worker.pid)
+        return pids
+
+    def sample(self, own_threads):
+        """Add one CPU/memory sample for the slot's browser processes and recorder threads"""
+        cpu = 0.0
+        rss = 0
+        for process in process_tree(self.browser_pids()):
+            try:
+                times = process.cpu_times()
+                cpu += times.user + times.system
+                rss += process.memory_info().rss
+            except psutil.Error:
+                continue
+
+        # Browser CPU is counted from the slot's first sample, so a reused process is not overcharged
+        if self._cpu_base is None:
+            self._cpu_base = cpu
+        native_ids = {thread.native_id for thread in self.recorder_threads()}
+        thread_cpu = sum(user + system for thread_id, user, system in own_threads if thread_id in native_ids)
+
+        usage = self.usage
+        usage['samples'] += 1
+        usage['browser_cpu_seconds'] = round(max(cpu - self._cpu_base, usage['browser_cpu_seconds']), 2)
+        usage['browser_rss_mb'] = round(rss / 2 ** 20, 1)
+        usage['browser_peak_rss_mb'] = max(usage['browser_peak_rss_mb'], usage['browser_rss_mb'])
+        usage['recorder_cpu_seconds'] = round(max(thread_cpu, usage['recorder_cpu_seconds']), 2)
+        usage['elapsed_seconds'] = round(time.monotonic() - self.started_at, 1)
+
+        # Recorded in the meeting's metadata.json when the recording stops
+        metadata = getattr(self.recorder, 'metadata', None)
+        if metadata is not None:
+            metadata['resources'] = dict(usage)
+
+    def end(self):
+        self.meeting = None
+        self.thread = None
+
+    def warm(self):
+        """Whether the slot holds an idle, already launched browser"""
+        return not self.busy and self.recorder is not None and not self.warming()
+
+    def warming(self):
+        return self.warm_thread is not None and self.warm_thread.is_alive()
+
+
+class RecorderPool:
+    """Fixed set of recorder slots so overlapping meetings are recorded side by side
+
+    Each slot records with its own copy of the Chrome profile and its own
+    capture and encode pipeline. A meeting is admitted only when a slot is
+    free and the machine has CPU and memory to spare; a background monitor
+    samples every busy slot's browser processes and recorder threads.
+
+    Browsers outlive meetings: after a recording the slot keeps its signed-in
+    browser parked on a blank page for the next meeting, and prewarm()
+    launches one ahead of a scheduled join. A browser is recycled after
+    max_sessions meetings or when it stops responding.
+    """
+
+    def __init__(self, recorder_factory, size=2, profile_source=None, profile_dir='chrome_profiles',
+                 min_free_memory_mb=1500, max_cpu_percent=85, sample_seconds=10, max_sessions=5,
+                 on_finished=None):
+        self.recorder_factory = recorder_factory
+        self.on_finished = on_finished
+        self.profile_source = profile_source
+        self.min_free_memory_mb = min_free_memory_mb
+        self.max_cpu_percent = max_cpu_percent
+        self.sample_seconds = sample_seconds
+        self.max_sessions = max_sessions
+        self.slots = [
+            RecorderSlot(index, os.path.join(profile_dir, f"slot_{index}"))
+            for index in range(size)
+        ]
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.monitor = None
+        self.join_times = []
+        metrics.REGISTRY.add_collector(self.collect_metrics)
+
+    def is_recording(self, meeting_id):
+        return any(slot.meeting and slot.meeting['id'] == meeting_id for slot in self.slots)
+
+    def active_meetings(self):
+        return [slot.meeting for slot in self.slots if slot.busy]
+
+    def recording_dirs(self):
+        """Directories of the meetings being recorded right now"""
+        return {os.path.normpath(slot.recorder.meeting_dir) for slot in self.slots
+                if slot.busy and slot.recorder is not None and slot.recorder.meeting_dir}
+
+    def admission_check(self):
+        """Return None if another meeting can start, otherwise the reason it cannot"""
+        available_mb = psutil.virtual_memory().available / 2 ** 20
+        if available_mb < self.min_free_memory_mb:
+            return f"only {available_mb:.0f} MB memory available"
+        cpu = psutil.cpu_percent(interval=0.2)
+        if cpu > self.max_cpu_percent:
+            return f"CPU at {cpu:.0f}%"
+        return None
+
+    def launch(self, slot):
+        """Start a signed-in browser for a slot"""
+        started = time.monotonic()
+        if self.profile_source:
+            copy_profile(self.profile_source, slot.profile_path)
+        slot.recorder = self.recorder_factory(slot.profile_path)
+        slot.recorder.slot = slot.index
+        slot.sessions = 0
+        logger.info(f"Launched browser for slot {slot.index} in {time.monotonic() - started:.1f}s")
+
+    def prewarm(self):
+        """Launch a standby browser in the background unless one is already warm or warming"""
+        with self.lock:
+            if self.stopped.is_set() or any(slot.warm() or slot.warming() for slot in self.slots):
+                return False
+            slot = next((slot for slot in self.slots if not slot.busy and slot.recorder is None), None)
+            if slot is None:
+                return False
+            available_mb = psutil.virtual_memory().available / 2 ** 20
+            if available_mb < self.min_free_memory_mb:
+                logger.info(f"Not warming a browser: only {available_mb:.0f} MB memory available")
+                return False
+            slot.warm_thread = threading.Thread(
+                target=self._warm, args=(slot,), name=f"recorder-warm-{slot.index}", daemon=True
+            )
+            slot.warm_thread.start()
+            return True
+
+    def _warm(self, slot):
+        try:
+            self.launch(slot)
+        except Exception as e:
+            logger.error(f"Error warming browser for slot {slot.index}: {e}")
+            slot.recorder = None
+
+    def acquire(self, meeting):
+        """Reserve a free slot for a meeting, or return None with the reason
+
+        Slots with a warm browser are preferred, then one whose browser is
+        still starting, then an empty one.
+        """
+        with self.lock:
+            free = [slot for slot in self.slots if not slot.busy]
+            if not free:
+                return None, f"all {len(self.slots)} recorder slots busy"
+            reason = self.admission_check()
+            if reason:
+                return None, reason
+            slot = min(free, key=lambda slot: 0 if slot.warm() else 1 if slot.warming() else 2)
+            slot.begin(meeting)
+        if slot.warming():
+            slot.warm_thread.join()
+        return slot, None
+
+    def start(self, meeting, latency=0.0):
+        """Join and record a meeting in a free slot
+
+        latency is how late the join was called relative to its scheduled
+        moment; it is included in the reported time to join. Returns
+        (True, None) when recording started, (False, reason) when the meeting
+        was not admitted, and (False, None) when joining failed.
+        """
+        started = time.monotonic()
+        slot, reason = self.acquire(meeting)
+        if slot is None:
+            logger.warning(f"Not admitting meeting {meeting['summary']}: {reason}")
+            return False, reason
+
+        try:
+            warm = slot.recorder is not None
+            if not warm:
+                self.launch(slot)
+            browser_ready = time.monotonic() - started
+            if not slot.recorder.join_meeting(meeting['meet_link']):
+                self._release(slot)
+                return False, None
+        except Exception as e:
+            logger.error(f"Error starting recorder slot {slot.index}: {e}")
+            self._release(slot)
+            return False, None
+
+        joined = time.monotonic() - started
+        slot.recorder.join_stats = {
+            'warm_browser': warm,
+            'scheduler_latency_seconds': round(latency, 3),
+            'browser_ready_seconds': round(browser_ready, 3),
+            'join_seconds': round(joined - browser_ready, 3),
+            'time_to_join_seconds': round(latency + joined, 3)
+        }
+        self.join_times.append(latency + joined)
+        logger.info(f"Joined {meeting['summary']} {latency + joined:.1f}s after its join time "
+                    f"({'warm' if warm else 'cold'} browser: ready in {browser_ready:.1f}s, "
+                    f"join took {joined - browser_ready:.1f}s)")
+
+        slot.thread = threading.Thread(
+            target=self._record, args=(slot,), name=f"recorder-slot-{slot.index}", daemon=True
+        )
+        slot.thread.start()
+        self._start_monitor()
+        logger.info(f"Recording {meeting['summary']} in slot {slot.index} "
+                    f"({len(self.active_meetings())}/{len(self.slots)} slots busy)")
+        return True, None
+
+    def _record(self, slot):
+        recorder = slot.recorder
+        recorder.meeting_dir = None
+        recorder.record_video = slot.meeting.get('record_video', True)
+        try:
+            recorder.start_recording(slot.meeting['id'])
+        except Exception as e:
+            logger.error(f"Error recording in slot {slot.index}: {e}")
+        finally:
+            logger.info(f"Slot {slot.index} finished {slot.meeting['summary']}: {slot.usage}")
+            meeting_dir = recorder.meeting_dir
+            self._release(slot)
+            if meeting_dir and self.on_finished:
+                try:
+                    self.on_finished(meeting_dir)
+                except Exception as e:
+                    logger.error(f"Error handing off {meeting_dir}: {e}")
+
+    def _release(self, slot):
+        """Keep the slot's browser for the next meeting, or close it if it is worn out"""
+        recorder = slot.recorder
+        if recorder is not None:
+            slot.sessions += 1
+            if self.stopped.is_set() or slot.sessions >= self.max_sessions or not recorder.reset_session():
+                logger.info(f"Recycling browser for slot {slot.index} after {slot.sessions} sessions")
+                recorder.close_browser()
+                slot.recorder = None
+        with self.lock:
+            slot.end()
+
+    def stop(self, meeting_id):
+        """Ask a slot to leave its meeting; the slot's thread finishes and closes the recording"""
+        for slot in self.slots:
+            if slot.meeting and slot.meeting['id'] == meeting_id and slot.recorder:
+                logger.info(f"Leaving {slot.meeting['summary']} in slot {slot.index}")
+                slot.recorder.recording = False
+                return True
+        return False
+
+    def stop_all(self, timeout=60):
+        """Leave every meeting, wait for the slots to finish and close all browsers"""
+        self.stopped.set()
+        for meeting in self.active_meetings():
+            self.stop(meeting['id'])
+        for slot in self.slots:
+            for thread in (slot.thread, slot.warm_thread):
+                if thread is not None:
+                    thread.join(timeout=timeout)
+            if slot.recorder is not None:
+                slot.recorder.close_browser()
+                slot.recorder = None
+        if self.join_times:
+            times = sorted(self.join_times)
+            logger.info(f"Time to join over {len(times)} meetings: median {times[len(times) // 2]:.1f}s, "
+                        f"max {times[-1]:.1f}s")
+
+    def _start_monitor(self):
+        with self.lock:
+            if self.monitor is not None and self.monitor.is_alive():
+                return
+            self.monitor = threading.Thread(target=self._monitor, name='recorder-pool-monitor', daemon=True)
+            self.monitor.start()
+
+    def _monitor(self):
+        """Sample busy slots until none are left"""
+        process = psutil.Process()
+        while not self.stopped.is_set():
+            busy = [slot for slot in self.slots if slot.busy]
+            if not busy:
+                return
+            try:
+                own_threads = process.threads()
+            except psutil.Error:
+                own_threads = []
+            for slot in busy:
+                try:
+                    slot.sample(own_threads)
+                except Exception as e:
+                    logger.error(f"Error sampling recorder slot {slot.index}: {e}")
+            self.stopped.wait(self.sample_seconds)
+
+    def collect_metrics(self):
+        """Publish the monitor's latest per-slot samples as gauges"""
+        SLOTS_BUSY.set(len(self.active_meetings()))
+        for slot in self.slots:
+            usage = slot.usage
+            if slot.busy and usage.get('samples'):
+                BROWSER_RSS.set(usage['browser_rss_mb'] * 2 ** 20, slot=slot.index)
+                BROWSER_CPU.set(usage['browser_cpu_seconds'], slot=slot.index)
+                RECORDER_CPU.set(usage['recorder_cpu_seconds'], slot=slot.index)
+            else:
+                for gauge in (BROWSER_RSS, BROWSER_CPU, RECORDER_CPU):
+                    gauge.remove(slot=slot.index)
+
+    def stats(self):
+        """Current resource usage of every busy slot"""
+        return [dict(slot.usage, meeting=slot.meeting['summary']) for slot in self.slots if slot.busy]
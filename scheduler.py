@@ -0,0 +1,196 @@
+import heapq
+import logging
+import itertools
+import threading
+from datetime import datetime, timedelta
+import pytz
+
+logger = logging.getLogger(__name__)
+
+WARM = 'warm'
+JOIN = 'join'
+LEAVE = 'leave'
+REFRESH = 'refresh'
+
+
+def parse_time(value):
+    """Parse a Calendar API dateTime string into an aware UTC datetime"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = pytz.UTC.localize(parsed)
+    return parsed.astimezone(pytz.UTC)
+
+
+class SystemClock:
+    """Wall clock used by the scheduler"""
+
+    def now(self):
+        return datetime.now(pytz.UTC)
+
+    def wait(self, event, seconds):
+        """Sleep for up to seconds, returning early if event is set"""
+        event.wait(max(seconds, 0))
+
+
+class ManualClock:
+    """Clock that only moves when told to, for driving the scheduler in tests and dry runs"""
+
+    def __init__(self, start):
+        self.current = start
+
+    def now(self):
+        return self.current
+
+    def advance(self, seconds):
+        self.current += timedelta(seconds=seconds)
+
+    def wait(self, event, seconds):
+        if not event.is_set():
+            self.advance(max(seconds, 0))
+
+
+class MeetingScheduler:
+    """Event-driven scheduler for joining and leaving meetings
+
+    Join, leave and calendar-refresh actions are kept in a heap ordered by
+    due time, and the run loop sleeps exactly until the next one. With an
+    on_warm callback, each join is preceded by a warm-up action (e.g. to
+    launch a browser) warm_lead_seconds earlier. Refreshes
+    happen often when a meeting is close and rarely when the calendar is
+    empty. A meeting that moves gets new actions; the stale ones are skipped
+    when they come due. Cancelling a meeting that was already joined leaves
+    it right away.
+    """
+
+    def __init__(self, fetch_meetings, on_join, on_leave, clock=None,
+                 join_lead_minutes=5, min_refresh_seconds=60, max_refresh_seconds=900,
+                 on_warm=None, warm_lead_seconds=90):
+        self.fetch_meetings = fetch_meetings
+        self.on_join = on_join
+        self.on_leave = on_leave
+        self.on_warm = on_warm
+        self.warm_lead = timedelta(seconds=warm_lead_seconds)
+        self.clock = clock or SystemClock()
+        self.join_lead = timedelta(minutes=join_lead_minutes)
+        self.min_refresh = min_refresh_seconds
+        self.max_refresh = max_refresh_seconds
+        self.heap = []
+        self.counter = itertools.count()
+        self.versions = {}  # meeting id -> (start, end) of its scheduled actions
+        self.joined = {}  # meeting id -> meeting, between its join and leave
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.refreshes = 0
+
+    def schedule(self, when, action, meeting=None):
+        with self.lock:
+            heapq.heappush(self.heap, (when, next(self.counter), action, meeting))
+        self.wakeup.set()
+
+    def update_meeting(self, meeting):
+        """Schedule join and leave actions for a new or moved meeting"""
+        start = parse_time(meeting['start'])
+        end = parse_time(meeting['end'])
+        if self.versions.get(meeting['id']) == (start, end):
+            return False
+        moved = meeting['id'] in self.versions
+        self.versions[meeting['id']] = (start, end)
+        meeting = dict(meeting, start_time=start, end_time=end)
+        if self.on_warm:
+            self.schedule(start - self.join_lead - self.warm_lead, WARM, meeting)
+        self.schedule(start - self.join_lead, JOIN, meeting)
+        self.schedule(end, LEAVE, meeting)
+        logger.info(f"{'Rescheduled' if moved else 'Scheduled'} meeting {meeting['summary']}: "
+                    f"join at {start - self.join_lead}, leave at {end}")
+        return True
+
+    def cancel_meeting(self, meeting_id):
+        """Drop a meeting's pending actions (they are skipped when they come due), leaving it if joined"""
+        if self.versions.pop(meeting_id, None):
+            logger.info(f"Cancelled scheduled meeting {meeting_id}")
+            self.wakeup.set()
+        meeting = self.joined.pop(meeting_id, None)
+        if meeting:
+            logger.info(f"Leaving cancelled meeting {meeting['summary']}")
+            self.on_leave(meeting)
+
+    def next_refresh_delay(self):
+        """Refresh at half the time to the next join, within the configured bounds"""
+        now = self.clock.now()
+        with self.lock:
+            joins = [when for when, _, action, meeting in self.heap
+                     if action == JOIN and self._is_current(meeting) and when > now]
+        if not joins:
+            return self.max_refresh
+        until_join = (min(joins) - now).total_seconds()
+        return min(max(until_join / 2, self.min_refresh), self.max_refresh)
+
+    def refresh(self):
+        """Fetch upcoming meetings and reschedule anything that changed"""
+        self.refreshes += 1
+        try:
+            for meeting in self.fetch_meetings():
+                self.update_meeting(meeting)
+        except Exception as e:
+            logger.error(f"Error refreshing calendar: {e}")
+        delay = self.next_refresh_delay()
+        logger.info(f"Next calendar refresh in {delay:.0f}s")
+        self.schedule(self.clock.now() + timedelta(seconds=delay), REFRESH)
+
+    def _is_current(self, meeting):
+        version = self.versions.get(meeting['id'])
+        return version == (meeting['start_time'], meeting['end_time'])
+
+    def _run_action(self, when, action, meeting):
+        if action == REFRESH:
+            self.refresh()
+            return
+        if not self._is_current(meeting):
+            return
+
+        now = self.clock.now()
+        if action == WARM:
+            if now < meeting['start_time'] - self.join_lead:
+                self.on_warm(meeting)
+        elif action == JOIN:
+            if now > meeting['end_time']:
+                return
+            latency = (now - when).total_seconds()
+            logger.info(f"Joining meeting {meeting['summary']} {latency:.2f}s after the join target")
+            self.joined[meeting['id']] = meeting
+            self.on_join(meeting, latency)
+        elif action == LEAVE:
+            self.versions.pop(meeting['id'], None)
+            self.joined.pop(meeting['id'], None)
+            self.on_leave(meeting)
+
+    def run_pending(self):
+        """Run every action that is due and return the seconds until the next one"""
+        while True:
+            now = self.clock.now()
+            with self.lock:
+                if not self.heap:
+                    return self.max_refresh
+                when = self.heap[0][0]
+                if when > now:
+                    return (when - now).total_seconds()
+                when, _, action, meeting = heapq.heappop(self.heap)
+            try:
+                self._run_action(when, action, meeting)
+            except Exception as e:
+                logger.error(f"Error running scheduled {action}: {e}")
+
+    def run(self):
+        """Run the scheduler until stop() is called"""
+        self.running = True
+        self.schedule(self.clock.now(), REFRESH)
+        while self.running:
+            self.wakeup.clear()
+            delay = self.run_pending()
+            if self.running:
+                self.clock.wait(self.wakeup, delay)
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
@@ -0,0 +1,210 @@
+import time
+import logging
+import cv2
+import numpy as np
+import mss
+
+logger = logging.getLogger(__name__)
+
+# Recording modes: which region to capture, whether to scale it to
+# RECORDING_OUTPUT_SIZE, and whether to keep colour
+RECORDING_MODES = {
+    'fullscreen': {'region': 'screen', 'scaled': False, 'grayscale': False},
+    'meet_tab': {'region': 'meet_tab', 'scaled': False, 'grayscale': False},
+    'scaled': {'region': 'screen', 'scaled': True, 'grayscale': False},
+    'slides': {'region': 'meet_tab', 'scaled': True, 'grayscale': True}
+}
+
+
+def even_size(width, height):
+    """Round dimensions down to even numbers, as the video codecs require"""
+    return max(width - width % 2, 2), max(height - height % 2, 2)
+
+
+def open_mss(display=None):
+    """mss grabber for the desktop, or for an X display such as ':99'"""
+    return mss.mss(display=display) if display else mss.mss()
+
+
+def primary_monitor(display=None):
+    """Get the primary monitor region as (left, top, width, height)"""
+    with open_mss(display) as sct:
+        monitor = sct.monitors[1]
+        return monitor['left'], monitor['top'], monitor['width'], monitor['height']
+
+
+def clip_region(region, bounds):
+    """Clip a (left, top, width, height) region to the given bounds"""
+    left, top, width, height = region
+    b_left, b_top, b_width, b_height = bounds
+    right = min(left + width, b_left + b_width)
+    bottom = min(top + height, b_top + b_height)
+    left = max(left, b_left)
+    top = max(top, b_top)
+    if right <= left or bottom <= top:
+        return None
+    width, height = even_size(right - left, bottom - top)
+    return left, top, width, height
+
+
+class FrameConverter:
+    """Convert captured BGRA (or BGR) frames into the encoder's format in preallocated buffers
+
+    Frames are downscaled first and converted to BGR or grayscale
+    afterwards, so the colour conversion only touches output pixels.
+    """
+
+    def __init__(self, source_size, output_size=None, grayscale=False, channels=4):
+        self.source_size = source_size
+        self.output_size = output_size or source_size
+        self.grayscale = grayscale
+        if channels == 4:
+            self.code = cv2.COLOR_BGRA2GRAY if grayscale else cv2.COLOR_BGRA2BGR
+        else:
+            self.code = cv2.COLOR_BGR2GRAY if grayscale else None
+        self.resized = None
+        if self.output_size != self.source_size and self.code is not None:
+            width, height = self.output_size
+            self.resized = np.empty((height, width, channels), dtype=np.uint8)
+
+    def convert(self, frame, dst):
+        """Convert a frame into dst"""
+        if self.code is None:
+            # BGR in, BGR out: at most a resize straight into the slot
+            if self.output_size != self.source_size:
+                cv2.resize(frame, self.output_size, dst=dst, interpolation=cv2.INTER_AREA)
+            else:
+                np.copyto(dst, frame)
+            return
+        if self.resized is not None:
+            cv2.resize(frame, self.output_size, dst=self.resized, interpolation=cv2.INTER_AREA)
+            frame = self.resized
+        cv2.cvtColor(frame, self.code, dst=dst)
+
+
+class ChangeDetector:
+    """Detect content changes between frames with a block-wise mean absolute difference
+
+    Frames are subsampled to a small grid of a single channel and split into
+    blocks; a frame counts as changed when any block's mean absolute
+    difference from the last accepted frame exceeds the threshold.
+    """
+
+    def __init__(self, threshold=3.0, step=4, block=16):
+        self.threshold = threshold
+        self.step = step
+        self.block = block
+        self.reference = None
+        self.candidate = None
+
+    def changed(self, frame):
+        """Check whether a frame differs from the last accepted one"""
+        sample = frame[::self.step, ::self.step, 1]
+        rows = sample.shape[0] - sample.shape[0] % self.block
+        cols = sample.shape[1] - sample.shape[1] % self.block
+        self.candidate = sample[:rows, :cols].astype(np.int16)
+        if self.reference is None or self.reference.shape != self.candidate.shape:
+            return True
+        diff = np.abs(self.candidate - self.reference)
+        blocks = diff.reshape(rows // self.block, self.block, cols // self.block, self.block)
+        return bool(blocks.mean(axis=(1, 3)).max() > self.threshold)
+
+    def accept(self):
+        """Make the last checked frame the reference for future comparisons"""
+        self.reference = self.candidate
+
+
+class MssFrameSource:
+    """Screen grabber that exposes mss buffers as BGRA arrays without copying"""
+
+    channels = 4
+
+    def __init__(self, left, top, width, height, display=None):
+        self.monitor = {'left': left, 'top': top, 'width': width, 'height': height}
+        self.size = (width, height)
+        self.display = display
+        self.sct = None
+
+    def open(self):
+        """Open the grabber (mss handles are per-thread, so call this from the capture thread)"""
+        self.sct = open_mss(self.display)
+
+    def has_new_frame(self):
+        """The screen has to be grabbed to know whether it changed"""
+        return True
+
+    def grab(self):
+        """Grab one frame as a (height, width, 4) BGRA view over the mss buffer"""
+        shot = self.sct.grab(self.monitor)
+        return np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+
+    def close(self):
+        if self.sct:
+            self.sct.close()
+            self.sct = None
+
+
+class FramePacer:
+    """Keep the number of written frames in step with a monotonic clock
+
+    Each captured frame is written as many times as needed to reach the frame
+    count the wall clock calls for: zero times if capture ran ahead (dropped),
+    more than once if capture fell behind (duplicated). When the source has
+    nothing new, fill() repeats the previous frame without counting a capture.
+    """
+
+    def __init__(self, fps):
+        self.fps = float(fps)
+        self.interval = 1.0 / self.fps
+        self.start_time = None
+        self.captured = 0
+        self.written = 0
+        self.duplicated = 0
+        self.dropped = 0
+        self.repeated = 0
+
+    def start(self):
+        self.start_time = time.monotonic()
+
+    def elapsed(self):
+        return time.monotonic() - self.start_time if self.start_time else 0.0
+
+    def wait(self):
+        """Sleep until the next frame slot is due"""
+        next_slot = self.start_time + self.written * self.interval
+        delay = next_slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def due(self):
+        """Register a captured frame and return how many times it should be written"""
+        self.captured += 1
+        target = int(self.elapsed() * self.fps) + 1
+        repeat = max(target - self.written, 0)
+        if repeat == 0:
+            self.dropped += 1
+        elif repeat > 1:
+            self.duplicated += repeat - 1
+        self.written += repeat
+        return repeat
+
+    def fill(self):
+        """Return how many times to repeat the previous frame to catch up with the clock"""
+        repeat = max(int(self.elapsed() * self.fps) + 1 - self.written, 0)
+        self.repeated += repeat
+        self.written += repeat
+        return repeat
+
+    def stats(self):
+        """Summarize declared vs achieved frame rates"""
+        elapsed = self.elapsed()
+        return {
+            'declared_fps': self.fps,
+            'achieved_fps': round(self.captured / elapsed, 2) if elapsed else 0.0,
+            'duration_seconds': round(elapsed, 2),
+            'frames_captured': self.captured,
+            'frames_written': self.written,
+            'frames_duplicated': self.duplicated,
+            'frames_repeated': self.repeated,
+            'frames_dropped': self.dropped
+        }
@@ -0,0 +1,149 @@
+import json
+import base64
+import logging
+import threading
+import urllib.request
+import cv2
+import numpy as np
+import websocket
+
+logger = logging.getLogger(__name__)
+
+
+def find_page_target(debugger_address, url_prefix='https://meet.google.com'):
+    """DevTools websocket URL of the browser tab showing url_prefix (or the first tab)"""
+    with urllib.request.urlopen(f"http://{debugger_address}/json/list", timeout=5) as response:
+        targets = [target for target in json.load(response) if target.get('type') == 'page']
+    if not targets:
+        raise RuntimeError(f"No page targets at {debugger_address}")
+    for target in targets:
+        if target.get('url', '').startswith(url_prefix):
+            return target['webSocketDebuggerUrl']
+    return targets[0]['webSocketDebuggerUrl']
+
+
+class ScreencastFrameSource:
+    """Frames from Chrome's DevTools Page.startScreencast stream
+
+    Chrome only sends a frame when the page repaints, already JPEG-encoded.
+    Frames are acknowledged as they arrive and only the newest is kept; it
+    is decoded when grab() is called, so a still page costs nothing and
+    frames replaced before the next grab are never decoded. Frames are BGR
+    (3 channels) at size, the page viewport in device pixels.
+
+    The source talks to the tab's DevTools websocket itself rather than
+    through the driver's CDP event listener, which polls the performance log
+    about once a second and would hold the ack-paced stream to ~1 fps.
+    """
+
+    channels = 3
+
+    def __init__(self, debugger_address, size, quality=80):
+        self.debugger_address = debugger_address
+        self.size = size
+        self.quality = quality
+        self.ws = None
+        self.thread = None
+        self.running = False
+        self.lock = threading.Lock()
+        self.message_id = 0
+        width, height = size
+        self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+        self.latest = None
+        self.latest_seq = 0
+        self.decoded_seq = -1
+        self.frames_received = 0
+        self.frames_decoded = 0
+        self.decode_errors = 0
+
+    def _send(self, method, params=None):
+        with self.lock:
+            self.message_id += 1
+            message = {'id': self.message_id, 'method': method, 'params': params or {}}
+        self.ws.send(json.dumps(message))
+
+    def open(self):
+        url = find_page_target(self.debugger_address)
+        # Chrome rejects DevTools connections that send an Origin header it doesn't allow
+        self.ws = websocket.create_connection(url, suppress_origin=True, timeout=5)
+        self.ws.settimeout(1)
+        self.running = True
+        self.thread = threading.Thread(target=self._read_loop, name='screencast-reader', daemon=True)
+        self.thread.start()
+        width, height = self.size
+        self._send('Page.startScreencast', {
+            'format': 'jpeg',
+            'quality': self.quality,
+            'maxWidth': width,
+            'maxHeight': height,
+            'everyNthFrame': 1
+        })
+        logger.info(f"Started DevTools screencast ({width}x{height}, JPEG quality {self.quality})")
+
+    def _read_loop(self):
+        while self.running:
+            try:
+                message = json.loads(self.ws.recv())
+            except websocket.WebSocketTimeoutException:
+                continue
+            except Exception as e:
+                if self.running:
+                    logger.error(f"Screencast connection lost: {e}")
+                break
+            if message.get('method') != 'Page.screencastFrame':
+                continue
+            params = message['params']
+            with self.lock:
+                self.latest = params['data']
+                self.latest_seq += 1
+                self.frames_received += 1
+            # Chrome sends the next frame only after this one is acknowledged
+            try:
+                self._send('Page.screencastFrameAck', {'sessionId': params['sessionId']})
+            except Exception as e:
+                logger.error(f"Error acknowledging screencast frame: {e}")
+
+    def has_new_frame(self):
+        """Whether a frame arrived since the last grab"""
+        with self.lock:
+            return self.latest_seq != self.decoded_seq
+
+    def grab(self):
+        """Decode the newest frame if there is one, otherwise return the previous frame"""
+        with self.lock:
+            data, seq = self.latest, self.latest_seq
+        if seq == self.decoded_seq or data is None:
+            self.decoded_seq = seq
+            return self.frame
+        self.decoded_seq = seq
+        image = cv2.imdecode(np.frombuffer(base64.b64decode(data), dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            self.decode_errors += 1
+            return self.frame
+        self.frames_decoded += 1
+        if image.shape[1] != self.size[0] or image.shape[0] != self.size[1]:
+            cv2.resize(image, self.size, dst=self.frame, interpolation=cv2.INTER_AREA)
+        else:
+            self.frame = image
+        return self.frame
+
+    def close(self):
+        self.running = False
+        if self.ws:
+            try:
+                self._send('Page.stopScreencast')
+            except Exception:
+                pass
+            if self.thread:
+                self.thread.join(timeout=5)
+            self.ws.close()
+            self.ws = None
+        logger.info(f"Screencast finished: {self.frames_received} frames received, "
+                    f"{self.frames_decoded} decoded")
+
+    def stats(self):
+        return {
+            'screencast_frames_received': self.frames_received,
+            'screencast_frames_decoded': self.frames_decoded,
+            'screencast_decode_errors': self.decode_errors
+        }
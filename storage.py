@@ -0,0 +1,329 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from manifest import RecordingManifest
+
+logger = logging.getLogger(__name__)
+
+HOT = 'hot'
+COLD = 'cold'
+FULL = 'full'
+AUDIO_ONLY = 'audio_only'
+
+# Everything that only matters for watching the recording; audio, captions,
+# transcripts, thumbnails and metadata are kept when a meeting is downgraded
+VIDEO_PATHS = ('video', 'meeting.mp4', 'screen_recording.avi', 'muxed.mkv', 'audio_track.flac', 'keyframes.json')
+
+# Stored audio size relative to 16-bit PCM
+AUDIO_COMPRESSION = {'wav': 1.0, 'flac': 0.6, 'opus': 0.06}
+
+
+def estimated_byte_rates(video_kbps, audio_rate, audio_channels, audio_format):
+    """Video and audio bytes per second expected from the recording settings"""
+    audio = audio_rate * audio_channels * 2 * AUDIO_COMPRESSION.get(audio_format, 1.0)
+    return video_kbps * 1000 / 8, audio
+
+
+def path_bytes(path):
+    """Total size of a file or directory tree"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def meeting_started(meeting_dir):
+    """Start time of a '<meeting_id>_<YYYYmmdd>_<HHMMSS>' directory as a timestamp"""
+    name = os.path.basename(os.path.normpath(meeting_dir))
+    try:
+        return datetime.strptime('_'.join(name.rsplit('_', 2)[-2:]), '%Y%m%d_%H%M%S').timestamp()
+    except ValueError:
+        return os.path.getmtime(meeting_dir)
+
+
+def meeting_duration(meeting_dir):
+    """Recorded length in seconds from metadata.json, or None"""
+    path = os.path.join(meeting_dir, 'metadata.json')
+    try:
+        with open(path, encoding='utf-8') as f:
+            metadata = json.load(f)
+        started = datetime.fromisoformat(metadata['started_at'])
+        ended = datetime.fromisoformat(metadata['ended_at'])
+        return (ended - started).total_seconds()
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+class StorageManager:
+    """Disk budget for recordings: size index, retention, downgrades and a cold tier
+
+    A small SQLite index keeps the size of every meeting directory, split
+    into video and the rest. enforce() applies the age rules (drop video
+    after downgrade_days, move to cold_dir after cold_days, delete after
+    retention_days; 0 turns a rule off) and then the quota on RECORDING_DIR:
+    while it is exceeded, the least recently used (or oldest, with the 'age'
+    policy) meeting is downgraded to audio and transcript, then moved to the
+    cold directory, or deleted if there is none. is_busy(meeting_dir) keeps
+    meetings that are being recorded or post-processed out of reach.
+
+    plan() predicts the disk space a meeting needs from past meetings'
+    byte rates (or the configured bitrates) and decides whether it can be
+    recorded in full, only as audio and captions, or not at all. It only
+    reads the index and the free disk space, so it is cheap enough for the
+    join path; enforce() runs after recordings and every interval given to
+    start().
+    """
+
+    def __init__(self, db_path, recording_dir, cold_dir=None, quota_bytes=0, policy='lru',
+                 downgrade_days=0, cold_days=0, retention_days=0, min_free_bytes=0,
+                 video_bytes_per_second=0, audio_bytes_per_second=0, is_busy=None, transcript_index=None):
+        self.recording_dir = os.path.normpath(recording_dir)
+        self.cold_dir = os.path.normpath(cold_dir) if cold_dir else None
+        if self.cold_dir:
+            os.makedirs(self.cold_dir, exist_ok=True)
+        self.quota_bytes = quota_bytes
+        self.policy = policy
+        self.downgrade_days = downgrade_days
+        self.cold_days = cold_days
+        self.retention_days = retention_days
+        self.min_free_bytes = min_free_bytes
+        self.video_bytes_per_second = video_bytes_per_second
+        self.audio_bytes_per_second = audio_bytes_per_second
+        self.is_busy = is_busy or (lambda meeting_dir: False)
+        self.transcript_index = transcript_index
+        self.lock = threading.RLock()
+        # One enforce() pass at a time; self.lock is only held for single index reads and writes
+        self.enforce_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS meetings (
+                    meeting_dir TEXT PRIMARY KEY,
+                    tier TEXT NOT NULL,
+                    level TEXT NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    video_bytes INTEGER NOT NULL,
+                    duration_seconds REAL,
+                    started_at REAL NOT NULL,
+                    last_accessed REAL NOT NULL,
+                    scanned_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS meetings_by_access ON meetings (tier, last_accessed);
+                CREATE INDEX IF NOT EXISTS meetings_by_age ON meetings (tier, started_at);
+            """)
+
+    def _roots(self):
+        return [(self.recording_dir, HOT)] + ([(self.cold_dir, COLD)] if self.cold_dir else [])
+
+    def update(self, meeting_dir, tier=HOT):
+        """Measure one meeting directory and store it in the index"""
+        meeting_dir = os.path.normpath(meeting_dir)
+        video_bytes = sum(path_bytes(os.path.join(meeting_dir, name)) for name in VIDEO_PATHS
+                          if os.path.exists(os.path.join(meeting_dir, name)))
+        total = path_bytes(meeting_dir)
+        started = meeting_started(meeting_dir)
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT level, last_accessed FROM meetings WHERE meeting_dir = ?",
+                                    (meeting_dir,)).fetchone()
+            level = row['level'] if row else (FULL if video_bytes else AUDIO_ONLY)
+            self.conn.execute(
+                """INSERT OR REPLACE INTO meetings
+                   (meeting_dir, tier, level, bytes, video_bytes, duration_seconds, started_at, last_accessed, scanned_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (meeting_dir, tier, level, total, video_bytes, meeting_duration(meeting_dir), started,
+                 row['last_accessed'] if row else started, now)
+            )
+
+    def refresh(self, full=False):
+        """Bring the index up to date and drop vanished meetings; full=True remeasures everything
+
+        Only new meetings, meetings whose directory changed since they were
+        measured, and meetings still in use are measured again.
+        """
+        seen = set()
+        for root, tier in self._roots():
+            with self.lock:
+                known = {row['meeting_dir']: row['scanned_at'] for row in self.conn.execute(
+                    "SELECT meeting_dir, scanned_at FROM meetings WHERE tier = ?", (tier,))}
+            for name in os.listdir(root):
+                meeting_dir = os.path.join(root, name)
+                if not os.path.isdir(meeting_dir):
+                    continue
+                seen.add(meeting_dir)
+                if (full or meeting_dir not in known or os.path.getmtime(meeting_dir) > known[meeting_dir]
+                        or self.is_busy(meeting_dir)):
+                    try:
+                        self.update(meeting_dir, tier)
+                    except OSError as e:
+                        logger.error(f"Error measuring {meeting_dir}: {e}")
+        with self.lock, self.conn:
+            for row in self.conn.execute("SELECT meeting_dir FROM meetings").fetchall():
+                if row['meeting_dir'] not in seen:
+                    self.conn.execute("DELETE FROM meetings WHERE meeting_dir = ?", (row['meeting_dir'],))
+
+    def touch(self, meeting_dir):
+        """Mark a meeting as used, for LRU retention"""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE meetings SET last_accessed = ? WHERE meeting_dir = ?",
+                              (time.time(), os.path.normpath(meeting_dir)))
+
+    def usage(self, tier=HOT):
+        with self.lock:
+            row = self.conn.execute("SELECT COUNT(*) AS meetings, COALESCE(SUM(bytes), 0) AS bytes "
+                                    "FROM meetings WHERE tier = ?", (tier,)).fetchone()
+        return dict(row)
+
+    def _meetings(self, where, params=(), order='started_at'):
+        with self.lock:
+            rows = self.conn.execute(f"SELECT * FROM meetings WHERE {where} ORDER BY {order}", params).fetchall()
+        return [dict(row) for row in rows if not self.is_busy(row['meeting_dir'])]
+
+    def downgrade(self, meeting):
+        """Delete a meeting's video, keeping audio, captions, transcripts and metadata"""
+        meeting_dir = meeting['meeting_dir']
+        for name in VIDEO_PATHS:
+            path = os.path.join(meeting_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        RecordingManifest(meeting_dir).set('video_removed_at', datetime.now().isoformat())
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE meetings SET level = ? WHERE meeting_dir = ?", (AUDIO_ONLY, meeting_dir))
+        self.update(meeting_dir, meeting['tier'])
+        logger.info(f"Downgraded {meeting_dir} to audio and transcript, freed {meeting['video_bytes'] / 2 ** 20:.0f} MB")
+
+    def move_cold(self, meeting):
+        """Move a meeting directory to the cold storage directory"""
+        source = meeting['meeting_dir']
+        dest = os.path.join(self.cold_dir, os.path.basename(source))
+        shutil.move(source, dest)
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE meetings SET meeting_dir = ?, tier = ? WHERE meeting_dir = ?",
+                              (dest, COLD, source))
+        if self.transcript_index:
+            self.transcript_index.move_meeting(source, dest)
+        logger.info(f"Moved {source} to cold storage ({meeting['bytes'] / 2 ** 20:.0f} MB)")
+
+    def delete(self, meeting):
+        shutil.rmtree(meeting['meeting_dir'], ignore_errors=True)
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM meetings WHERE meeting_dir = ?", (meeting['meeting_dir'],))
+        if self.transcript_index:
+            self.transcript_index.remove_meeting(meeting['meeting_dir'])
+        logger.info(f"Deleted {meeting['meeting_dir']} ({meeting['bytes'] / 2 ** 20:.0f} MB)")
+
+    def _evict(self, candidates):
+        """Free space from the first meeting in retention order, in the least destructive way available
+
+        Video is dropped from every candidate before any meeting is moved or deleted.
+        """
+        for meeting in candidates:
+            if meeting['level'] == FULL and meeting['video_bytes']:
+                self.downgrade(meeting)
+                return
+        if self.cold_dir:
+            self.move_cold(candidates[0])
+        else:
+            self.delete(candidates[0])
+
+    def enforce(self):
+        """Apply the age rules and the quota; returns the number of actions taken"""
+        actions = 0
+        now = time.time()
+        # Held throughout, so recordings finishing at the same time don't evict the same meeting twice
+        with self.enforce_lock:
+            try:
+                self.refresh()
+                if self.retention_days:
+                    for meeting in self._meetings("started_at < ?", (now - self.retention_days * 86400,)):
+                        self.delete(meeting)
+                        actions += 1
+                if self.downgrade_days:
+                    for meeting in self._meetings("level = ? AND video_bytes > 0 AND started_at < ?",
+                                                  (FULL, now - self.downgrade_days * 86400)):
+                        self.downgrade(meeting)
+                        actions += 1
+                if self.cold_dir and self.cold_days:
+                    for meeting in self._meetings("tier = ? AND started_at < ?", (HOT, now - self.cold_days * 86400)):
+                        self.move_cold(meeting)
+                        actions += 1
+                if self.quota_bytes:
+                    order = 'last_accessed' if self.policy == 'lru' else 'started_at'
+                    used = self.usage(HOT)['bytes']
+                    while used > self.quota_bytes:
+                        candidates = self._meetings("tier = ?", (HOT,), order)
+                        if not candidates:
+                            logger.warning(f"Recordings use {used / 2 ** 30:.1f} GB, over the quota, "
+                                           f"but every meeting is in use")
+                            break
+                        self._evict(candidates)
+                        actions += 1
+                        used = self.usage(HOT)['bytes']
+            except Exception as e:
+                logger.error(f"Error enforcing storage policy: {e}")
+        if actions:
+            logger.info(f"Storage policy applied {actions} actions: {self.usage(HOT)}")
+        return actions
+
+    def byte_rates(self):
+        """Video and audio bytes per second, from past full meetings when there are enough"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT bytes, video_bytes, duration_seconds FROM meetings "
+                "WHERE level = ? AND duration_seconds > 60", (FULL,)
+            ).fetchall()
+        if len(rows) < 3:
+            return self.video_bytes_per_second, self.audio_bytes_per_second
+        video = sorted(row['video_bytes'] / row['duration_seconds'] for row in rows)
+        other = sorted((row['bytes'] - row['video_bytes']) / row['duration_seconds'] for row in rows)
+        return video[len(video) // 2], other[len(other) // 2]
+
+    def plan(self, duration_seconds):
+        """How a meeting of this length can be recorded: (FULL or AUDIO_ONLY or None, needed bytes, free bytes)"""
+        video_rate, audio_rate = self.byte_rates()
+        free = shutil.disk_usage(self.recording_dir).free
+        needed_audio = audio_rate * duration_seconds + self.min_free_bytes
+        needed_full = needed_audio + video_rate * duration_seconds
+        if self.quota_bytes:
+            free = min(free, self.quota_bytes - self.usage(HOT)['bytes'])
+        if free >= needed_full:
+            return FULL, needed_full, free
+        if free >= needed_audio:
+            return AUDIO_ONLY, needed_full, free
+        return None, needed_audio, free
+
+    def start(self, interval):
+        """Run enforce() every interval seconds in the background, for the age rules and outside changes"""
+        if interval > 0:
+            self.thread = threading.Thread(target=self._run, args=(interval,), name='storage-enforce', daemon=True)
+            self.thread.start()
+        return self
+
+    def _run(self, interval):
+        while not self.stopped.wait(interval):
+            self.enforce()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+            self.thread = None
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,210 @@
+import os
+import sys
+import wave
+import types
+import pytest
+
+try:
+    import pyaudio  # noqa: F401
+except ImportError:
+    # Enough of PyAudio for audio_capture to import; the tests replace PyAudio itself
+    stub = types.ModuleType('pyaudio')
+    stub.paInt16 = 8
+    stub.paInputOverflow = 2
+    stub.paContinue = 0
+    stub.PyAudio = None
+    sys.modules['pyaudio'] = stub
+
+import audio_capture
+from audio_capture import AudioRecorder, AudioRingBuffer
+from av_sync import AUDIO
+from manifest import RecordingManifest, load_manifest, segment_paths
+
+
+class FakeClock:
+    def __init__(self):
+        self.seconds = 0.0
+
+    def now(self):
+        return self.seconds
+
+
+class FakeTiming:
+    def __init__(self):
+        self.marks = []
+
+    def mark(self, stream, media_seconds, clock_seconds):
+        self.marks.append((stream, media_seconds, clock_seconds))
+
+
+class FakeStream:
+    def __init__(self, callback):
+        self.callback = callback
+
+    def start_stream(self):
+        pass
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakePyAudio:
+    """One 'Stereo Mix' input whose stream is fed by the test through its callback"""
+
+    streams = []
+
+    def get_device_count(self):
+        return 1
+
+    def get_device_info_by_index(self, index):
+        return {'name': 'Stereo Mix', 'maxInputChannels': 2}
+
+    def open(self, stream_callback=None, **kwargs):
+        stream = FakeStream(stream_callback)
+        FakePyAudio.streams.append(stream)
+        return stream
+
+    def terminate(self):
+        pass
+
+
+@pytest.fixture
+def recorder(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_capture.pyaudio, 'PyAudio', FakePyAudio)
+    FakePyAudio.streams = []
+    clock = FakeClock()
+    timing = FakeTiming()
+    recorder = AudioRecorder(str(tmp_path), RecordingManifest(str(tmp_path)), rate=16000,
+                             block_seconds=0.2, clock=clock, timing=timing)
+    return recorder, clock, timing
+
+
+def test_timeline_follows_the_audio_while_the_writer_runs(recorder):
+    recorder, clock, timing = recorder
+    recorder.start()
+    callback = FakePyAudio.streams[-1].callback
+    # One second of audio in 0.1 s device blocks, arriving on time
+    for block in range(10):
+        clock.seconds = (block + 1) * 0.1
+        callback(bytes(3200), 1600, {}, 0)
+    recorder.stop()
+
+    stats = recorder.stats()
+    assert recorder.frames_stamped == 16000
+    assert recorder.frames_written == 16000
+    assert stats['duration_seconds'] == 1.0
+    stream, media_seconds, clock_seconds = timing.marks[-1]
+    assert stream == AUDIO
+    assert media_seconds == pytest.approx(1.0)
+    assert clock_seconds == pytest.approx(1.0)
+    # The timeline runs at wall-clock speed at every stamp
+    assert all(media == pytest.approx(wall) for _, media, wall in timing.marks)
+
+
+def test_blocks_lost_to_ring_overflow_do_not_advance_the_timeline(tmp_path):
+    clock = FakeClock()
+    timing = FakeTiming()
+    # The ring holds exactly one 0.1 s block of 16 kHz mono audio
+    recorder = AudioRecorder(str(tmp_path), None, rate=16000, buffer_seconds=0.1, clock=clock, timing=timing)
+    block = bytes(3200)
+
+    recorder._on_source_data(block)
+    clock.seconds = 0.1
+    recorder._on_source_data(block)  # Ring full: dropped
+    assert recorder.ring.overflows == 1
+    recorder.ring.read(0, 0)
+    clock.seconds = 0.2
+    recorder._on_source_data(block)
+
+    assert timing.marks == [(AUDIO, 0.1, 0.0), (AUDIO, 0.2, 0.2)]
+    assert recorder.frames_stamped == 3200
+
+
+def test_ring_wraps_around_and_keeps_byte_order():
+    ring = AudioRingBuffer(8)
+    assert ring.write(b'abcdef')
+    assert ring.read(0, 0) == b'abcdef'
+    # The next block straddles the end of the buffer
+    assert ring.write(b'ghijk')
+    assert ring.available() == 5
+    assert ring.read(0, 0) == b'ghijk'
+    assert ring.peak_fill == 6
+
+
+def test_ring_drops_a_block_that_does_not_fit():
+    ring = AudioRingBuffer(8)
+    assert ring.write(b'abcde')
+    assert not ring.write(b'fghi')
+    assert (ring.overflows, ring.overflow_bytes) == (1, 4)
+    # The buffered audio is untouched and a block that fits still goes in
+    assert ring.write(b'fgh')
+    assert ring.read(0, 0) == b'abcdefgh'
+
+
+def test_ring_read_waits_for_a_full_block_or_the_timeout():
+    ring = AudioRingBuffer(16)
+    ring.write(b'ab')
+    # Not enough for a block: returns what there is once the timeout passes
+    assert ring.read(4, timeout=0.01) == b'ab'
+    assert ring.read(4, timeout=0.01) == b''
+
+
+def test_audio_rotates_into_segments_listed_in_the_manifest(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_capture.pyaudio, 'PyAudio', FakePyAudio)
+    FakePyAudio.streams = []
+    ready = []
+    recorder = AudioRecorder(str(tmp_path), RecordingManifest(str(tmp_path)), rate=16000,
+                             block_seconds=0.2, segment_seconds=0.5, on_segment_ready=ready.append)
+    recorder.start()
+    callback = FakePyAudio.streams[-1].callback
+    for _ in range(12):
+        callback(bytes(3200), 1600, {}, 0)
+    recorder.stop()
+
+    manifest = load_manifest(str(tmp_path))
+    segments = manifest['streams']['audio']
+    assert [s['index'] for s in segments] == [0, 1, 2]
+    assert [s['duration'] for s in segments] == [0.5, 0.5, 0.2]
+    assert [s['start_offset'] for s in segments] == pytest.approx([0.0, 0.5, 1.0])
+    assert [entry['index'] for entry in ready] == [0, 1, 2]
+    for segment, path in zip(segments, segment_paths(str(tmp_path), manifest, 'audio')):
+        assert path == os.path.join(str(tmp_path), 'audio', f"segment_{segment['index']:05d}.wav")
+        with wave.open(path, 'rb') as wf:
+            assert wf.getnframes() == segment['duration'] * 16000
+
+
+def test_manifest_survives_a_reopen(tmp_path):
+    manifest = RecordingManifest(str(tmp_path))
+    manifest.add_segment('audio', {'index': 0, 'file': 'audio/segment_00000.wav', 'format': 'wav'})
+    manifest.update_segment('audio', 0, file='audio/segment_00000.flac', format='flac')
+    manifest.set('status', 'recording')
+
+    reopened = RecordingManifest(str(tmp_path))
+    assert reopened.segments('audio') == [{'index': 0, 'file': 'audio/segment_00000.flac', 'format': 'flac'}]
+    assert reopened.data['status'] == 'recording'
+    assert not os.path.exists(reopened.path + '.tmp')
+
+
+def test_closed_segments_are_compressed_and_the_manifest_updated(tmp_path, monkeypatch):
+    pytest.importorskip('soundfile')
+    monkeypatch.setattr(audio_capture.pyaudio, 'PyAudio', FakePyAudio)
+    FakePyAudio.streams = []
+    ready = []
+    recorder = AudioRecorder(str(tmp_path), RecordingManifest(str(tmp_path)), rate=16000, block_seconds=0.2,
+                             segment_seconds=0.5, audio_format='flac', on_segment_ready=ready.append)
+    recorder.start()
+    callback = FakePyAudio.streams[-1].callback
+    for _ in range(10):
+        callback(bytes(3200), 1600, {}, 0)
+    recorder.stop()
+
+    segments = load_manifest(str(tmp_path))['streams']['audio']
+    assert [(s['file'], s['format']) for s in segments] == [
+        (os.path.join('audio', 'segment_00000.flac'), 'flac'),
+        (os.path.join('audio', 'segment_00001.flac'), 'flac'),
+    ]
+    assert [entry['format'] for entry in ready] == ['flac', 'flac']
+    assert sorted(os.listdir(tmp_path / 'audio')) == ['segment_00000.flac', 'segment_00001.flac']
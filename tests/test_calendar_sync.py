@@ -0,0 +1,196 @@
+from datetime import datetime, timedelta
+import pytest
+import pytz
+
+pytest.importorskip('googleapiclient')
+from googleapiclient.errors import HttpError
+from calendar_service import CalendarAccount, CalendarService, parse_calendar_sources
+from calendar_store import EventStore, ADDED, MOVED, CANCELLED
+
+
+def event(event_id, start_hours, length_hours=1, summary=None, status='confirmed'):
+    start = datetime.now(pytz.UTC) + timedelta(hours=start_hours)
+    return {
+        'id': event_id,
+        'status': status,
+        'summary': summary or event_id,
+        'start': {'dateTime': start.isoformat()},
+        'end': {'dateTime': (start + timedelta(hours=length_hours)).isoformat()},
+        'hangoutLink': f'https://meet.google.com/{event_id}'
+    }
+
+
+class Expired:
+    status = 410
+    reason = 'Gone'
+
+
+class FakeRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FakeEvents:
+    """Stand-in for service.events(); answers list() calls from queued pages"""
+
+    def __init__(self):
+        self.pages = []
+        self.calls = []
+
+    def list(self, **params):
+        self.calls.append(params)
+        return FakeRequest(self.pages.pop(0))
+
+
+class FakeService:
+    """Calendar service without batch support, so every list() goes through FakeEvents"""
+
+    def __init__(self):
+        self.fake_events = FakeEvents()
+
+    def events(self):
+        return self.fake_events
+
+
+@pytest.fixture
+def service():
+    return FakeService()
+
+
+@pytest.fixture
+def calendar(service, tmp_path):
+    store = EventStore(str(tmp_path / 'calendar.db'))
+    account = CalendarAccount('token.json', ['primary'], service=service, sync_days=7)
+    calendar_service = CalendarService(accounts=[account], store=store)
+    yield calendar_service
+    calendar_service.executor.shutdown()
+    store.close()
+
+
+def test_full_sync_is_bounded_and_pages(calendar, service):
+    service.fake_events.pages = [
+        {'items': [event('a', 2)], 'nextPageToken': 'page-2'},
+        {'items': [event('b', 5)], 'nextSyncToken': 'sync-1'},
+    ]
+    changes = calendar.sync()
+
+    assert sorted((change, meeting['id']) for change, meeting in changes) == [(ADDED, 'a'), (ADDED, 'b')]
+    first, second = service.fake_events.calls
+    assert first['singleEvents'] is True
+    time_min = datetime.fromisoformat(first['timeMin'])
+    time_max = datetime.fromisoformat(first['timeMax'])
+    assert time_max - time_min == timedelta(days=8)
+    assert 'pageToken' not in first
+    assert second['pageToken'] == 'page-2'
+    assert (second['timeMin'], second['timeMax']) == (first['timeMin'], first['timeMax'])
+    assert calendar.store.get_sync_token('token:primary') == 'sync-1'
+    assert calendar.store.get_window_end('token:primary') == time_max
+
+
+def test_incremental_sync_applies_moves_and_cancellations(calendar, service):
+    service.fake_events.pages = [{'items': [event('a', 2), event('b', 5)], 'nextSyncToken': 'sync-1'}]
+    calendar.sync()
+    window_end = calendar.store.get_window_end('token:primary')
+
+    service.fake_events.pages = [{
+        'items': [event('a', 3), {'id': 'b', 'status': 'cancelled'}],
+        'nextSyncToken': 'sync-2'
+    }]
+    changes = calendar.sync()
+
+    params = service.fake_events.calls[-1]
+    assert params['syncToken'] == 'sync-1'
+    assert 'timeMin' not in params and 'timeMax' not in params
+    assert [(change, meeting['id']) for change, meeting in changes] == [(MOVED, 'a'), (CANCELLED, 'b')]
+    assert calendar.store.get_sync_token('token:primary') == 'sync-2'
+    assert calendar.store.get_window_end('token:primary') == window_end
+    now = datetime.now(pytz.UTC)
+    assert [m['id'] for m in calendar.store.upcoming(now, now + timedelta(days=7))] == ['a']
+
+
+def test_expired_sync_token_resets_and_resyncs(calendar, service):
+    service.fake_events.pages = [{'items': [event('a', 2), event('b', 5)], 'nextSyncToken': 'sync-1'}]
+    calendar.sync()
+
+    service.fake_events.pages = [
+        HttpError(Expired(), b'sync token expired'),
+        {'items': [event('b', 5)], 'nextSyncToken': 'sync-2'},
+    ]
+    calendar.sync()
+
+    expired, full = service.fake_events.calls[-2:]
+    assert expired['syncToken'] == 'sync-1'
+    assert 'syncToken' not in full and 'timeMax' in full
+    now = datetime.now(pytz.UTC)
+    assert [m['id'] for m in calendar.store.upcoming(now, now + timedelta(days=7))] == ['b']
+    assert calendar.store.get_sync_token('token:primary') == 'sync-2'
+
+
+def test_window_running_out_triggers_full_sync(calendar, service):
+    first = event('a', 2)
+    service.fake_events.pages = [{'items': [first], 'nextSyncToken': 'sync-1'}]
+    calendar.sync()
+    # Pretend the last full sync was six and a half days ago
+    calendar.store.set_sync_token('token:primary', 'sync-1', datetime.now(pytz.UTC) + timedelta(hours=12))
+
+    service.fake_events.pages = [{'items': [first, event('c', 24 * 6)], 'nextSyncToken': 'sync-2'}]
+    changes = calendar.sync()
+
+    params = service.fake_events.calls[-1]
+    assert 'syncToken' not in params and 'timeMax' in params
+    # The cache is kept, so only the newly reachable meeting is reported
+    assert [(change, meeting['id']) for change, meeting in changes] == [(ADDED, 'c')]
+    assert calendar.store.get_window_end('token:primary') > datetime.now(pytz.UTC) + timedelta(days=6)
+
+
+def test_sync_prunes_ended_meetings(calendar, service):
+    service.fake_events.pages = [
+        {'items': [event('old', -50), event('recent', -3), event('next', 2)], 'nextSyncToken': 'sync-1'}
+    ]
+    calendar.sync()
+
+    now = datetime.now(pytz.UTC)
+    remaining = calendar.store.upcoming(now - timedelta(days=30), now + timedelta(days=7))
+    assert [m['id'] for m in remaining] == ['recent', 'next']
+
+
+def test_parse_calendar_sources():
+    assert parse_calendar_sources('token.json:primary, team@group.calendar.google.com; other.json') == [
+        ('token.json', ['primary', 'team@group.calendar.google.com']),
+        ('other.json', ['primary']),
+    ]
+    assert parse_calendar_sources('') == []
+
+
+def test_accounts_sync_together_and_duplicates_merge(tmp_path):
+    shared = event('standup', 2)
+    shared['iCalUID'] = 'standup@google.com'
+    work, personal = FakeService(), FakeService()
+    work.fake_events.pages = [
+        {'items': [shared, event('review', 3)], 'nextSyncToken': 'w-1'},
+        RuntimeError('team calendar is unreachable'),
+    ]
+    personal.fake_events.pages = [{'items': [dict(shared)], 'nextSyncToken': 'p-1'}]
+
+    store = EventStore(str(tmp_path / 'calendar.db'))
+    accounts = [CalendarAccount('work.json', ['primary', 'team'], service=work, sync_days=7),
+                CalendarAccount('personal.json', ['primary'], service=personal, sync_days=7)]
+    calendar = CalendarService(accounts=accounts, store=store)
+    try:
+        meetings = calendar.get_upcoming_meetings(time_window_minutes=24 * 60)
+    finally:
+        calendar.executor.shutdown()
+
+    assert [(m['id'], sorted(m['calendars'])) for m in meetings] == [
+        ('standup', ['personal:primary', 'work:primary']),
+        ('review', ['work:primary']),
+    ]
+    # The failed calendar keeps no token, so its next sync is a full one again
+    assert store.get_sync_token('work:team') is None
+    assert store.get_sync_token('personal:primary') == 'p-1'
+    store.close()
@@ -0,0 +1,166 @@
+import json
+import shutil
+import logging
+import subprocess
+from datetime import datetime, timezone
+import pytest
+
+meeting_recorder = pytest.importorskip('meeting_recorder')
+from meeting_recorder import MeetingRecorder
+
+STARTED = datetime(2026, 10, 17, 10, 0, tzinfo=timezone.utc)
+
+
+def caption(seq, text='hello', second=0):
+    timestamp = f'2026-10-17T10:00:{second:02d}.000Z'
+    return {'seq': seq, 'timestamp': timestamp, 'committedAt': timestamp, 'speaker': 'Alice', 'text': text}
+
+
+class FakeDriver:
+    """Returns one queued batch per drain and remembers the cursor it was given"""
+
+    def __init__(self, batches):
+        self.batches = batches
+        self.cursors = []
+
+    def execute_script(self, script, *args):
+        self.cursors.append(args[0])
+        return self.batches.pop(0) if self.batches else []
+
+    def quit(self):
+        pass
+
+
+class FakeWriter:
+    def __init__(self):
+        self.records = []
+
+    def write(self, records):
+        self.records.extend(records)
+
+
+@pytest.fixture
+def recorder():
+    recorder = MeetingRecorder.__new__(MeetingRecorder)
+    recorder.caption_writer = FakeWriter()
+    recorder.recording_started_at = STARTED
+    return recorder
+
+
+def test_drain_writes_each_caption_once_and_logs_gaps(recorder, caplog):
+    recorder.driver = FakeDriver([
+        [caption(1, 'first', 1), caption(2, 'second', 2)],
+        [caption(2, 'second', 2), caption(3, 'third', 3), caption(5, 'fifth', 5)],
+        [],
+    ])
+    last_seq = 0
+    with caplog.at_level(logging.WARNING):
+        for _ in range(3):
+            last_seq = recorder.drain_captions(last_seq)
+
+    assert last_seq == 5
+    assert recorder.driver.cursors == [0, 2, 5]
+    assert [(r['seq'], r['text'], r['offset']) for r in recorder.caption_writer.records] == [
+        (1, 'first', 1.0), (2, 'second', 2.0), (3, 'third', 3.0), (5, 'fifth', 5.0)
+    ]
+    assert 'Missed captions 4-4' in caplog.text
+
+
+def test_drain_skips_empty_captions_but_advances_the_cursor(recorder):
+    recorder.driver = FakeDriver([[caption(1, ''), caption(2, 'kept')]])
+    assert recorder.drain_captions(0) == 2
+    assert [r['seq'] for r in recorder.caption_writer.records] == [2]
+
+
+# Runs CAPTION_OBSERVER_SCRIPT under node against a fake caption panel. Each
+# step either puts [speaker, text] lines on screen and fires the observer,
+# flushes pending utterances, or drains from a cursor.
+OBSERVER_HARNESS = """
+const [script, capacity, selectors, steps] = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+const observed = [];
+let callback = null;
+let lines = [];
+
+function element(text) {
+    return {textContent: text};
+}
+
+const region = {
+    isConnected: true,
+    matches: () => false,
+    querySelectorAll: selector => selector === selectors.line ? lines : []
+};
+global.document = {
+    body: {name: 'body'},
+    querySelector: selector => selector === selectors.regions[0] ? region : null
+};
+global.window = global;
+global.dispatchEvent = () => {};
+global.CustomEvent = class {};
+global.MutationObserver = class {
+    constructor(fn) { this.fn = fn; }
+    observe(target) { observed.push(target === region ? 'region' : 'body'); callback = this.fn; }
+    disconnect() {}
+};
+
+new Function(script)(capacity, 60000, selectors);
+const state = window.meetNotesCaptions;
+const drained = [];
+for (const step of steps) {
+    if (step.screen) {
+        lines = step.screen.map(([speaker, text]) => ({
+            querySelector: selector => selector === selectors.speaker ? element(speaker)
+                : selector === selectors.text ? element(text) : null
+        }));
+        callback([{}]);
+    } else if (step.flush) {
+        state.flush();
+    } else {
+        drained.push(state.drain(step.drain).map(c => [c.seq, c.speaker, c.text]));
+    }
+}
+state.stop();
+console.log(JSON.stringify({observed, drained, stats: state.stats}));
+"""
+
+
+def run_observer(steps, capacity=8):
+    if not shutil.which('node'):
+        pytest.skip('node is not installed')
+    payload = json.dumps([meeting_recorder.CAPTION_OBSERVER_SCRIPT, capacity, meeting_recorder.CAPTION_SELECTORS,
+                          steps])
+    result = subprocess.run(['node', '-e', OBSERVER_HARNESS], input=payload, capture_output=True, text=True,
+                            timeout=30, check=True)
+    return json.loads(result.stdout)
+
+
+def test_observer_watches_only_the_caption_region():
+    result = run_observer([{'screen': [['Alice', 'Hello there']]}, {'flush': True}, {'drain': 0}])
+    assert result['observed'] == ['region']
+    assert result['drained'] == [[[1, 'Alice', 'Hello there']]]
+
+
+def test_growing_line_is_one_utterance():
+    result = run_observer([
+        {'screen': [['Alice', 'Let us start']]},
+        {'screen': [['Alice', 'Let us start with the roadmap']]},
+        {'screen': [['Alice', 'Let us start with the roadmap'], ['Bob', 'Sure']]},
+        {'screen': [['Bob', 'Sure']]},
+        {'flush': True},
+        {'drain': 0},
+    ])
+    assert result['drained'] == [[[1, 'Alice', 'Let us start with the roadmap'], [2, 'Bob', 'Sure']]]
+
+
+def test_ring_keeps_the_newest_captions_and_counts_overwrites():
+    # Every step replaces the speaker's line with an unrelated one, committing the previous utterance
+    steps = [{'screen': [['Alice', f'Topic number {n} is up next']]} for n in range(6)]
+    steps += [{'flush': True}, {'drain': 0}, {'drain': 6}]
+    result = run_observer(steps, capacity=4)
+
+    first, second = result['drained']
+    assert [seq for seq, _, _ in first] == [3, 4, 5, 6]
+    assert first[-1][2] == 'Topic number 5 is up next'
+    assert second == []
+    assert result['stats']['committed'] == 6
+    assert result['stats']['overwritten'] == 2
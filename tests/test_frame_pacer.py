@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip('cv2')
+pytest.importorskip('mss')
+import screen_capture
+from screen_capture import FramePacer
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(screen_capture, 'time', fake)
+    return fake
+
+
+def test_repeats_without_new_frames_are_not_captures(clock):
+    # 8 fps keeps the slot times exact in binary floating point
+    pacer = FramePacer(8)
+    pacer.start()
+    assert pacer.due() == 1
+    # Nothing repaints for the next second: the last frame fills every slot
+    for _ in range(8):
+        pacer.wait()
+        assert pacer.fill() == 1
+    clock.now += 1.0
+    stats = pacer.stats()
+    assert stats['frames_captured'] == 1
+    assert stats['frames_written'] == 9
+    assert stats['frames_repeated'] == 8
+    assert stats['frames_dropped'] == 0
+    assert stats['frames_duplicated'] == 0
+    assert stats['achieved_fps'] == 0.5
+
+
+def test_due_drops_and_duplicates_against_the_clock(clock):
+    pacer = FramePacer(8)
+    pacer.start()
+    assert pacer.due() == 1
+    # A second capture in the same slot is dropped
+    assert pacer.due() == 0
+    # Capture stalls past the next slot: the next frame is written twice
+    clock.now += 0.3125
+    assert pacer.due() == 2
+    assert (pacer.captured, pacer.written, pacer.dropped, pacer.duplicated) == (3, 3, 1, 1)
+    # fill() has nothing to add once the frame count is in step
+    assert pacer.fill() == 0
@@ -0,0 +1,185 @@
+import os
+import queue
+import pytest
+
+import frame_pipeline
+from frame_pipeline import (
+    FrameRing, SegmentedVideoWriter, VideoEncoder, DROP_NEWEST, DROP_OLDEST, REPEAT_LAST, encode_frames
+)
+
+
+def fill(ring, value, repeat=1):
+    """Write a frame whose pixels are all `value` and queue it, like record_screen does"""
+    index = ring.acquire()
+    if index is None:
+        ring.drop(repeat)
+        return None
+    ring.frames[index][:] = value
+    ring.commit(index, repeat)
+    return index
+
+
+def queued(ring):
+    """Drain the filled queue as (pixel value or REPEAT_LAST, repeat) pairs"""
+    items = []
+    while True:
+        try:
+            index, repeat = ring.filled.get_nowait()
+        except queue.Empty:
+            return items
+        items.append((REPEAT_LAST if index == REPEAT_LAST else int(ring.frames[index][0, 0]), repeat))
+
+
+def test_ring_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        FrameRing(1, (2, 2))
+    with pytest.raises(ValueError):
+        FrameRing(2, (2, 2), drop_policy='drop_random')
+
+
+def test_drop_newest_keeps_queued_frames_and_carries_the_drop():
+    ring = FrameRing(2, (2, 2), drop_policy=DROP_NEWEST)
+    fill(ring, 10)
+    fill(ring, 20)
+    assert fill(ring, 30, repeat=2) is None
+    assert (ring.enqueued, ring.dropped, ring.carry) == (2, 1, 2)
+
+    # The encoder takes the first frame and frees its slot; the next frame owes the dropped repeats
+    index, _ = ring.filled.get_nowait()
+    ring.free.put(index)
+    fill(ring, 40)
+    assert queued(ring) == [(20, 1), (40, 3)]
+    assert ring.carry == 0
+
+
+def test_drop_oldest_reuses_the_oldest_queued_slot():
+    ring = FrameRing(2, (2, 2), drop_policy=DROP_OLDEST)
+    fill(ring, 10)
+    fill(ring, 20)
+    assert fill(ring, 30) is not None
+    assert (ring.enqueued, ring.dropped) == (3, 1)
+    # Frame 10 is gone and its repeat went to frame 30
+    assert queued(ring) == [(20, 1), (30, 2)]
+
+
+def test_drop_oldest_skips_repeat_markers_and_keeps_their_repeats():
+    ring = FrameRing(2, (2, 2), drop_policy=DROP_OLDEST)
+    ring.repeat_last(2)
+    fill(ring, 10)
+    fill(ring, 20)
+    fill(ring, 30)
+    assert ring.dropped == 2
+    assert queued(ring) == [(20, 1), (30, 4)]
+
+
+def test_drop_oldest_with_nothing_queued_drops_the_new_frame():
+    ring = FrameRing(2, (2, 2), drop_policy=DROP_OLDEST)
+    ring.free.get_nowait()
+    ring.free.get_nowait()
+    assert ring.acquire() is None
+
+
+def test_repeat_last_takes_the_carry():
+    ring = FrameRing(2, (2, 2))
+    fill(ring, 10)
+    fill(ring, 20)
+    fill(ring, 30)
+    ring.repeat_last(3)
+    assert ring.repeated == 3 and ring.carry == 0
+    assert queued(ring) == [(10, 1), (20, 1), (REPEAT_LAST, 4)]
+
+
+class FakeWriter:
+    """Records what SegmentedVideoWriter would have written"""
+
+    written = []
+
+    def __init__(self, *args):
+        FakeWriter.written = []
+
+    def write(self, frame, repeat):
+        FakeWriter.written.append((int(frame[0, 0]), repeat))
+
+    def close(self):
+        pass
+
+
+class Encoded:
+    value = 0
+
+
+def test_encoder_repeats_the_held_slot_and_frees_the_previous_one(monkeypatch):
+    monkeypatch.setattr(frame_pipeline, 'SegmentedVideoWriter', FakeWriter)
+    ring = FrameRing(3, (2, 2))
+    # A repeat before any frame has nothing to repeat and is skipped
+    ring.repeat_last(1)
+    first = fill(ring, 10)
+    ring.repeat_last(2)
+    second = fill(ring, 20)
+    ring.close()
+    # Hand the remaining free slot out so the queue holds only what the encoder returns
+    spare = ring.free.get_nowait()
+    encoded = Encoded()
+    encode_frames(ring.frames, ring.free, ring.filled, None, 8, (2, 2), False, encoded, 8, queue.Queue())
+
+    assert FakeWriter.written == [(10, 1), (10, 2), (20, 1)]
+    assert encoded.value == 4
+    # Only the superseded slot comes back; the encoder still holds the last one
+    assert ring.free.get_nowait() == first
+    assert ring.free.empty()
+    assert second not in (first, spare)
+
+
+class FakeVideoWriter:
+    """cv2.VideoWriter that counts frames per file"""
+
+    files = {}
+
+    def __init__(self, path, fourcc, fps, size, isColor=True):
+        self.path = path
+        FakeVideoWriter.files[path] = 0
+
+    def write(self, frame):
+        FakeVideoWriter.files[self.path] += 1
+
+    def release(self):
+        pass
+
+
+def test_segments_rotate_at_the_frame_limit_even_inside_a_repeat(monkeypatch, tmp_path):
+    monkeypatch.setattr(frame_pipeline.cv2, 'VideoWriter', FakeVideoWriter)
+    FakeVideoWriter.files = {}
+    video_dir = str(tmp_path / 'video')
+    closed = []
+    writer = SegmentedVideoWriter(video_dir, 4, (2, 2), False, 8, closed.append)
+
+    frame = None
+    writer.write(frame, 5)
+    writer.write(frame, 6)  # Crosses into the second segment
+    writer.write(frame, 1)
+    writer.close()
+    writer.close()
+
+    assert [(entry['index'], entry['start_frame'], entry['frames']) for entry in closed] == [(0, 0, 8), (1, 8, 4)]
+    assert [(entry['start_offset'], entry['duration']) for entry in closed] == [(0.0, 2.0), (2.0, 1.0)]
+    assert [entry['file'] for entry in closed] == [os.path.join('video', 'segment_00000.avi'),
+                                                   os.path.join('video', 'segment_00001.avi')]
+    assert list(FakeVideoWriter.files.values()) == [8, 4]
+
+
+def test_video_encoder_lists_closed_segments_in_order(monkeypatch, tmp_path):
+    monkeypatch.setattr(frame_pipeline.cv2, 'VideoWriter', FakeVideoWriter)
+    FakeVideoWriter.files = {}
+    segments = []
+    encoder = VideoEncoder(str(tmp_path / 'video'), 4, (4, 2), is_color=False, slots=3,
+                           segment_seconds=1, on_segment=segments.append)
+    encoder.start()
+    ring = encoder.ring
+    for value in range(3):
+        index = ring.free.get(timeout=5)
+        ring.frames[index][:] = value
+        ring.commit(index, 3)
+    encoder.stop()
+
+    assert [(s['index'], s['frames']) for s in segments] == [(0, 4), (1, 4), (2, 1)]
+    assert encoder.stats()['frames_encoded'] == 9
@@ -0,0 +1,82 @@
+import os
+import pytest
+
+html = pytest.importorskip('lxml.html')
+pytest.importorskip('cssselect')
+from meet_selectors import (
+    SELECTOR_STRATEGIES, CSS, CAPTION_LINE_SELECTOR, CAPTION_SPEAKER_SELECTOR, CAPTION_TEXT_SELECTOR
+)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load(name):
+    return html.parse(os.path.join(FIXTURES, name)).getroot()
+
+
+def select(page, kind, selector):
+    if kind == CSS:
+        return page.cssselect(selector)
+    return page.xpath(selector)
+
+
+def first_match(page, name):
+    """Index and element of the first candidate that matches, like WAIT_FOR_ANY_SCRIPT"""
+    for index, (kind, selector) in enumerate(SELECTOR_STRATEGIES[name]):
+        found = select(page, kind, selector)
+        if found:
+            return index, found[0]
+    return None, None
+
+
+@pytest.mark.parametrize('fixture', ['meet_prejoin.html', 'meet_in_call.html', 'meet_captions_legacy.html'])
+def test_every_candidate_is_valid(fixture):
+    page = load(fixture)
+    for name, candidates in SELECTOR_STRATEGIES.items():
+        for kind, selector in candidates:
+            select(page, kind, selector)
+
+
+def test_prejoin_finds_join_button():
+    page = load('meet_prejoin.html')
+    index, button = first_match(page, 'join_button')
+    assert button is not None and button.tag == 'button'
+    assert 'Join now' in button.text_content()
+    assert first_match(page, 'prejoin_ready')[1] is not None
+    assert first_match(page, 'leave_button')[1] is None
+
+
+def test_in_call_finds_caption_region_and_leave_button():
+    page = load('meet_in_call.html')
+    assert first_match(page, 'join_button')[1] is None
+    assert first_match(page, 'in_meeting')[1] is not None
+
+    index, region = first_match(page, 'caption_region')
+    assert index == 0 and region.get('aria-label') == 'Captions'
+    index, button = first_match(page, 'leave_button')
+    assert button is not None and button.get('jsname') == 'CQylAd'
+    index, button = first_match(page, 'captions_button')
+    assert button is not None and button.get('aria-pressed') == 'true'
+
+
+def test_caption_lines_have_speaker_and_text():
+    for fixture, expected in [
+        ('meet_in_call.html', [('Alice Example', "Let's start with the roadmap for next quarter"),
+                               ('Bob Example', 'Sounds good')]),
+        ('meet_captions_legacy.html', [('Alice Example', 'Can everyone hear me')]),
+    ]:
+        page = load(fixture)
+        lines = []
+        for line in page.cssselect(CAPTION_LINE_SELECTOR):
+            speaker = line.cssselect(CAPTION_SPEAKER_SELECTOR)
+            text = line.cssselect(CAPTION_TEXT_SELECTOR)
+            lines.append((speaker[0].text_content().strip(), text[0].text_content().strip()))
+        assert lines == expected
+
+
+def test_legacy_layout_falls_back_to_caption_lines_and_tooltip():
+    page = load('meet_captions_legacy.html')
+    index, region = first_match(page, 'caption_region')
+    assert index == 1 and 'zs7s8d' in region.get('class')
+    index, button = first_match(page, 'leave_button')
+    assert index == 2 and button.get('data-tooltip') == 'Leave call'
@@ -0,0 +1,63 @@
+import threading
+from collections import namedtuple
+import pytest
+
+pytest.importorskip('psutil')
+from metrics import Registry, ThreadSampler
+
+CpuTimes = namedtuple('CpuTimes', 'id user_time system_time')
+MemoryInfo = namedtuple('MemoryInfo', 'rss')
+
+
+class FakeProcess:
+    def __init__(self):
+        self.cpu = {}
+
+    def threads(self):
+        return [CpuTimes(thread_id, seconds, 0.0) for thread_id, seconds in self.cpu.items()]
+
+    def memory_info(self):
+        return MemoryInfo(1 << 20)
+
+
+@pytest.fixture
+def workers():
+    """Three idle threads that all share one name, like one thread per recorder slot"""
+    stop = threading.Event()
+    threads = [threading.Thread(target=stop.wait, name='worker', daemon=True) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    yield [thread.native_id for thread in threads]
+    stop.set()
+
+
+def cpu_seconds(registry, thread):
+    counter = registry.counter('meet_notes_thread_cpu_seconds_total', '', ['thread'])
+    return dict((labels['thread'], value) for labels, value in counter.items()).get(thread)
+
+
+def test_cpu_is_tracked_per_thread_and_summed_per_name(workers):
+    registry = Registry()
+    sampler = ThreadSampler(registry)
+    process = sampler.process = FakeProcess()
+    first, second, third = workers
+
+    process.cpu = {first: 1.0, second: 2.0, 99999999: 0.5}
+    sampler.sample()
+    assert cpu_seconds(registry, 'worker') == pytest.approx(3.0)
+    assert cpu_seconds(registry, 'native') == pytest.approx(0.5)
+
+    # One worker exits and another starts: the name's total doesn't change,
+    # but the surviving and new threads used 1.0 s between the samples
+    process.cpu = {second: 2.5, third: 0.5}
+    sampler.sample()
+    assert cpu_seconds(registry, 'worker') == pytest.approx(4.0)
+
+    # A thread ID reused by a new thread starts again from zero
+    process.cpu = {second: 0.25, third: 0.5}
+    sampler.sample()
+    assert cpu_seconds(registry, 'worker') == pytest.approx(4.25)
+
+    percent = registry.gauge('meet_notes_thread_cpu_percent', '', ['thread'])
+    assert [labels['thread'] for labels, _ in percent.items()] == ['worker']
+    assert registry.gauge('meet_notes_process_threads', '').items()[0][1] == 2
@@ -0,0 +1,158 @@
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+
+psutil = pytest.importorskip('psutil')
+pytest.importorskip('cv2')
+import postprocess
+from postprocess import PostProcessor, DONE, PENDING
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+class InlineExecutor:
+    """Runs each stage in the calling thread and hands back an already finished future
+
+    add_done_callback then calls back before submit's caller gets control back.
+    """
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args[0])
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class BrokenExecutor:
+    def submit(self, fn, *args):
+        raise BrokenProcessPool("a worker died")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+@pytest.fixture
+def meeting_dir(tmp_path):
+    path = tmp_path / 'meeting'
+    path.mkdir()
+    return str(path)
+
+
+@pytest.fixture
+def processor(tmp_path):
+    processor = PostProcessor(str(tmp_path / 'postprocess.db'), options={'ffmpeg': 'no-such-ffmpeg'})
+    yield processor
+    if not processor.stopped:
+        processor.stop()
+
+
+def state(processor, meeting_dir):
+    return processor.store.get(meeting_dir)['state']
+
+
+def test_job_runs_every_stage_in_the_pool(processor, meeting_dir):
+    processor.start()
+    processor.submit(meeting_dir)
+    wait_for(lambda: state(processor, meeting_dir) == DONE)
+    results = processor.store.get(meeting_dir)['results']
+    assert [name for name, _ in postprocess.STAGES] == list(results)
+    assert processor.active == set()
+
+
+def test_stop_ends_the_worker_processes(processor, meeting_dir):
+    processor.start()
+    processor.submit(meeting_dir)
+    wait_for(lambda: state(processor, meeting_dir) == DONE)
+    workers = [child for child in psutil.Process().children() if child.is_running()]
+    assert workers
+    processor.stop()
+    psutil.wait_procs(workers, timeout=10)
+    assert not any(worker.is_running() for worker in workers)
+
+
+def test_callbacks_that_run_inline_do_not_deadlock(processor, meeting_dir):
+    processor.start()
+    processor.executor.shutdown()
+    inline = processor.executor = InlineExecutor()
+    processor.submit(meeting_dir)
+    wait_for(lambda: state(processor, meeting_dir) == DONE, timeout=10)
+    assert inline.submitted == [name for name, _ in postprocess.STAGES]
+
+
+def test_broken_pool_requeues_the_job_and_is_replaced(processor, meeting_dir):
+    processor.start()
+    processor.executor.shutdown()
+    broken = processor.executor = BrokenExecutor()
+    # A broken pool must not reach the caller, e.g. recording_finished
+    processor.submit(meeting_dir)
+    assert processor.executor is not broken
+    assert processor.store.get(meeting_dir)['attempts'] == 0
+    wait_for(lambda: state(processor, meeting_dir) == DONE)
+
+
+def test_stopped_processor_leaves_jobs_pending(processor, meeting_dir):
+    processor.start()
+    processor.stop()
+    processor.store = postprocess.JobStore(processor.store.path)
+    processor.submit(meeting_dir)
+    assert state(processor, meeting_dir) == PENDING
+    processor.store.close()
+
+
+@pytest.fixture
+def mux(monkeypatch, meeting_dir):
+    """Run stage_mux on one video segment and one audio segment, capturing the ffmpeg arguments"""
+    calls = []
+    manifest = {
+        'video_started_at': '2026-03-02T09:00:00+00:00',
+        'audio_started_at': '2026-03-02T09:00:00.250000+00:00',
+        'streams': {'audio': [{'file': 'audio/segment_00000.wav', 'sample_rate': 16000, 'channels': 1}]}
+    }
+    monkeypatch.setattr(postprocess, 'load_manifest', lambda path: manifest)
+    monkeypatch.setattr(postprocess, 'source_videos', lambda path, manifest: [path + '/video/segment_00000.avi'])
+    monkeypatch.setattr(postprocess, 'find_ffmpeg', lambda options: 'ffmpeg')
+    monkeypatch.setattr(postprocess, 'build_audio_track', lambda path, segments, out_path: 60.0)
+    monkeypatch.setattr(postprocess, 'run_ffmpeg', lambda args, options: calls.append(args))
+    monkeypatch.setattr(postprocess.os, 'replace', lambda src, dst: None)
+    monkeypatch.setattr(postprocess.os, 'remove', lambda path: None)
+
+    def run(sync):
+        monkeypatch.setattr(postprocess, 'measure_drift', lambda path: sync)
+        result = postprocess.stage_mux(meeting_dir, {'max_drift_ppm': 500}, {})
+        return result, calls[-1]
+    return run
+
+
+def sync_report(tempo):
+    return {'tempo': tempo, 'audio_delay_seconds': 0.1, 'uncorrected_skew_ms': 3.0, 'corrected_skew_ms': 0.5}
+
+
+def test_mux_corrects_plausible_drift(mux):
+    result, args = mux(sync_report(1.00005))
+    assert 'atempo=1.000050000' in args
+    assert result['tempo'] == 1.00005
+    assert result['audio_delay_seconds'] == 0.1
+    assert 'drift_correction_skipped' not in result
+
+
+def test_mux_ignores_implausible_drift_and_aligns_by_start_time(mux):
+    result, args = mux(sync_report(1.99))
+    assert not any(arg.startswith('atempo') for arg in args)
+    assert '-af' not in args
+    assert 'tempo' not in result
+    assert '990000 ppm' in result['drift_correction_skipped']
+    # Audio started 0.25 s after the video
+    assert result['audio_delay_seconds'] == pytest.approx(0.25)
+    assert args[args.index('-itsoffset') + 1] == '0.250000'
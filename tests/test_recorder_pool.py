@@ -0,0 +1,129 @@
+import threading
+import pytest
+
+from recorder_pool import RecorderPool
+
+
+class FakeRecorder:
+    """Records until stop() clears `recording`, like MeetingRecorder"""
+
+    def __init__(self, profile_path, join_ok=True, reset_ok=True):
+        self.profile_path = profile_path
+        self.join_ok = join_ok
+        self.reset_ok = reset_ok
+        self.joined = []
+        self.closed = False
+        self.recording = False
+        self.recording_started = threading.Event()
+        self.meeting_dir = None
+
+    def join_meeting(self, meet_link):
+        self.joined.append(meet_link)
+        return self.join_ok
+
+    def start_recording(self, meeting_id):
+        self.meeting_dir = f"recordings/{meeting_id}"
+        self.recording = True
+        self.recording_started.set()
+        while self.recording:
+            threading.Event().wait(0.01)
+
+    def reset_session(self):
+        return self.reset_ok
+
+    def close_browser(self):
+        self.closed = True
+
+
+def meeting(meeting_id):
+    return {'id': meeting_id, 'summary': meeting_id, 'meet_link': f'https://meet.google.com/{meeting_id}'}
+
+
+@pytest.fixture
+def make_pool(monkeypatch, tmp_path):
+    pools = []
+
+    def make(size=1, max_sessions=5, **recorder_options):
+        launched = []
+        finished = []
+
+        def factory(profile_path):
+            recorder = FakeRecorder(profile_path, **recorder_options)
+            launched.append(recorder)
+            return recorder
+
+        pool = RecorderPool(factory, size=size, profile_dir=str(tmp_path), min_free_memory_mb=0,
+                            sample_seconds=0.01, max_sessions=max_sessions, on_finished=finished.append)
+        monkeypatch.setattr(pool, 'admission_check', lambda: None)
+        pools.append(pool)
+        return pool, launched, finished
+
+    yield make
+    for pool in pools:
+        pool.stop_all(timeout=5)
+
+
+def record(pool, meeting_id):
+    """Join a meeting, let it record, then leave and wait for the slot to finish"""
+    assert pool.start(meeting(meeting_id)) == (True, None)
+    slot = next(slot for slot in pool.slots if slot.meeting and slot.meeting['id'] == meeting_id)
+    recorder, thread = slot.recorder, slot.thread
+    assert recorder.recording_started.wait(5)
+    pool.stop(meeting_id)
+    thread.join(5)
+    return recorder
+
+
+def test_browser_is_kept_warm_between_meetings(make_pool):
+    pool, launched, finished = make_pool()
+    first = record(pool, 'abc')
+    assert first.join_stats['warm_browser'] is False
+
+    second = record(pool, 'def')
+    assert second is first and len(launched) == 1
+    assert second.join_stats['warm_browser'] is True
+    assert not first.closed
+    assert finished == ['recordings/abc', 'recordings/def']
+    assert len(pool.join_times) == 2
+
+
+def test_browser_is_recycled_after_max_sessions(make_pool):
+    pool, launched, _ = make_pool(max_sessions=2)
+    record(pool, 'abc')
+    record(pool, 'def')
+    assert launched[0].closed and pool.slots[0].recorder is None
+    record(pool, 'ghi')
+    assert len(launched) == 2
+
+
+def test_browser_that_cannot_reset_is_closed(make_pool):
+    pool, launched, _ = make_pool(reset_ok=False)
+    record(pool, 'abc')
+    assert launched[0].closed and pool.slots[0].recorder is None
+
+
+def test_failed_join_frees_the_slot(make_pool):
+    pool, launched, finished = make_pool(join_ok=False)
+    assert pool.start(meeting('abc')) == (False, None)
+    assert not pool.slots[0].busy
+    assert finished == []
+
+
+def test_meetings_are_refused_when_every_slot_is_busy(make_pool):
+    pool, _, _ = make_pool(size=1)
+    assert pool.start(meeting('abc')) == (True, None)
+    ok, reason = pool.start(meeting('def'))
+    assert not ok and 'busy' in reason
+    assert pool.is_recording('abc') and not pool.is_recording('def')
+
+
+def test_prewarm_launches_one_standby_browser(make_pool):
+    pool, launched, _ = make_pool(size=2)
+    assert pool.prewarm()
+    pool.slots[0].warm_thread.join(5)
+    assert not pool.prewarm()
+    assert len(launched) == 1 and pool.slots[0].warm()
+
+    # The warm slot is the one a meeting gets
+    assert pool.start(meeting('abc')) == (True, None)
+    assert pool.slots[0].busy and pool.slots[0].recorder.join_stats['warm_browser'] is True
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+import pytz
+from scheduler import MeetingScheduler, ManualClock, JOIN
+
+START = datetime(2026, 3, 2, 9, 0, tzinfo=pytz.UTC)
+
+
+def meeting(meeting_id, start_minutes, end_minutes, summary=None):
+    return {
+        'id': meeting_id,
+        'summary': summary or meeting_id,
+        'start': (START + timedelta(minutes=start_minutes)).isoformat(),
+        'end': (START + timedelta(minutes=end_minutes)).isoformat()
+    }
+
+
+class Recorder:
+    """Scheduler callbacks that log what happened and when"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.events = []
+
+    def warm(self, meeting):
+        self.events.append(('warm', meeting['id'], self.clock.now()))
+
+    def join(self, meeting, latency):
+        self.events.append(('join', meeting['id'], self.clock.now()))
+
+    def leave(self, meeting):
+        self.events.append(('leave', meeting['id'], self.clock.now()))
+
+
+def make_scheduler():
+    clock = ManualClock(START - timedelta(minutes=30))
+    calls = Recorder(clock)
+    scheduler = MeetingScheduler(
+        lambda: [], calls.join, calls.leave, clock=clock,
+        join_lead_minutes=5, on_warm=calls.warm, warm_lead_seconds=90
+    )
+    return scheduler, clock, calls
+
+
+def run_until(scheduler, clock, minutes):
+    """Run due actions, jumping the clock straight to each next one"""
+    end = START + timedelta(minutes=minutes)
+    while True:
+        delay = scheduler.run_pending()
+        if clock.now() + timedelta(seconds=delay) > end:
+            clock.current = end
+            scheduler.run_pending()
+            return
+        clock.advance(delay)
+
+
+def test_warm_join_and_leave_on_time():
+    scheduler, clock, calls = make_scheduler()
+    scheduler.update_meeting(meeting('a', 0, 30))
+    run_until(scheduler, clock, 60)
+    assert calls.events == [
+        ('warm', 'a', START - timedelta(minutes=5, seconds=90)),
+        ('join', 'a', START - timedelta(minutes=5)),
+        ('leave', 'a', START + timedelta(minutes=30))
+    ]
+
+
+def test_overlapping_meetings_run_in_time_order():
+    scheduler, clock, calls = make_scheduler()
+    scheduler.update_meeting(meeting('late', 20, 50))
+    scheduler.update_meeting(meeting('early', 0, 30))
+    run_until(scheduler, clock, 60)
+    assert [(kind, meeting_id) for kind, meeting_id, _ in calls.events] == [
+        ('warm', 'early'), ('join', 'early'), ('warm', 'late'), ('join', 'late'),
+        ('leave', 'early'), ('leave', 'late')
+    ]
+
+
+def test_rescheduled_meeting_only_runs_at_new_times():
+    scheduler, clock, calls = make_scheduler()
+    scheduler.update_meeting(meeting('a', 0, 30))
+    run_until(scheduler, clock, -10)
+    assert scheduler.update_meeting(meeting('a', 15, 45))
+    # The same times again change nothing
+    assert not scheduler.update_meeting(meeting('a', 15, 45))
+    run_until(scheduler, clock, 60)
+    assert calls.events == [
+        ('warm', 'a', START + timedelta(minutes=10) - timedelta(seconds=90)),
+        ('join', 'a', START + timedelta(minutes=10)),
+        ('leave', 'a', START + timedelta(minutes=45))
+    ]
+
+
+def test_cancel_before_join_skips_everything():
+    scheduler, clock, calls = make_scheduler()
+    scheduler.update_meeting(meeting('a', 0, 30))
+    scheduler.update_meeting(meeting('b', 10, 20))
+    run_until(scheduler, clock, -20)
+    scheduler.cancel_meeting('a')
+    run_until(scheduler, clock, 60)
+    assert [(kind, meeting_id) for kind, meeting_id, _ in calls.events] == [
+        ('warm', 'b'), ('join', 'b'), ('leave', 'b')
+    ]
+
+
+def test_cancel_during_meeting_leaves_immediately_once():
+    scheduler, clock, calls = make_scheduler()
+    scheduler.update_meeting(meeting('a', 0, 30))
+    run_until(scheduler, clock, 10)
+    scheduler.cancel_meeting('a')
+    run_until(scheduler, clock, 60)
+    assert calls.events[-1] == ('leave', 'a', START + timedelta(minutes=10))
+    assert [kind for kind, _, _ in calls.events].count('leave') == 1
+
+
+def test_retried_join_of_cancelled_meeting_is_skipped():
+    scheduler, clock, calls = make_scheduler()
+    scheduler.update_meeting(meeting('a', 0, 30))
+    run_until(scheduler, clock, -5)
+    # A join that was refused for lack of resources and rescheduled, like MeetingManager does
+    joined = scheduler.joined['a']
+    scheduler.schedule(clock.now() + timedelta(seconds=30), JOIN, joined)
+    scheduler.cancel_meeting('a')
+    run_until(scheduler, clock, 60)
+    assert [kind for kind, _, _ in calls.events] == ['warm', 'join', 'leave']
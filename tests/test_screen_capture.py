@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('cv2')
+pytest.importorskip('mss')
+import screen_capture
+from screen_capture import MssFrameSource, FrameConverter, ChangeDetector, clip_region, even_size
+
+
+class FakeShot:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.raw = bytearray(np.arange(width * height * 4, dtype=np.uint32).astype(np.uint8).tobytes())
+
+
+class FakeMss:
+    def __init__(self):
+        self.grabbed = []
+        self.closed = False
+
+    def grab(self, monitor):
+        self.grabbed.append(monitor)
+        self.shot = FakeShot(monitor['width'], monitor['height'])
+        return self.shot
+
+    def close(self):
+        self.closed = True
+
+
+def test_mss_source_returns_a_bgra_view_over_the_grab(monkeypatch):
+    fake = FakeMss()
+    monkeypatch.setattr(screen_capture, 'open_mss', lambda display=None: fake)
+    source = MssFrameSource(10, 20, 6, 4, display=':99')
+    source.open()
+
+    frame = source.grab()
+    assert fake.grabbed == [{'left': 10, 'top': 20, 'width': 6, 'height': 4}]
+    assert frame.shape == (4, 6, 4) and frame.dtype == np.uint8
+    # No copy: the array shares memory with the mss buffer
+    fake.shot.raw[0] = 255
+    assert frame[0, 0, 0] == 255
+
+    source.close()
+    assert fake.closed and source.sct is None
+
+
+def test_even_size_rounds_down_and_keeps_a_minimum():
+    assert even_size(1921, 1081) == (1920, 1080)
+    assert even_size(1, 1) == (2, 2)
+
+
+def test_clip_region_to_the_screen():
+    screen = (0, 0, 1920, 1080)
+    assert clip_region((100, 50, 801, 601), screen) == (100, 50, 800, 600)
+    # A window hanging off the top left corner
+    assert clip_region((-50, -30, 500, 400), screen) == (0, 0, 450, 370)
+    assert clip_region((1800, 1000, 400, 400), screen) == (1800, 1000, 120, 80)
+    assert clip_region((2000, 0, 100, 100), screen) is None
+
+
+def test_converter_scales_and_converts_into_the_slot():
+    frame = np.zeros((8, 16, 4), dtype=np.uint8)
+    frame[:, :, 1] = 200
+    converter = FrameConverter((16, 8), output_size=(8, 4), grayscale=True)
+    dst = np.empty((4, 8), dtype=np.uint8)
+    converter.convert(frame, dst)
+    # BGRA green of 200 is about 117 in grayscale
+    assert abs(int(dst[0, 0]) - 117) <= 1
+    assert (dst == dst[0, 0]).all()
+
+    converter = FrameConverter((16, 8))
+    dst = np.empty((8, 16, 3), dtype=np.uint8)
+    converter.convert(frame, dst)
+    assert converter.resized is None
+    assert (dst[:, :, 1] == 200).all() and not dst[:, :, 0].any()
+
+
+def test_converter_resizes_bgr_frames_directly():
+    frame = np.full((8, 16, 3), 40, dtype=np.uint8)
+    converter = FrameConverter((16, 8), output_size=(8, 4), channels=3)
+    assert converter.code is None
+    dst = np.empty((4, 8, 3), dtype=np.uint8)
+    converter.convert(frame, dst)
+    assert (dst == 40).all()
+
+
+def frame(value=0):
+    return np.full((128, 128, 4), value, dtype=np.uint8)
+
+
+def test_change_detector_compares_against_the_accepted_frame():
+    detector = ChangeDetector(threshold=3.0, step=4, block=16)
+    assert detector.changed(frame())
+    detector.accept()
+
+    # Sensor noise below the threshold everywhere is not a change
+    assert not detector.changed(frame(2))
+    # Small drifts that are never accepted add up against the reference
+    assert detector.changed(frame(5))
+    detector.accept()
+    assert not detector.changed(frame(5))
+
+
+def test_change_detector_catches_a_change_in_one_block():
+    detector = ChangeDetector(threshold=3.0, step=4, block=16)
+    detector.changed(frame())
+    detector.accept()
+
+    # A 64x64 patch is one 16x16 block of the subsampled grid
+    moved = frame()
+    moved[64:128, 0:64, 1] = 100
+    assert detector.changed(moved)
+    # Only the sampled channel counts
+    other = frame()
+    other[:, :, 0] = 255
+    assert not detector.changed(other)
+
+
+def test_change_detector_treats_a_resize_as_a_change():
+    detector = ChangeDetector()
+    detector.changed(frame())
+    detector.accept()
+    assert detector.changed(np.zeros((256, 128, 4), dtype=np.uint8))
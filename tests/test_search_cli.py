@@ -0,0 +1,46 @@
+import sys
+import pytest
+
+pytest.importorskip('dotenv')
+
+# Modules only the recording path needs; search must not import them
+RECORDING_STACK = [
+    'selenium', 'pyautogui', 'pyaudio', 'googleapiclient', 'google_auth_oauthlib',
+    'calendar_service', 'meeting_recorder', 'recorder_pool', 'postprocess'
+]
+
+
+@pytest.fixture
+def main(monkeypatch, tmp_path):
+    # main logs to meet_notes.log in the working directory
+    monkeypatch.chdir(tmp_path)
+    for name in RECORDING_STACK:
+        monkeypatch.setitem(sys.modules, name, None)
+    monkeypatch.delitem(sys.modules, 'main', raising=False)
+    import main
+    yield main
+    sys.modules.pop('main', None)
+
+
+def test_search_imports_without_recording_stack(main):
+    args = main.parse_args(['search', 'roadmap', '--since', '2025-03-01', '--until', '2025-03-02T09:30+05:30'])
+    assert args.query == ['roadmap']
+    assert args.since == '2025-03-01T00:00:00+00:00'
+    assert args.until == '2025-03-02T04:00:00+00:00'
+
+
+@pytest.mark.parametrize('option', ['--since', '--until'])
+def test_invalid_time_is_an_argument_error(main, capsys, option):
+    with pytest.raises(SystemExit) as exit_info:
+        main.parse_args(['search', option, 'yesterday'])
+    assert exit_info.value.code == 2
+    assert f"argument {option}: invalid ISO time: 'yesterday'" in capsys.readouterr().err
+
+
+def test_recorder_slots_need_isolated_browsers(main, monkeypatch, caplog):
+    monkeypatch.setattr(main, 'RECORDER_SLOTS', 3)
+    monkeypatch.setattr(main, 'RECORDER_ISOLATED', False)
+    assert main.recorder_slots() == 1
+    assert 'same screen and sound card' in caplog.text
+    monkeypatch.setattr(main, 'RECORDER_ISOLATED', True)
+    assert main.recorder_slots() == 3
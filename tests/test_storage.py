@@ -0,0 +1,103 @@
+import os
+import pytest
+from storage import StorageManager, FULL, AUDIO_ONLY, HOT, COLD
+
+
+def make_meeting(root, name, video_bytes=1000, audio_bytes=100):
+    meeting_dir = os.path.join(root, name)
+    os.makedirs(os.path.join(meeting_dir, 'video'))
+    os.makedirs(os.path.join(meeting_dir, 'audio'))
+    with open(os.path.join(meeting_dir, 'video', 'segment_00000.avi'), 'wb') as f:
+        f.write(bytes(video_bytes))
+    with open(os.path.join(meeting_dir, 'audio', 'segment_00000.wav'), 'wb') as f:
+        f.write(bytes(audio_bytes))
+    return os.path.normpath(meeting_dir)
+
+
+@pytest.fixture
+def recordings(tmp_path):
+    root = tmp_path / 'recordings'
+    root.mkdir()
+    # Oldest first by the timestamp in the directory name
+    dirs = [make_meeting(str(root), f"{name}_20260301_0{hour}0000") for hour, name in enumerate('abc', 1)]
+    return str(root), dirs
+
+
+def manager(tmp_path, root, **kwargs):
+    return StorageManager(str(tmp_path / 'storage.db'), root, **kwargs)
+
+
+def levels(storage):
+    with storage.lock:
+        rows = storage.conn.execute("SELECT meeting_dir, tier, level FROM meetings ORDER BY started_at").fetchall()
+    return [(os.path.basename(row['meeting_dir'])[0], row['tier'], row['level']) for row in rows]
+
+
+def test_quota_drops_video_in_lru_order_before_removing_meetings(tmp_path, recordings):
+    root, (a, b, c) = recordings
+    storage = manager(tmp_path, root, quota_bytes=2500)
+    storage.refresh()
+    # a was searched recently, so b is the least recently used
+    storage.touch(a)
+
+    assert storage.enforce() == 1
+    assert levels(storage) == [('a', HOT, FULL), ('b', HOT, AUDIO_ONLY), ('c', HOT, FULL)]
+    assert not os.path.exists(os.path.join(b, 'video'))
+    assert os.path.exists(os.path.join(b, 'audio', 'segment_00000.wav'))
+    storage.close()
+
+
+def test_age_policy_moves_oldest_to_cold_after_all_video_is_gone(tmp_path, recordings):
+    root, (a, b, c) = recordings
+    cold = str(tmp_path / 'cold')
+    # Room for two meetings' audio and manifests, not three
+    storage = manager(tmp_path, root, quota_bytes=400, policy='age', cold_dir=cold)
+    storage.refresh()
+
+    storage.enforce()
+    # Video goes from every meeting first, then the oldest meeting leaves the hot tier
+    assert levels(storage) == [('a', COLD, AUDIO_ONLY), ('b', HOT, AUDIO_ONLY), ('c', HOT, AUDIO_ONLY)]
+    assert os.path.isdir(os.path.join(cold, os.path.basename(a)))
+    assert storage.usage(HOT)['bytes'] <= 400
+    storage.close()
+
+
+def test_busy_meetings_are_never_evicted(tmp_path, recordings):
+    root, (a, b, c) = recordings
+    storage = manager(tmp_path, root, quota_bytes=150, is_busy=lambda meeting_dir: meeting_dir != c)
+    storage.refresh()
+
+    storage.enforce()
+    assert levels(storage) == [('a', HOT, FULL), ('b', HOT, FULL)]
+    assert not os.path.exists(c)
+    storage.close()
+
+
+def test_plan_reads_the_index_without_enforcing(tmp_path, recordings, monkeypatch):
+    root, dirs = recordings
+    storage = manager(tmp_path, root, quota_bytes=10 ** 6, video_bytes_per_second=100, audio_bytes_per_second=10)
+    storage.refresh()
+    monkeypatch.setattr(storage, 'enforce', lambda: pytest.fail("plan() must not enforce"))
+    monkeypatch.setattr(storage, 'refresh', lambda full=False: pytest.fail("plan() must not walk the disk"))
+
+    used = storage.usage(HOT)['bytes']
+    assert storage.plan(3600) == (FULL, 110 * 3600, 10 ** 6 - used)
+    assert storage.plan(9100)[0] == AUDIO_ONLY
+    assert storage.plan(10 ** 5)[0] is None
+    storage.close()
+
+
+def test_periodic_enforce_runs_in_the_background(tmp_path, recordings):
+    root, dirs = recordings
+    storage = manager(tmp_path, root, quota_bytes=2500)
+    storage.start(0.05)
+    try:
+        for _ in range(100):
+            if storage.usage(HOT)['bytes'] and storage.usage(HOT)['bytes'] <= 2500:
+                break
+            storage.stopped.wait(0.05)
+        assert 0 < storage.usage(HOT)['bytes'] <= 2500
+    finally:
+        storage.stop()
+    assert storage.thread is None
+    storage.close()
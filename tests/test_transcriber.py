@@ -0,0 +1,67 @@
+import os
+import json
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import Future
+import pytest
+
+pytest.importorskip('soundfile')
+pytest.importorskip('speech_recognition')
+from transcriber import Transcriber, recording_offset, align_speakers
+from transcript_store import CAPTIONS_FILE, SPEECH_TRANSCRIPT_FILE
+from manifest import RecordingManifest
+
+
+def done(result):
+    future = Future()
+    if isinstance(result, Exception):
+        future.set_exception(result)
+    else:
+        future.set_result(result)
+    return future
+
+
+def test_recording_offset_follows_stored_spans():
+    assert recording_offset({'start_offset': 300.0}, 12.5) == 312.5
+    # Speech-only segments hold 2 s from 10 s and 3 s from 20 s of recording time
+    segment = {'start_offset': 10.0, 'spans': [[10.0, 2.0], [20.0, 3.0]]}
+    assert recording_offset(segment, 1.0) == 11.0
+    assert recording_offset(segment, 3.0) == 21.0
+    # Past the end clamps to the end of the last span
+    assert recording_offset(segment, 9.0) == 23.0
+
+
+def test_align_speakers_picks_the_speaker_heard_most():
+    base = datetime(2026, 10, 17, 10, 0, tzinfo=timezone.utc)
+    captions = [(base + timedelta(seconds=s), speaker, 'x')
+                for s, speaker in [(1, 'Alice'), (2, 'Bob'), (3, 'Bob'), (30, 'Carol')]]
+    segments = [
+        {'start': 0.0, 'end': 4.0, 'timestamp': base.isoformat(), 'speaker': None},
+        {'start': 10.0, 'end': 12.0, 'timestamp': (base + timedelta(seconds=10)).isoformat(), 'speaker': None},
+        {'start': 0.0, 'end': 1.0, 'timestamp': None, 'speaker': None},
+    ]
+    align_speakers(segments, captions)
+    assert [segment['speaker'] for segment in segments] == ['Bob', None, None]
+
+
+def test_collect_orders_results_and_writes_the_transcript(tmp_path):
+    meeting_dir = str(tmp_path)
+    RecordingManifest(meeting_dir).set('audio_started_at', '2026-10-17T10:00:00+00:00')
+    with open(os.path.join(meeting_dir, CAPTIONS_FILE), 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'timestamp': '2026-10-17T10:00:06+00:00', 'speaker': 'Alice', 'text': 'Hi'}) + '\n')
+
+    transcriber = Transcriber(backend='sphinx', workers=1)
+    transcriber.pending = [
+        (5.0, 7.0, done('hello everyone')),
+        (1.0, 2.0, done('')),
+        (3.0, 4.0, done(RuntimeError('decoder crashed'))),
+        (60.0, 61.5, done('see you')),
+    ]
+    segments = transcriber.collect(meeting_dir)
+
+    assert [(s['start'], s['text'], s['speaker']) for s in segments] == [
+        (5.0, 'hello everyone', 'Alice'), (60.0, 'see you', None)
+    ]
+    assert segments[0]['timestamp'] == '2026-10-17T10:00:05+00:00'
+    assert transcriber.pending == []
+    with open(os.path.join(meeting_dir, SPEECH_TRANSCRIPT_FILE), encoding='utf-8') as f:
+        assert json.load(f) == {'backend': 'sphinx', 'segments': segments}
@@ -0,0 +1,108 @@
+import os
+import json
+import sqlite3
+import pytest
+
+from transcript_store import TranscriptIndex, CAPTIONS_FILE, SPEECH_TRANSCRIPT_FILE
+
+
+def caption(second, speaker, text):
+    return json.dumps({'timestamp': f'2026-10-17T10:00:{second:02d}+00:00', 'speaker': speaker,
+                       'text': text, 'offset': float(second)}) + '\n'
+
+
+@pytest.fixture
+def meeting_dir(tmp_path):
+    path = tmp_path / 'abc-defg-hij_20261017_100000'
+    path.mkdir()
+    return str(path)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = TranscriptIndex(str(tmp_path / 'transcripts.db'))
+    yield index
+    index.close()
+
+
+def append(meeting_dir, data):
+    with open(os.path.join(meeting_dir, CAPTIONS_FILE), 'a', encoding='utf-8') as f:
+        f.write(data)
+
+
+def texts(index):
+    return [row['text'] for row in index.search(source='caption')]
+
+
+def test_appended_captions_are_indexed_once(index, meeting_dir):
+    append(meeting_dir, caption(1, 'Alice', 'Roadmap first') + caption(2, 'Bob', 'Sounds good'))
+    assert index.index_meeting(meeting_dir) == 2
+    assert index.index_meeting(meeting_dir) == 0
+
+    # A partly written line waits until it is complete
+    partial = caption(5, 'Alice', 'Budget next')
+    append(meeting_dir, caption(4, 'Bob', 'Fine by me') + partial[:20])
+    assert index.index_meeting(meeting_dir) == 1
+    append(meeting_dir, partial[20:])
+    assert index.index_meeting(meeting_dir) == 1
+
+    assert texts(index) == ['Roadmap first', 'Sounds good', 'Fine by me', 'Budget next']
+    assert [row['meeting_id'] for row in index.search(text='roadmap')] == ['abc-defg-hij']
+
+
+def test_replaced_captions_file_is_reindexed(index, meeting_dir):
+    append(meeting_dir, caption(1, 'Alice', 'Old line') + caption(2, 'Bob', 'Another old line'))
+    index.index_meeting(meeting_dir)
+
+    # Same directory, a new file that is longer than what was indexed
+    replacement = os.path.join(meeting_dir, 'captions.tmp')
+    with open(replacement, 'w', encoding='utf-8') as f:
+        f.write(caption(1, 'Alice', 'Rewritten opening line') + caption(2, 'Bob', 'Rewritten reply')
+                + caption(3, 'Carol', 'New line'))
+    os.replace(replacement, os.path.join(meeting_dir, CAPTIONS_FILE))
+
+    assert index.index_meeting(meeting_dir) == 3
+    assert texts(index) == ['Rewritten opening line', 'Rewritten reply', 'New line']
+    assert index.search(text='old') == []
+
+
+def test_truncated_captions_file_is_reindexed(index, meeting_dir):
+    append(meeting_dir, caption(1, 'Alice', 'First') + caption(2, 'Bob', 'Second'))
+    index.index_meeting(meeting_dir)
+
+    with open(os.path.join(meeting_dir, CAPTIONS_FILE), 'w', encoding='utf-8') as f:
+        f.write(caption(5, 'Carol', 'Only'))
+    assert index.index_meeting(meeting_dir) == 1
+    assert texts(index) == ['Only']
+
+
+def test_speech_transcript_is_reindexed_when_rewritten(index, meeting_dir):
+    path = os.path.join(meeting_dir, SPEECH_TRANSCRIPT_FILE)
+
+    def write(segments, mtime):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'segments': segments}, f)
+        os.utime(path, (mtime, mtime))
+
+    write([{'text': 'hello there', 'start': 0.0, 'end': 1.0}], 1000)
+    assert index.index_meeting(meeting_dir) == 1
+    assert index.index_meeting(meeting_dir) == 0
+
+    write([{'text': 'hello there', 'start': 0.0, 'end': 1.0}, {'text': 'general', 'start': 1.0, 'end': 2.0}], 2000)
+    assert index.index_meeting(meeting_dir) == 2
+    assert [row['text'] for row in index.search(source='speech')] == ['hello there', 'general']
+
+
+def test_index_without_head_column_is_migrated(tmp_path, meeting_dir):
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sources (path TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+                 "mtime REAL NOT NULL, position INTEGER NOT NULL)")
+    conn.commit()
+    conn.close()
+
+    index = TranscriptIndex(path)
+    append(meeting_dir, caption(1, 'Alice', 'Still works'))
+    assert index.index_meeting(meeting_dir) == 1
+    assert index.index_meeting(meeting_dir) == 0
+    index.close()
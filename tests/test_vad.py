@@ -0,0 +1,47 @@
+import numpy as np
+from vad import EnergyVAD, StreamingVAD, benchmark, synthetic_signal, runs
+
+SAMPLE_RATE = 16000
+
+
+def test_benchmark_accuracy_and_cost():
+    result = benchmark(SAMPLE_RATE, seconds=600, seed=0)
+    assert result['accuracy'] >= 0.9
+    assert result['recall'] >= 0.95
+    assert result['precision'] >= 0.85
+    # About 0.3 s per audio hour on a laptop; leave room for slow CI machines
+    assert result['seconds_per_audio_hour'] <= 5.0
+
+
+def test_streaming_matches_truth_across_blocks():
+    samples, truth = synthetic_signal(SAMPLE_RATE, 120, seed=1)
+    streaming = StreamingVAD(EnergyVAD(SAMPLE_RATE))
+    block = SAMPLE_RATE // 10
+    for start in range(0, len(samples), block):
+        streaming.process(samples[start:start + block])
+    segments = streaming.finish()
+
+    starts, _ = runs(truth)
+    assert len(segments) >= len(starts) * 0.8
+    # Segments start at the speech onset, not min_speech frames into it
+    found = np.array([segment[0] for segment in segments])
+    for onset in starts / SAMPLE_RATE:
+        assert np.min(np.abs(found - onset)) < 0.05
+
+
+def test_streaming_includes_pre_roll_split_over_blocks():
+    vad = EnergyVAD(SAMPLE_RATE)
+    rng = np.random.default_rng(2)
+    silence = rng.normal(0, 30, SAMPLE_RATE).astype(np.int16)
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    tone = (3000 * np.sin(2 * np.pi * 150 * t)).astype(np.int16)
+    streaming = StreamingVAD(vad)
+    streaming.process(silence)
+    # Speech starts at the end of one block and reaches min_speech in the next
+    first = streaming.process(tone[:vad.frame_size * 2])
+    second = streaming.process(tone[vad.frame_size * 2:])
+    segments = streaming.finish()
+
+    assert not first.any()
+    assert second[:vad.min_speech].all()
+    assert segments[0][0] == 1.0
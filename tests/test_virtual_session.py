@@ -0,0 +1,84 @@
+import os
+import subprocess
+import pytest
+
+import virtual_session
+from virtual_session import VirtualSession, PulseSink
+
+
+class FakePactl:
+    """Answers pactl load-module/unload-module like a running PulseAudio"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, args, **kwargs):
+        self.calls.append(args)
+        return subprocess.CompletedProcess(args, 0, stdout='42\n', stderr='')
+
+
+@pytest.fixture
+def pactl(monkeypatch):
+    fake = FakePactl()
+    monkeypatch.setattr(virtual_session.shutil, 'which', lambda name: f'/usr/bin/{name}')
+    monkeypatch.setattr(virtual_session.subprocess, 'run', fake)
+    return fake
+
+
+def test_sink_is_loaded_and_unloaded(pactl):
+    sink = PulseSink('meetnotes_test')
+    sink.start()
+    assert sink.module == '42' and sink.monitor == 'meetnotes_test.monitor'
+    assert pactl.calls[0][:3] == ['pactl', 'load-module', 'module-null-sink']
+    assert 'sink_name=meetnotes_test' in pactl.calls[0]
+
+    sink.stop()
+    assert pactl.calls[-1] == ['pactl', 'unload-module', '42']
+    assert sink.module is None
+
+
+def test_headless_session_gets_its_own_sink_and_environment(pactl, monkeypatch):
+    monkeypatch.setenv('PULSE_SINK', 'speakers')
+    monkeypatch.delenv('DISPLAY', raising=False)
+    session = VirtualSession(display=False).start()
+    assert session.display_name is None
+    assert session.audio_device.endswith('.monitor')
+
+    with session.environment():
+        assert os.environ['PULSE_SINK'] == session.sink.name
+        assert 'DISPLAY' not in os.environ
+    assert os.environ['PULSE_SINK'] == 'speakers'
+
+    session.stop()
+    assert session.sink is None
+
+
+def test_sessions_get_different_sinks(pactl):
+    first = VirtualSession(display=False).start()
+    second = VirtualSession(display=False).start()
+    assert first.sink.name != second.sink.name
+
+
+def test_missing_pulseaudio_falls_back_to_the_default_input(monkeypatch):
+    monkeypatch.setattr(virtual_session.shutil, 'which', lambda name: None)
+    session = VirtualSession(display=False).start()
+    assert session.sink is None and session.audio_device is None
+
+
+def test_display_environment_is_restored(monkeypatch):
+    monkeypatch.setenv('DISPLAY', ':0')
+    session = VirtualSession(audio=False, display=False)
+    session.display = virtual_session.VirtualDisplay()
+    session.display.display = ':99'
+
+    with pytest.raises(RuntimeError):
+        with session.environment():
+            assert os.environ['DISPLAY'] == ':99'
+            raise RuntimeError('browser failed to launch')
+    assert os.environ['DISPLAY'] == ':0'
+
+
+def test_display_needs_xvfb(monkeypatch):
+    monkeypatch.setattr(virtual_session.shutil, 'which', lambda name: None)
+    with pytest.raises(RuntimeError, match='Xvfb'):
+        virtual_session.VirtualDisplay().start()
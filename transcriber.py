@@ -0,0 +1,202 @@
+import os
+import json
+import bisect
+import importlib.util
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import soundfile as sf
+import speech_recognition as sr
+from manifest import load_manifest
+from transcript_store import read_captions, SPEECH_TRANSCRIPT_FILE
+from vad import EnergyVAD
+
+logger = logging.getLogger(__name__)
+
+
+def _recognize_sphinx(recognizer, audio):
+    return recognizer.recognize_sphinx(audio)
+
+
+def _recognize_whisper(recognizer, audio):
+    return recognizer.recognize_whisper(audio, model=os.getenv('WHISPER_MODEL', 'base'))
+
+
+def _recognize_vosk(recognizer, audio):
+    return json.loads(recognizer.recognize_vosk(audio)).get('text', '')
+
+
+# Offline speech_recognition backends, selected by name in the worker processes
+RECOGNIZER_BACKENDS = {
+    'sphinx': _recognize_sphinx,
+    'whisper': _recognize_whisper,
+    'vosk': _recognize_vosk
+}
+# Package each backend needs; none of them is in requirements.txt
+BACKEND_MODULES = {
+    'sphinx': 'pocketsphinx',
+    'whisper': 'whisper',
+    'vosk': 'vosk'
+}
+_missing_warned = set()
+
+
+def backend_available(backend):
+    """Whether a backend's package is installed; warns once per backend if not"""
+    module = BACKEND_MODULES.get(backend)
+    if module and importlib.util.find_spec(module) is not None:
+        return True
+    if backend not in _missing_warned:
+        _missing_warned.add(backend)
+        logger.warning(f"Speech-to-text is off: the {backend} backend needs the '{module}' package "
+                       f"(pip install {module})" if module else f"Unknown transcription backend: {backend}")
+    return False
+
+
+def transcribe_chunk(backend, pcm, sample_rate):
+    """Transcribe one chunk of 16-bit mono PCM (runs in a worker process)"""
+    recognizer = sr.Recognizer()
+    audio = sr.AudioData(pcm, sample_rate, 2)
+    try:
+        return RECOGNIZER_BACKENDS[backend](recognizer, audio).strip()
+    except sr.UnknownValueError:
+        return ''
+
+
+def read_mono(path):
+    """Read an audio file as 16-bit mono samples"""
+    samples, sample_rate = sf.read(path, dtype='int16', always_2d=True)
+    if samples.shape[1] > 1:
+        samples = samples.mean(axis=1).astype(np.int16)
+    else:
+        samples = samples[:, 0]
+    return samples, sample_rate
+
+
+def recording_offset(segment, seconds):
+    """Map a position in a segment file to seconds from the start of the recording"""
+    spans = segment.get('spans')
+    if not spans:
+        return segment['start_offset'] + seconds
+    for start, duration in spans:
+        if seconds <= duration:
+            return start + seconds
+        seconds -= duration
+    start, duration = spans[-1]
+    return start + duration
+
+
+def load_captions(meeting_dir):
+    """Load (datetime, speaker, text) captions for a meeting, sorted by time"""
+    captions = []
+    for record in read_captions(meeting_dir):
+        if not record.get('timestamp') or not record.get('text'):
+            continue
+        try:
+            timestamp = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00'))
+        except ValueError:
+            continue
+        captions.append((timestamp, record.get('speaker'), record['text']))
+    captions.sort(key=lambda caption: caption[0])
+    return captions
+
+
+def align_speakers(segments, captions, slack=2.0):
+    """Attach the caption speaker heard most during each speech segment"""
+    times = [caption[0] for caption in captions]
+    for segment in segments:
+        if not segment.get('timestamp'):
+            continue
+        start = datetime.fromisoformat(segment['timestamp'])
+        end = start + timedelta(seconds=segment['end'] - segment['start'])
+        lo = bisect.bisect_left(times, start - timedelta(seconds=slack))
+        hi = bisect.bisect_right(times, end + timedelta(seconds=slack))
+        speakers = [captions[i][1] for i in range(lo, hi)]
+        if speakers:
+            segment['speaker'] = max(set(speakers), key=speakers.count)
+    return segments
+
+
+class Transcriber:
+    """Offline speech-to-text over a meeting's audio segments using a process pool"""
+
+    def __init__(self, backend='sphinx', workers=None):
+        if backend not in RECOGNIZER_BACKENDS:
+            raise ValueError(f"Unknown transcription backend: {backend}")
+        self.backend = backend
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.executor = None
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def _executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+    def submit_segment(self, meeting_dir, segment):
+        """Queue one audio segment's speech chunks for transcription"""
+        path = os.path.join(meeting_dir, segment['file'])
+        samples, sample_rate = read_mono(path)
+        executor = self._executor()
+        jobs = []
+        for start, end in EnergyVAD(sample_rate).speech_chunks(samples):
+            future = executor.submit(transcribe_chunk, self.backend, samples[start:end].tobytes(), sample_rate)
+            jobs.append((recording_offset(segment, start / sample_rate),
+                         recording_offset(segment, end / sample_rate), future))
+        with self.lock:
+            self.pending.extend(jobs)
+        return len(jobs)
+
+    def collect(self, meeting_dir):
+        """Wait for queued chunks and write the aligned transcript for the meeting"""
+        manifest = load_manifest(meeting_dir) or {}
+        audio_started_at = manifest.get('audio_started_at')
+        started = datetime.fromisoformat(audio_started_at) if audio_started_at else None
+
+        with self.lock:
+            jobs, self.pending = self.pending, []
+
+        segments = []
+        for start, end, future in sorted(jobs, key=lambda job: job[0]):
+            try:
+                text = future.result()
+            except Exception as e:
+                logger.error(f"Error transcribing chunk at {start:.1f}s: {e}")
+                continue
+            if not text:
+                continue
+            segments.append({
+                'start': round(start, 3),
+                'end': round(end, 3),
+                'timestamp': (started + timedelta(seconds=start)).isoformat() if started else None,
+                'speaker': None,
+                'text': text
+            })
+
+        align_speakers(segments, load_captions(meeting_dir))
+        output_path = os.path.join(meeting_dir, SPEECH_TRANSCRIPT_FILE)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({'backend': self.backend, 'segments': segments}, f, indent=2)
+        logger.info(f"Saved {len(segments)} transcribed segments to {output_path}")
+        return segments
+
+    def transcribe_meeting(self, meeting_dir):
+        """Transcribe all audio segments of a finished meeting"""
+        manifest = load_manifest(meeting_dir)
+        if not manifest:
+            logger.warning(f"No manifest in {meeting_dir}, nothing to transcribe")
+            return []
+        for segment in manifest['streams'].get('audio', []):
+            try:
+                self.submit_segment(meeting_dir, segment)
+            except Exception as e:
+                logger.error(f"Error reading audio segment {segment['file']}: {e}")
+        return self.collect(meeting_dir)
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,454 @@
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from calendar_store import to_utc_iso
+from manifest import load_manifest
+
+logger = logging.getLogger(__name__)
+
+CAPTIONS_FILE = 'captions.jsonl'
+SPEECH_TRANSCRIPT_FILE = 'speech_transcript.json'
+# Plain-text captions written by older versions
+LEGACY_CAPTIONS_FILE = 'transcription.txt'
+# The post-processed MP4 and the single-file screen recordings of older versions; both
+# share the timeline of the video segments
+FINAL_VIDEO = 'meeting.mp4'
+LEGACY_VIDEO = 'screen_recording.avi'
+# Bytes at the start of an appended file compared between runs to notice it was replaced
+HEAD_BYTES = 4096
+CAPTION_LINE = re.compile(r'^\[(?P<timestamp>[^\]]+)\] (?P<speaker>[^:]+): (?P<text>.*)$')
+
+
+def meeting_id_from_dir(meeting_dir):
+    """Meeting id of a '<meeting_id>_<YYYYmmdd>_<HHMMSS>' recording directory"""
+    metadata_path = os.path.join(meeting_dir, 'metadata.json')
+    if os.path.exists(metadata_path):
+        try:
+            with open(metadata_path, encoding='utf-8') as f:
+                return json.load(f)['meeting_id']
+        except Exception:
+            pass
+    name = os.path.basename(os.path.normpath(meeting_dir))
+    parts = name.rsplit('_', 2)
+    return parts[0] if len(parts) == 3 else name
+
+
+def parse_legacy_line(line):
+    match = CAPTION_LINE.match(line.strip())
+    if not match:
+        return None
+    return {'timestamp': match['timestamp'], 'speaker': match['speaker'], 'text': match['text'], 'offset': None}
+
+
+def read_captions(meeting_dir):
+    """A meeting's caption records, from captions.jsonl or an older transcription.txt"""
+    path = os.path.join(meeting_dir, CAPTIONS_FILE)
+    records = []
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue  # A line cut short by a crash
+        return records
+    path = os.path.join(meeting_dir, LEGACY_CAPTIONS_FILE)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            records = [record for record in map(parse_legacy_line, f) if record]
+    return records
+
+
+def seconds_between(start, timestamp):
+    if not start or not timestamp:
+        return None
+    try:
+        start = datetime.fromisoformat(start.replace('Z', '+00:00'))
+        return (datetime.fromisoformat(timestamp.replace('Z', '+00:00')) - start).total_seconds()
+    except (ValueError, TypeError):
+        return None
+
+
+def segment_position(segments, seconds):
+    """The segment file and position in it that hold a moment of the recording
+
+    Works for the audio and video segments of a manifest. The inverse of
+    transcriber.recording_offset for audio; a moment in dropped silence maps
+    to the start of the next stored audio.
+    """
+    for segment in segments:
+        spans = segment.get('spans') or [[segment['start_offset'], segment['duration']]]
+        position = 0.0
+        for start, duration in spans:
+            if seconds < start + duration:
+                return segment['file'], round(position + max(seconds - start, 0.0), 3)
+            position += duration
+    return None, None
+
+
+def media_offsets(meeting_dir, timestamp, manifest=None):
+    """Where a UTC timestamp falls in a meeting's video and audio files
+
+    Returns {'video': (path, seconds), 'audio': (path, seconds)}, with None
+    for a stream that has no start time in the manifest or doesn't cover
+    the timestamp.
+    """
+    manifest = manifest if manifest is not None else (load_manifest(meeting_dir) or {})
+    offsets = {'video': None, 'audio': None}
+    video_seconds = seconds_between(manifest.get('video_started_at'), timestamp)
+    if video_seconds is not None and video_seconds >= 0:
+        path, seconds = None, round(video_seconds, 3)
+        for name in (FINAL_VIDEO, LEGACY_VIDEO):
+            if os.path.exists(os.path.join(meeting_dir, name)):
+                path = name
+                break
+        else:
+            path, seconds = segment_position(manifest.get('streams', {}).get('video', []), video_seconds)
+        if path and os.path.exists(os.path.join(meeting_dir, path)):  # Gone if the video was removed for space
+            offsets['video'] = (os.path.join(meeting_dir, path), seconds)
+    audio_seconds = seconds_between(manifest.get('audio_started_at'), timestamp)
+    if audio_seconds is not None and audio_seconds >= 0:
+        path, seconds = segment_position(manifest.get('streams', {}).get('audio', []), audio_seconds)
+        if path:
+            offsets['audio'] = (os.path.join(meeting_dir, path), seconds)
+    return offsets
+
+
+def fts_query(text):
+    """Quote each word so user input can't be read as FTS5 syntax; all words must match"""
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+class CaptionWriter:
+    """Buffered JSONL writer for one meeting's captions
+
+    Records go through a buffered file; flushes to disk and fsyncs are
+    batched every fsync_interval seconds rather than done per caption.
+    After each sync the new lines are added to the transcript index.
+    """
+
+    def __init__(self, meeting_dir, index=None, fsync_interval=10.0):
+        self.meeting_dir = meeting_dir
+        self.path = os.path.join(meeting_dir, CAPTIONS_FILE)
+        self.index = index
+        self.fsync_interval = fsync_interval
+        self.file = open(self.path, 'a', encoding='utf-8', buffering=1 << 16)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.written = 0
+        self.syncs = 0
+        self.last_sync = time.monotonic()
+
+    def write(self, records):
+        with self.lock:
+            for record in records:
+                self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.pending += len(records)
+            self.written += len(records)
+        if time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        with self.lock:
+            if not self.file or not self.pending:
+                self.last_sync = time.monotonic()
+                return
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = 0
+            self.syncs += 1
+            self.last_sync = time.monotonic()
+        if self.index:
+            try:
+                self.index.index_meeting(self.meeting_dir)
+            except Exception as e:
+                logger.error(f"Error indexing captions: {e}")
+
+    def close(self):
+        self.sync()
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+        logger.info(f"Wrote {self.written} captions to {self.path} in {self.syncs} syncs")
+
+
+class TranscriptIndex:
+    """SQLite index of captions and speech transcripts across all meetings
+
+    Every caption and transcribed speech segment is a row keyed by meeting,
+    timestamp and speaker, with an FTS5 full-text index over the text.
+    index_meeting() is incremental: appended JSONL is read from where the
+    last run stopped, and rewritten files are reindexed only if they changed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            self.conn.executescript("""
+                PRAGMA journal_mode = WAL;
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY,
+                    meeting_dir TEXT NOT NULL,
+                    meeting_id TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    timestamp TEXT,
+                    speaker TEXT,
+                    text TEXT NOT NULL,
+                    start_offset REAL,
+                    end_offset REAL
+                );
+                CREATE INDEX IF NOT EXISTS entries_by_meeting ON entries (meeting_id, timestamp);
+                CREATE INDEX IF NOT EXISTS entries_by_speaker ON entries (speaker, timestamp);
+                CREATE INDEX IF NOT EXISTS entries_by_time ON entries (timestamp);
+                CREATE INDEX IF NOT EXISTS entries_by_source ON entries (meeting_dir, source);
+                CREATE TABLE IF NOT EXISTS sources (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    position INTEGER NOT NULL,
+                    head TEXT
+                );
+            """)
+            columns = [row['name'] for row in self.conn.execute("PRAGMA table_info(sources)")]
+            if 'head' not in columns:
+                # Indexes created before replaced files were detected by content
+                self.conn.execute("ALTER TABLE sources ADD COLUMN head TEXT")
+        self.fts = self._create_fts()
+
+    def _create_fts(self):
+        try:
+            with self.conn:
+                self.conn.executescript("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts
+                        USING fts5(text, speaker, content='entries', content_rowid='id');
+                    CREATE TRIGGER IF NOT EXISTS entries_fts_insert AFTER INSERT ON entries BEGIN
+                        INSERT INTO entries_fts (rowid, text, speaker) VALUES (new.id, new.text, new.speaker);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS entries_fts_delete AFTER DELETE ON entries BEGIN
+                        INSERT INTO entries_fts (entries_fts, rowid, text, speaker)
+                            VALUES ('delete', old.id, old.text, old.speaker);
+                    END;
+                """)
+            return True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite has no FTS5 ({e}), keyword search will scan the text")
+            return False
+
+    def _source_state(self, path):
+        row = self.conn.execute("SELECT * FROM sources WHERE path = ?", (path,)).fetchone()
+        return dict(row) if row else None
+
+    def _set_source_state(self, path, size, mtime, position, head=None):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sources (path, size, mtime, position, head) VALUES (?, ?, ?, ?, ?)",
+            (path, size, mtime, position, head)
+        )
+
+    @staticmethod
+    def _head(f, position):
+        """Digest of the start of an indexed file, up to the position already read"""
+        f.seek(0)
+        return hashlib.sha1(f.read(min(position, HEAD_BYTES))).hexdigest()
+
+    def _insert(self, meeting_dir, meeting_id, source, rows):
+        self.conn.executemany(
+            """INSERT INTO entries (meeting_dir, meeting_id, source, timestamp, speaker, text, start_offset, end_offset)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            [(meeting_dir, meeting_id, source) + row for row in rows]
+        )
+
+    @staticmethod
+    def _caption_row(record):
+        text = (record.get('text') or '').strip()
+        if not text:
+            return None
+        timestamp = record.get('timestamp')
+        try:
+            timestamp = to_utc_iso(timestamp) if timestamp else None
+        except ValueError:
+            pass
+        offset = record.get('offset')
+        return (timestamp, record.get('speaker'), text, offset, offset)
+
+    def _index_appended(self, meeting_dir, meeting_id, path, source, parse):
+        """Index the complete lines appended to a file since the last run"""
+        stat = os.stat(path)
+        state = self._source_state(path)
+        position = state['position'] if state else 0
+        with open(path, 'rb') as f:
+            if position and (position > stat.st_size or
+                             (state['head'] and self._head(f, position) != state['head'])):
+                # The file was replaced: start over
+                self.conn.execute("DELETE FROM entries WHERE meeting_dir = ? AND source = ?", (meeting_dir, source))
+                position = 0
+            elif state and position == stat.st_size:
+                return 0
+            f.seek(position)
+            data = f.read()
+            end = data.rfind(b'\n') + 1  # Leave a partly written last line for next time
+            head = self._head(f, position + end)
+        rows = []
+        for line in data[:end].decode('utf-8', errors='replace').splitlines():
+            record = parse(line)
+            row = self._caption_row(record) if record else None
+            if row:
+                rows.append(row)
+        self._insert(meeting_dir, meeting_id, source, rows)
+        self._set_source_state(path, stat.st_size, stat.st_mtime, position + end, head)
+        return len(rows)
+
+    def _index_speech(self, meeting_dir, meeting_id, path):
+        """Reindex a speech transcript if it was rewritten"""
+        stat = os.stat(path)
+        state = self._source_state(path)
+        if state and state['size'] == stat.st_size and state['mtime'] == stat.st_mtime:
+            return 0
+        with open(path, encoding='utf-8') as f:
+            segments = json.load(f).get('segments', [])
+        self.conn.execute("DELETE FROM entries WHERE meeting_dir = ? AND source = 'speech'", (meeting_dir,))
+        rows = []
+        for segment in segments:
+            if not segment.get('text'):
+                continue
+            timestamp = segment.get('timestamp')
+            rows.append((to_utc_iso(timestamp) if timestamp else None, segment.get('speaker'),
+                         segment['text'], segment.get('start'), segment.get('end')))
+        self._insert(meeting_dir, meeting_id, 'speech', rows)
+        self._set_source_state(path, stat.st_size, stat.st_mtime, stat.st_size)
+        return len(rows)
+
+    def index_meeting(self, meeting_dir):
+        """Bring the index up to date with one meeting directory; returns the rows added"""
+        meeting_dir = os.path.normpath(meeting_dir)
+        meeting_id = meeting_id_from_dir(meeting_dir)
+        captions_path = os.path.join(meeting_dir, CAPTIONS_FILE)
+        legacy_path = os.path.join(meeting_dir, LEGACY_CAPTIONS_FILE)
+        speech_path = os.path.join(meeting_dir, SPEECH_TRANSCRIPT_FILE)
+        added = 0
+        with self.lock, self.conn:
+            if os.path.exists(captions_path):
+                added += self._index_appended(meeting_dir, meeting_id, captions_path, 'caption', self._parse_json)
+            elif os.path.exists(legacy_path):
+                added += self._index_appended(meeting_dir, meeting_id, legacy_path, 'caption', parse_legacy_line)
+            if os.path.exists(speech_path):
+                added += self._index_speech(meeting_dir, meeting_id, speech_path)
+        return added
+
+    @staticmethod
+    def _parse_json(line):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    def index_all(self, roots):
+        """Index every meeting directory under the given roots; returns (meetings, rows added)"""
+        meetings = added = 0
+        for root in roots:
+            if not os.path.isdir(root):
+                continue
+            for name in sorted(os.listdir(root)):
+                meeting_dir = os.path.join(root, name)
+                if not os.path.isdir(meeting_dir):
+                    continue
+                try:
+                    added += self.index_meeting(meeting_dir)
+                    meetings += 1
+                except Exception as e:
+                    logger.error(f"Error indexing {meeting_dir}: {e}")
+        return meetings, added
+
+    def search(self, text=None, speaker=None, start=None, end=None, meeting_id=None, source=None, limit=50):
+        """Find captions and speech segments by keyword, speaker, time range and meeting
+
+        Keyword matches are ranked by relevance; otherwise results are in
+        time order. start and end are datetimes or ISO strings.
+        """
+        conditions = []
+        params = []
+        if text and self.fts:
+            query = """SELECT entries.*, snippet(entries_fts, 0, '[', ']', '...', 12) AS snippet
+                       FROM entries_fts JOIN entries ON entries.id = entries_fts.rowid"""
+            conditions.append("entries_fts MATCH ?")
+            params.append(fts_query(text))
+            order = "bm25(entries_fts)"
+        else:
+            query = "SELECT entries.*, NULL AS snippet FROM entries"
+            if text:
+                for word in text.split():
+                    conditions.append("entries.text LIKE ?")
+                    params.append(f"%{word}%")
+            order = "entries.timestamp"
+        if speaker:
+            conditions.append("entries.speaker = ?")
+            params.append(speaker)
+        if start:
+            conditions.append("entries.timestamp >= ?")
+            params.append(to_utc_iso(start if isinstance(start, str) else start.isoformat()))
+        if end:
+            conditions.append("entries.timestamp < ?")
+            params.append(to_utc_iso(end if isinstance(end, str) else end.isoformat()))
+        if meeting_id:
+            conditions.append("entries.meeting_id = ?")
+            params.append(meeting_id)
+        if source:
+            conditions.append("entries.source = ?")
+            params.append(source)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def speakers(self):
+        """Speakers with the number of entries for each"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT speaker, COUNT(*) AS entries FROM entries WHERE speaker IS NOT NULL "
+                "GROUP BY speaker ORDER BY entries DESC"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def move_meeting(self, old_dir, new_dir):
+        """Point a meeting's entries at the directory it was moved to"""
+        old_dir, new_dir = os.path.normpath(old_dir), os.path.normpath(new_dir)
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE entries SET meeting_dir = ? WHERE meeting_dir = ?", (new_dir, old_dir))
+            self.conn.execute(
+                "UPDATE sources SET path = ? || substr(path, ?) WHERE substr(path, 1, ?) = ?",
+                (new_dir, len(old_dir) + 1, len(old_dir) + 1, old_dir + os.sep)
+            )
+
+    def remove_meeting(self, meeting_dir):
+        meeting_dir = os.path.normpath(meeting_dir)
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM entries WHERE meeting_dir = ?", (meeting_dir,))
+            self.conn.execute("DELETE FROM sources WHERE substr(path, 1, ?) = ?",
+                              (len(meeting_dir) + 1, meeting_dir + os.sep))
+
+    def close(self):
+        self.conn.close()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def shared_index(path):
+    """One TranscriptIndex per database file, shared by every recorder in the process"""
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = TranscriptIndex(path)
+        return _indexes[path]
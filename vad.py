@@ -0,0 +1,209 @@
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EnergyVAD:
+    """Vectorized voice activity detection from frame energy and zero-crossing rate
+
+    A frame is speech when its RMS energy is well above the noise floor and
+    its zero-crossing rate is below that of broadband noise. Decisions are
+    smoothed with a hangover (speech is held for a while after the last
+    speech frame) and bursts shorter than min_speech_ms are discarded.
+    """
+
+    def __init__(self, sample_rate, frame_ms=20, energy_ratio=3.0, min_energy=60.0,
+                 max_zcr=0.4, hangover_ms=300, min_speech_ms=120):
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.frame_seconds = self.frame_size / sample_rate
+        self.energy_ratio = energy_ratio
+        self.min_energy = min_energy
+        self.max_zcr = max_zcr
+        self.hangover = max(int(hangover_ms / frame_ms), 0)
+        self.min_speech = max(int(min_speech_ms / frame_ms), 1)
+
+    def frame_features(self, samples):
+        """Return per-frame RMS energy and zero-crossing rate for 16-bit mono samples"""
+        count = len(samples) // self.frame_size
+        frames = samples[:count * self.frame_size].reshape(count, self.frame_size)
+        values = frames.astype(np.float32)
+        energy = np.sqrt(np.einsum('ij,ij->i', values, values) / self.frame_size)
+        signs = frames < 0
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / self.frame_size
+        return energy, zcr
+
+    def threshold(self, noise_floor):
+        return max(noise_floor * self.energy_ratio, self.min_energy)
+
+    def raw_decisions(self, energy, zcr, noise_floor):
+        return (energy > self.threshold(noise_floor)) & (zcr < self.max_zcr)
+
+    def smooth(self, decisions):
+        """Drop short bursts, then extend speech by the hangover"""
+        decisions = decisions.copy()
+        starts, ends = runs(decisions)
+        for start, end in zip(starts, ends):
+            if end - start < self.min_speech:
+                decisions[start:end] = False
+        if self.hangover and decisions.any():
+            held = np.convolve(decisions.astype(np.int8), np.ones(self.hangover + 1, dtype=np.int8))
+            decisions = held[:len(decisions)] > 0
+        return decisions
+
+    def classify(self, samples):
+        """Per-frame speech decisions for a whole signal"""
+        energy, zcr = self.frame_features(samples)
+        if len(energy) == 0:
+            return np.zeros(0, dtype=bool)
+        noise_floor = float(np.percentile(energy, 10))
+        return self.smooth(self.raw_decisions(energy, zcr, noise_floor))
+
+    def segments(self, samples):
+        """Speech segments as (start_seconds, end_seconds)"""
+        starts, ends = runs(self.classify(samples))
+        return [(start * self.frame_seconds, end * self.frame_seconds) for start, end in zip(starts, ends)]
+
+    def speech_chunks(self, samples, max_chunk=30.0, padding=0.2):
+        """Speech as (start, end) sample ranges, split so no chunk exceeds max_chunk seconds"""
+        limit = int(max_chunk * self.sample_rate)
+        pad = int(padding * self.sample_rate)
+        chunks = []
+        for start, end in self.segments(samples):
+            start = max(int(start * self.sample_rate) - pad, 0)
+            end = min(int(end * self.sample_rate) + pad, len(samples))
+            for chunk_start in range(start, end, limit):
+                chunks.append((chunk_start, min(chunk_start + limit, end)))
+        return chunks
+
+
+class StreamingVAD:
+    """Block-by-block VAD for live PCM, with an adaptive noise floor and carried state
+
+    Speech segments found so far are collected in self.segments as
+    (start_seconds, end_seconds) from the first processed sample.
+    """
+
+    def __init__(self, vad, adapt=0.05):
+        self.vad = vad
+        self.adapt = adapt
+        self.noise_floor = None
+        self.remainder = np.zeros(0, dtype=np.int16)
+        self.run = 0
+        self.hold = 0
+        self.speech_frames = 0
+        self.frames = 0
+        self.segments = []
+        self.open_start = None
+        self.last_end = 0
+
+    def process(self, samples):
+        """Return per-frame speech decisions for a block of 16-bit mono samples"""
+        samples = np.concatenate((self.remainder, samples))
+        energy, zcr = self.vad.frame_features(samples)
+        self.remainder = samples[len(energy) * self.vad.frame_size:]
+        if len(energy) == 0:
+            return np.zeros(0, dtype=bool)
+
+        if self.noise_floor is None:
+            self.noise_floor = float(np.percentile(energy, 10))
+        raw = self.vad.raw_decisions(energy, zcr, self.noise_floor)
+
+        # Track the noise floor on frames judged to be non-speech
+        quiet = energy[~raw]
+        if len(quiet):
+            self.noise_floor += self.adapt * (float(np.median(quiet)) - self.noise_floor)
+
+        # Frame-by-frame smoothing so decisions carry across block boundaries
+        decisions = np.zeros(len(raw), dtype=bool)
+        for i, is_speech in enumerate(raw):
+            self.run = self.run + 1 if is_speech else 0
+            if self.run >= self.vad.min_speech:
+                if self.open_start is None:
+                    # Speech began where the run did, min_speech frames ago, possibly in an earlier block
+                    start = max(self.frames + i - self.run + 1, self.last_end)
+                    decisions[max(start - self.frames, 0):i] = True
+                    self.speech_frames += max(self.frames - start, 0)
+                    self.open_start = start
+                self.hold = self.vad.hangover + 1
+            if self.hold:
+                decisions[i] = True
+                self.hold -= 1
+                if self.open_start is None:
+                    self.open_start = self.frames + i
+            elif self.open_start is not None:
+                self._close_segment(self.frames + i)
+        self.frames += len(decisions)
+        self.speech_frames += int(decisions.sum())
+        return decisions
+
+    def is_speech(self, samples):
+        """Whether any part of a block is speech"""
+        return bool(self.process(samples).any())
+
+    def finish(self):
+        """Close any open speech segment and return all segments"""
+        if self.open_start is not None:
+            self._close_segment(self.frames)
+        return self.segments
+
+    def _close_segment(self, end_frame):
+        seconds = self.vad.frame_seconds
+        self.segments.append((round(self.open_start * seconds, 3), round(end_frame * seconds, 3)))
+        self.open_start = None
+        self.last_end = end_frame
+
+
+def runs(decisions):
+    """Start and end indices of the True runs in a boolean array"""
+    padded = np.concatenate(([False], decisions, [False])).astype(np.int8)
+    edges = np.diff(padded)
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def synthetic_signal(sample_rate, seconds, seed=0, noise_level=30.0):
+    """Generate background noise with voiced bursts, returning samples and the true speech mask"""
+    rng = np.random.default_rng(seed)
+    total = int(sample_rate * seconds)
+    signal = rng.normal(0, noise_level, total).astype(np.float32)
+    truth = np.zeros(total, dtype=bool)
+
+    position = int(rng.uniform(0.5, 2.0) * sample_rate)
+    while position < total:
+        length = min(int(rng.uniform(0.4, 4.0) * sample_rate), total - position)
+        t = np.arange(length, dtype=np.float32) / sample_rate
+        pitch = rng.uniform(90, 260)
+        voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+        envelope = 0.6 + 0.4 * np.sin(2 * np.pi * rng.uniform(2, 6) * t)
+        signal[position:position + length] += rng.uniform(800, 4000) * envelope * voiced
+        truth[position:position + length] = True
+        position += length + int(rng.uniform(0.3, 5.0) * sample_rate)
+
+    return np.clip(signal, -32768, 32767).astype(np.int16), truth
+
+
+def benchmark(sample_rate=16000, seconds=600, seed=0):
+    """Measure frame accuracy and throughput on a synthetic signal"""
+    samples, truth = synthetic_signal(sample_rate, seconds, seed)
+    vad = EnergyVAD(sample_rate)
+
+    started = time.perf_counter()
+    decisions = vad.classify(samples)
+    elapsed = time.perf_counter() - started
+
+    frame_truth = truth[:len(decisions) * vad.frame_size].reshape(len(decisions), vad.frame_size).mean(axis=1) > 0.5
+    true_positive = np.count_nonzero(decisions & frame_truth)
+    precision = true_positive / max(np.count_nonzero(decisions), 1)
+    recall = true_positive / max(np.count_nonzero(frame_truth), 1)
+    return {
+        'accuracy': round(float(np.mean(decisions == frame_truth)), 4),
+        'precision': round(float(precision), 4),
+        'recall': round(float(recall), 4),
+        'seconds_per_audio_hour': round(elapsed * 3600 / seconds, 3)
+    }
+
+
+if __name__ == '__main__':
+    print(benchmark())
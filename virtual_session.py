@@ -0,0 +1,159 @@
+import os
+import select
+import itertools
+import shutil
+import logging
+import threading
+import subprocess
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Browsers inherit DISPLAY and PULSE_SINK from the environment at launch, so
+# launches that set them are serialized
+LAUNCH_LOCK = threading.Lock()
+_sink_numbers = itertools.count()
+
+
+class VirtualDisplay:
+    """An Xvfb framebuffer for one browser, on the first free display number"""
+
+    def __init__(self, size=(1920, 1080), depth=24):
+        self.size = size
+        self.depth = depth
+        self.process = None
+        self.display = None
+
+    def start(self, timeout=10):
+        if not shutil.which('Xvfb'):
+            raise RuntimeError("Xvfb is not installed")
+        width, height = self.size
+        # Xvfb picks a free display and writes its number to the pipe once it accepts connections
+        read_fd, write_fd = os.pipe()
+        try:
+            self.process = subprocess.Popen(
+                ['Xvfb', '-displayfd', str(write_fd), '-screen', '0', f'{width}x{height}x{self.depth}',
+                 '-nolisten', 'tcp'],
+                pass_fds=(write_fd,),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+            os.close(write_fd)
+            write_fd = None
+            ready, _, _ = select.select([read_fd], [], [], timeout)
+            number = os.read(read_fd, 32).decode().strip() if ready else ''
+        finally:
+            if write_fd is not None:
+                os.close(write_fd)
+            os.close(read_fd)
+        if not number:
+            self.stop()
+            raise RuntimeError(f"Xvfb did not start within {timeout}s")
+        self.display = f":{number}"
+        logger.info(f"Started virtual display {self.display} ({width}x{height})")
+        return self.display
+
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            logger.info(f"Stopped virtual display {self.display}")
+        self.process = None
+
+
+class PulseSink:
+    """A PulseAudio null sink whose monitor carries only one browser's audio"""
+
+    def __init__(self, name):
+        self.name = name
+        self.module = None
+
+    @property
+    def monitor(self):
+        return f"{self.name}.monitor"
+
+    def start(self):
+        if not shutil.which('pactl'):
+            raise RuntimeError("pactl is not installed")
+        result = subprocess.run(
+            ['pactl', 'load-module', 'module-null-sink', f'sink_name={self.name}',
+             f'sink_properties=device.description={self.name}'],
+            capture_output=True, text=True, check=True, timeout=10
+        )
+        self.module = result.stdout.strip()
+        logger.info(f"Created audio sink {self.name} (module {self.module})")
+
+    def stop(self):
+        if self.module:
+            try:
+                subprocess.run(['pactl', 'unload-module', self.module], check=True, timeout=10)
+                logger.info(f"Removed audio sink {self.name}")
+            except Exception as e:
+                logger.error(f"Error removing audio sink {self.name}: {e}")
+        self.module = None
+
+
+class VirtualSession:
+    """Virtual display and audio sink for one browser on a headless Linux host
+
+    The browser is launched inside environment() so it draws to its own
+    Xvfb display and plays into its own null sink. Frames are then grabbed
+    from that display and audio is read from the sink's monitor, so many
+    recorders can share one machine without seeing or hearing each other.
+    Headless browsers need no display, only the sink.
+    """
+
+    def __init__(self, size=(1920, 1080), audio=True, display=True):
+        self.display = VirtualDisplay(size) if display else None
+        self.sink = None
+        self.audio = audio
+
+    def start(self):
+        if self.display:
+            self.display.start()
+        if self.audio:
+            try:
+                self.sink = PulseSink(f"meetnotes_{os.getpid()}_{next(_sink_numbers)}")
+                self.sink.start()
+            except Exception as e:
+                logger.error(f"Error creating audio sink, using the default audio input: {e}")
+                self.sink = None
+        return self
+
+    @property
+    def display_name(self):
+        return self.display.display if self.display else None
+
+    @property
+    def audio_device(self):
+        return self.sink.monitor if self.sink else None
+
+    @contextmanager
+    def environment(self):
+        """Run a browser launch with DISPLAY and PULSE_SINK pointing at this session"""
+        values = {}
+        if self.display:
+            values['DISPLAY'] = self.display_name
+        if self.sink:
+            values['PULSE_SINK'] = self.sink.name
+        with LAUNCH_LOCK:
+            saved = {key: os.environ.get(key) for key in values}
+            os.environ.update(values)
+            try:
+                yield
+            finally:
+                for key, value in saved.items():
+                    if value is None:
+                        os.environ.pop(key, None)
+                    else:
+                        os.environ[key] = value
+
+    def stop(self):
+        if self.sink:
+            self.sink.stop()
+            self.sink = None
+        if self.display:
+            self.display.stop()